@@ -0,0 +1,207 @@
+"""Adaptive CPU goalkeeper that learns where the player shoots.
+
+The goal mouth is split into a fixed grid of zones, and every player shot
+adds weight to its zone in a histogram with exponential decay, so recent
+shots count most. The CPU goalkeeper dives toward a zone drawn from the
+histogram, with some uniform dives mixed in so a player who changes habits
+is still noticed.
+
+Decay is applied lazily: instead of shrinking every zone after each shot,
+each new shot is added with a weight that grows by 1 / decay, and the
+weights are rescaled only when they get large. Memory and the cost of an
+update or a draw depend only on the number of zones, never on how many
+kicks the session has seen.
+
+Running the module checks that copies and rewinds of a match keep what
+the strategy learnt apart from the live match::
+
+    python3 penalty_adaptive.py
+"""
+import struct
+
+from penalty_engine import GOAL_WIDTH, GOAL_HEIGHT, GOAL_X, GOAL_Y
+
+# Zones across and down the goal mouth
+HISTOGRAM_COLUMNS = 8
+HISTOGRAM_ROWS = 4
+
+SHOT_DECAY = 0.9  # Weight kept by older shots per new shot
+EXPLORATION = 0.25  # Share of dives that ignore the histogram
+RESCALE_LIMIT = 1e100  # Shot weight at which the histogram is renormalized
+
+
+class ShotHistogram:
+    """Exponentially decayed counts of shots per zone of the goal mouth"""
+    def __init__(self, decay=SHOT_DECAY):
+        self.decay = decay
+        self.weights = [0.0] * (HISTOGRAM_COLUMNS * HISTOGRAM_ROWS)
+        self.total = 0.0
+        self.shot_weight = 1.0  # Weight of the next shot, grows instead of decaying the rest
+
+    @staticmethod
+    def zone(x, y):
+        column = min(max(int((x - GOAL_X) * HISTOGRAM_COLUMNS // GOAL_WIDTH), 0), HISTOGRAM_COLUMNS - 1)
+        row = min(max(int((y - GOAL_Y) * HISTOGRAM_ROWS // GOAL_HEIGHT), 0), HISTOGRAM_ROWS - 1)
+        return row * HISTOGRAM_COLUMNS + column
+
+    @staticmethod
+    def zone_rect(zone):
+        # (left, top, width, height) of a zone in screen coordinates
+        row, column = divmod(zone, HISTOGRAM_COLUMNS)
+        left = GOAL_X + column * GOAL_WIDTH // HISTOGRAM_COLUMNS
+        top = GOAL_Y + row * GOAL_HEIGHT // HISTOGRAM_ROWS
+        right = GOAL_X + (column + 1) * GOAL_WIDTH // HISTOGRAM_COLUMNS
+        bottom = GOAL_Y + (row + 1) * GOAL_HEIGHT // HISTOGRAM_ROWS
+        return left, top, right - left, bottom - top
+
+    def observe(self, x, y):
+        self.weights[self.zone(x, y)] += self.shot_weight
+        self.total += self.shot_weight
+        self.shot_weight /= self.decay
+        if self.shot_weight > RESCALE_LIMIT:
+            self.rescale()
+
+    def rescale(self):
+        scale = self.shot_weight
+        self.weights = [w / scale for w in self.weights]
+        self.total /= scale
+        self.shot_weight = 1.0
+
+    def shares(self):
+        # Current share of each zone (all zero before the first shot)
+        if not self.total:
+            return [0.0] * len(self.weights)
+        return [w / self.total for w in self.weights]
+
+    def sample(self, rng):
+        """A zone drawn in proportion to its weight, or None before any shot"""
+        if not self.total:
+            return None
+        threshold = rng.random() * self.total
+        for zone, weight in enumerate(self.weights):
+            threshold -= weight
+            if threshold < 0:
+                return zone
+        return len(self.weights) - 1  # Rounding left a sliver past the last zone
+
+    def state(self):
+        # Exact snapshot: every weight, the running total and the next shot weight
+        return struct.pack(f"<{len(self.weights) + 2}d", *self.weights, self.total, self.shot_weight)
+
+    @classmethod
+    def from_state(cls, data, decay=SHOT_DECAY):
+        histogram = cls(decay)
+        if data:
+            values = struct.unpack(f"<{len(histogram.weights) + 2}d", data)
+            histogram.weights = list(values[:-2])
+            histogram.total, histogram.shot_weight = values[-2:]
+        return histogram
+
+
+class AdaptiveStrategy:
+    """CPU strategy whose goalkeeper dives toward the player's favourite zones.
+
+    Pass it to Match as ``cpu_strategy`` and keep the same instance for a
+    whole session so it keeps learning across matches. ``kicker`` supplies
+    the CPU's own kicks (uniform random by default). Choosing a dive only
+    reads the histogram; the match reports each shot to ``record_shot``.
+    """
+    name = "adaptive"
+
+    def __init__(self, kicker=None, histogram=None):
+        self.kicker = kicker
+        self.histogram = histogram or ShotHistogram()
+
+    def kick_target(self, match):
+        if self.kicker:
+            return self.kicker.kick_target(match)
+        # Same choice as the engine's default CPU kicker
+        return (match.rng.randint(GOAL_X + 20, GOAL_X + GOAL_WIDTH - 20),
+                match.rng.randint(GOAL_Y + 20, GOAL_Y + GOAL_HEIGHT - 20))
+
+    def keeper_target(self, match):
+        # The dive is chosen before the shot being defended is learnt
+        width = int(match.cpu_goalkeeper_width)
+        height = int(match.cpu_goalkeeper_height)
+        max_x = GOAL_X + GOAL_WIDTH - width
+        max_y = GOAL_Y + GOAL_HEIGHT - height
+        zone = self.histogram.sample(match.rng) if match.rng.random() >= EXPLORATION else None
+        if zone is None:
+            target = (match.rng.randint(GOAL_X, max_x), match.rng.randint(GOAL_Y, max_y))
+        else:
+            # Centre the goalkeeper on a random point of the zone
+            left, top, zone_width, zone_height = self.histogram.zone_rect(zone)
+            x = left + match.rng.randrange(zone_width) - width // 2
+            y = top + match.rng.randrange(zone_height) - height // 2
+            target = (min(max(x, GOAL_X), max_x), min(max(y, GOAL_Y), max_y))
+        return target
+
+    def record_shot(self, match):
+        # Called by Match.player_shoot once the dive against this shot is chosen
+        self.histogram.observe(*match.target_pos)
+
+    def state(self):
+        return self.histogram.state()
+
+    def restore(self, state):
+        # A new histogram, so a copy of this strategy restored elsewhere shares nothing
+        self.histogram = ShotHistogram.from_state(state, self.histogram.decay)
+
+    @classmethod
+    def from_state(cls, data):
+        return cls(histogram=ShotHistogram.from_state(data))
+
+
+def selftest(seed=0, kicks=200):
+    """Check that a match's copies and rewinds keep the strategy's state apart.
+
+    ``kicks`` player shots explored on a clone must leave the live match's
+    histogram alone, a rewound shot must draw the same dive again, a
+    saved and loaded match must resume with what the strategy learnt, and
+    choosing a dive must not change the histogram.
+    """
+    from penalty_engine import Match, random_goal_target
+    from penalty_snapshot import RewindBuffer, pack_snapshot, unpack_snapshot
+
+    live = Match(realtime=False, seed=seed, cpu_strategy=AdaptiveStrategy())
+    live.play()
+    learnt = live.cpu_strategy.state()
+
+    shots = []
+
+    def kicker(match):
+        shots.append(random_goal_target(match))
+        return shots[-1]
+
+    explorer = live.clone()
+    while len(shots) < kicks:
+        explorer.restart_game()
+        explorer.play(kicker)
+    if live.cpu_strategy.state() != learnt:
+        raise RuntimeError("kicks on a clone changed the live match's strategy")
+
+    live.restart_game()
+    rewind = RewindBuffer()
+    rewind.push(live)
+    target = random_goal_target(live)
+    live.player_shoot(target)
+    dive = live.goalkeeper_target
+    rewind.rewind(live)
+    live.player_shoot(target)
+    if live.goalkeeper_target != dive:
+        raise RuntimeError("a rewound shot drew a different dive")
+
+    saved = pack_snapshot(live.snapshot())
+    loaded = Match(realtime=False, cpu_strategy=AdaptiveStrategy()).restore(unpack_snapshot(saved))
+    if loaded.cpu_strategy.state() != live.cpu_strategy.state():
+        raise RuntimeError("a loaded match lost what its strategy learnt")
+
+    before = live.cpu_strategy.state()
+    live.cpu_strategy.keeper_target(live)
+    if live.cpu_strategy.state() != before:
+        raise RuntimeError("choosing a dive changed the strategy")
+
+
+if __name__ == "__main__":
+    selftest()
+    print("copies and rewinds of a match keep the adaptive strategy apart")
@@ -0,0 +1,471 @@
+"""Append-only store of every kick, with indexes and streaming queries.
+
+A store is a directory holding two append-only files:
+
+``kicks.bin``
+    One fixed-size record per kick: session, match number within the
+    session, difficulty, flags (player kick, goal, sudden death), round,
+    shot target and goalkeeper position when the ball arrived.
+``segments.bin``
+    One summary per full segment of SEGMENT_KICKS records: the session
+    range, which difficulties and goal zones occur, and kick and goal
+    counts for every combination of difficulty, kicker, sudden death and
+    goal zone (the zones of penalty_adaptive).
+
+The summaries are the indexes. A query skips every segment whose summary
+rules it out, and a conversion query over difficulty, kicker, sudden death
+and zone is answered from the counts without reading a single record, so
+it costs the same for a hundred kicks as for hundreds of millions. Only
+the unsealed tail segment, and segments a session filter or a round
+grouping has to look inside, are streamed from disk in fixed-size chunks.
+
+Sessions are numbered in the order they start and a store has one writer
+at a time, so a session's kicks sit in a contiguous run of segments. A
+crash can at worst leave a partial record at the end of ``kicks.bin``,
+which is ignored, or summaries missing, which are rebuilt on the next open.
+"""
+import argparse
+import os
+import struct
+import sys
+import time
+from array import array
+from collections import namedtuple
+
+from penalty_adaptive import HISTOGRAM_COLUMNS, HISTOGRAM_ROWS, ShotHistogram
+from penalty_engine import DIFFICULTY_EASY, DIFFICULTY_NORMAL, DIFFICULTY_HARD, Match, add_recorder
+from penalty_strategy import CPU_STRATEGIES, make_cpu_strategy
+
+DATA_FILE = "kicks.bin"
+INDEX_FILE = "segments.bin"
+
+RECORD = struct.Struct("<IHBBHhhhh")  # session, match, difficulty, flags, round, target, keeper
+SESSION_MATCHES = 1 << 16  # Match numbers a session has room for in a record
+SEGMENT_KICKS = 1 << 16  # Records per indexed segment
+READ_CHUNK = 4096  # Records read at a time when streaming
+
+# Record flags
+FLAG_PLAYER = 1  # The player took the kick
+FLAG_GOAL = 2
+FLAG_SUDDEN_DEATH = 4
+
+DIFFICULTY_NAMES = {DIFFICULTY_EASY: "easy", DIFFICULTY_NORMAL: "normal", DIFFICULTY_HARD: "hard"}
+ZONES = HISTOGRAM_COLUMNS * HISTOGRAM_ROWS
+
+# Fields a segment summary counts by, in cell order
+COUNTED_FIELDS = ("difficulty", "player", "sudden_death", "zone")
+COUNT_CELLS = len(DIFFICULTY_NAMES) * 2 * 2 * ZONES
+SUMMARY_HEADER = struct.Struct("<IIII")  # First and last session, difficulty and zone masks
+SUMMARY_SIZE = SUMMARY_HEADER.size + 2 * 4 * COUNT_CELLS
+
+# Fields that may be used as filters and for grouping
+FIELDS = ("session", "match", "difficulty", "player", "goal", "sudden_death", "round", "zone")
+
+Kick = namedtuple("Kick", "session match difficulty player goal sudden_death round target keeper zone")
+
+
+class StoreError(Exception):
+    pass
+
+
+def cell(difficulty, player, sudden_death, zone):
+    return ((difficulty * 2 + player) * 2 + sudden_death) * ZONES + zone
+
+
+def cell_fields(index):
+    # (difficulty, player, sudden_death, zone) of a count cell
+    rest, zone = divmod(index, ZONES)
+    rest, sudden_death = divmod(rest, 2)
+    difficulty, player = divmod(rest, 2)
+    return difficulty, player, sudden_death, zone
+
+
+CELL_FIELDS = [cell_fields(index) for index in range(COUNT_CELLS)]
+
+
+def decode(record):
+    session, match, difficulty, flags, round_, tx, ty, kx, ky = record
+    return Kick(session, match, difficulty, bool(flags & FLAG_PLAYER), bool(flags & FLAG_GOAL),
+                bool(flags & FLAG_SUDDEN_DEATH), round_, (tx, ty), (kx, ky),
+                ShotHistogram.zone(tx, ty))
+
+
+class SegmentSummary:
+    """Session range, masks and per-cell counts of a run of records"""
+    __slots__ = ("first_session", "last_session", "difficulties", "zones", "kicks", "goals", "size")
+
+    def __init__(self):
+        self.first_session = 0xFFFFFFFF
+        self.last_session = 0
+        self.difficulties = 0
+        self.zones = 0
+        self.kicks = array("I", bytes(4 * COUNT_CELLS))
+        self.goals = array("I", bytes(4 * COUNT_CELLS))
+        self.size = 0
+
+    def add(self, record):
+        session, _, difficulty, flags, _, tx, ty, _, _ = record
+        zone = ShotHistogram.zone(tx, ty)
+        index = cell(difficulty, flags & FLAG_PLAYER, flags & FLAG_SUDDEN_DEATH and 1, zone)
+        self.kicks[index] += 1
+        if flags & FLAG_GOAL:
+            self.goals[index] += 1
+        self.first_session = min(self.first_session, session)
+        self.last_session = max(self.last_session, session)
+        self.difficulties |= 1 << difficulty
+        self.zones |= 1 << zone
+        self.size += 1
+
+    def pack(self):
+        return (SUMMARY_HEADER.pack(self.first_session, self.last_session, self.difficulties,
+                                    self.zones)
+                + self.kicks.tobytes() + self.goals.tobytes())
+
+    @classmethod
+    def unpack(cls, data, size=SEGMENT_KICKS):
+        summary = cls()
+        (summary.first_session, summary.last_session, summary.difficulties,
+         summary.zones) = SUMMARY_HEADER.unpack_from(data)
+        counts = SUMMARY_HEADER.size + 4 * COUNT_CELLS
+        summary.kicks = array("I", data[SUMMARY_HEADER.size:counts])
+        summary.goals = array("I", data[counts:counts + 4 * COUNT_CELLS])
+        summary.size = size
+        return summary
+
+    def may_contain(self, filters):
+        # False when no record of the segment can match the filters
+        if not self.size:
+            return False
+        session = filters.get("session")
+        if session is not None and not self.first_session <= session <= self.last_session:
+            return False
+        difficulty = filters.get("difficulty")
+        if difficulty is not None and not self.difficulties >> difficulty & 1:
+            return False
+        zone = filters.get("zone")
+        return zone is None or bool(self.zones >> zone & 1)
+
+    def counted(self, filters, by, totals):
+        # Add the matching counts to totals, grouped by counted fields only
+        wanted = [(COUNTED_FIELDS.index(name), value) for name, value in filters.items()
+                  if value is not None]
+        positions = [COUNTED_FIELDS.index(name) for name in by]
+        for index, kicks in enumerate(self.kicks):
+            if not kicks:
+                continue
+            values = CELL_FIELDS[index]
+            if any(values[position] != value for position, value in wanted):
+                continue
+            key = tuple(values[position] for position in positions)
+            entry = totals.setdefault(key, [0, 0])
+            entry[0] += kicks
+            entry[1] += self.goals[index]
+
+
+class KickStore:
+    """An analytics store directory, opened for reading and appending"""
+    def __init__(self, path, create=True):
+        if create:
+            os.makedirs(path, exist_ok=True)
+        elif not os.path.isdir(path):
+            raise StoreError(f"no kick store at {path}")
+        self.path = path
+        self.data_path = os.path.join(path, DATA_FILE)
+        self.index_path = os.path.join(path, INDEX_FILE)
+        self.writer = None
+        self.refresh()
+
+    def refresh(self):
+        """Pick up records appended since the store was opened"""
+        size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        self.records = size // RECORD.size  # A partial record left by a crash is ignored
+        sealed = self.records // SEGMENT_KICKS
+
+        self.summaries = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as f:
+                data = f.read(sealed * SUMMARY_SIZE)
+            self.summaries = [SegmentSummary.unpack(data[i:i + SUMMARY_SIZE])
+                              for i in range(0, len(data) - SUMMARY_SIZE + 1, SUMMARY_SIZE)]
+        while len(self.summaries) < sealed:
+            # Summaries lost in a crash are rebuilt from the records
+            summary = self.summarize(len(self.summaries) * SEGMENT_KICKS,
+                                     (len(self.summaries) + 1) * SEGMENT_KICKS)
+            self._append_index(summary, len(self.summaries))
+            self.summaries.append(summary)
+        self.tail = self.summarize(sealed * SEGMENT_KICKS, self.records)
+
+    def summarize(self, start, stop):
+        summary = SegmentSummary()
+        for record in self.records_between(start, stop):
+            summary.add(record)
+        return summary
+
+    def _append_index(self, summary, segment):
+        with open(self.index_path, "ab") as f:
+            f.truncate(segment * SUMMARY_SIZE)  # Drop any summary written only in part
+            f.write(summary.pack())
+
+    def segments(self):
+        """(first record, stop record, summary) of every segment, the tail last"""
+        for segment, summary in enumerate(self.summaries):
+            yield segment * SEGMENT_KICKS, (segment + 1) * SEGMENT_KICKS, summary
+        if self.tail.size:
+            yield len(self.summaries) * SEGMENT_KICKS, self.records, self.tail
+
+    def last_session(self):
+        last = self.tail if self.tail.size else (self.summaries[-1] if self.summaries else None)
+        return last.last_session if last else 0
+
+    # Writing
+
+    def append(self, records):
+        """Append packed records (a multiple of RECORD.size bytes)"""
+        if self.writer is None:
+            self.writer = open(self.data_path, "ab")
+            self.writer.truncate(self.records * RECORD.size)
+        self.writer.write(records)
+        self.writer.flush()
+        for record in RECORD.iter_unpack(records):
+            self.tail.add(record)
+            self.records += 1
+            if self.tail.size == SEGMENT_KICKS:
+                # The data is on disk before the summary that describes it
+                os.fsync(self.writer.fileno())
+                self._append_index(self.tail, len(self.summaries))
+                self.summaries.append(self.tail)
+                self.tail = SegmentSummary()
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Reading
+
+    def records_between(self, start, stop):
+        """Raw record tuples start <= n < stop, read in chunks"""
+        if start >= stop:
+            return
+        with open(self.data_path, "rb") as f:
+            f.seek(start * RECORD.size)
+            remaining = stop - start
+            while remaining:
+                data = f.read(min(remaining, READ_CHUNK) * RECORD.size)
+                if not data:
+                    return
+                yield from RECORD.iter_unpack(data)
+                remaining -= len(data) // RECORD.size
+
+    def kicks(self, **filters):
+        """Yield every Kick matching the filters (fields of Kick, None for any)"""
+        check_filters(filters)
+        wanted = [(name, value) for name, value in filters.items() if value is not None]
+        for start, stop, summary in self.segments():
+            if not summary.may_contain(filters):
+                continue
+            for record in self.records_between(start, stop):
+                kick = decode(record)
+                if all(getattr(kick, name) == value for name, value in wanted):
+                    yield kick
+
+    def conversion(self, by=(), **filters):
+        """{group key: (kicks, goals)} for the kicks matching the filters.
+
+        ``by`` names the fields to group by. When it and the filters only
+        use COUNTED_FIELDS, full segments are answered from their summaries.
+        """
+        check_filters(filters)
+        by = tuple(by)
+        for name in by:
+            if name not in FIELDS or name == "goal":
+                raise StoreError(f"cannot group by {name!r}")
+        counted = all(name in COUNTED_FIELDS for name in by) and all(
+            value is None or name in COUNTED_FIELDS for name, value in filters.items())
+
+        totals = {}
+        wanted = [(name, value) for name, value in filters.items() if value is not None]
+        for start, stop, summary in self.segments():
+            if not summary.may_contain(filters):
+                continue
+            if counted:
+                summary.counted(filters, by, totals)
+                continue
+            for record in self.records_between(start, stop):
+                kick = decode(record)
+                if all(getattr(kick, name) == value for name, value in wanted):
+                    entry = totals.setdefault(tuple(getattr(kick, name) for name in by), [0, 0])
+                    entry[0] += 1
+                    entry[1] += kick.goal
+        return {key: tuple(value) for key, value in sorted(totals.items())}
+
+
+def check_filters(filters):
+    for name in filters:
+        if name not in FIELDS:
+            raise StoreError(f"unknown field {name!r}")
+
+
+class KickLogger:
+    """Match recorder that appends every settled kick to a KickStore.
+
+    One logger is one session; call ``watch`` for each match of it. After
+    SESSION_MATCHES matches it carries on in the next session, so the
+    (session, match) of a kick stays unique. Records are buffered and
+    written every ``flush_every`` kicks and on ``flush``.
+    """
+    def __init__(self, store, session=None, flush_every=256):
+        self.store = store
+        self.session = store.last_session() + 1 if session is None else session
+        self.first_session = self.session
+        self.match_number = -1
+        self.flush_every = flush_every
+        self.buffer = bytearray()
+        self.buffered = 0
+
+    def watch(self, match):
+        self.match_number += 1
+        if self.match_number == SESSION_MATCHES:
+            self.session += 1
+            self.match_number = 0
+        add_recorder(match, self)
+        return match
+
+    def record_shot(self, match):
+        pass
+
+    def record_keeper_move(self, match):
+        pass
+
+    def record_result(self, match):
+        # Called by check_goal: the goalkeeper is where the ball met it
+        flags = ((FLAG_PLAYER if match.player_turn else 0) | (FLAG_GOAL if match.goal_scored else 0)
+                 | (FLAG_SUDDEN_DEATH if match.sudden_death else 0))
+        self.buffer += RECORD.pack(
+            self.session, self.match_number, match.difficulty, flags,
+            match.sd_round if match.sudden_death else match.current_round,
+            int(match.target_pos[0]), int(match.target_pos[1]),
+            int(match.goalkeeper_pos[0]), int(match.goalkeeper_pos[1]))
+        self.buffered += 1
+        if self.buffered >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.store.append(bytes(self.buffer))
+            self.buffer.clear()
+            self.buffered = 0
+
+
+def generate(store, matches, difficulty=DIFFICULTY_NORMAL, cpu="random", seed=None):
+    """Log ``matches`` headless matches as a new session; returns its first and last session.
+
+    More than SESSION_MATCHES matches take several consecutive sessions.
+    """
+    logger = KickLogger(store, flush_every=SEGMENT_KICKS)
+    for index in range(matches):
+        match = Match(difficulty, realtime=False,
+                      seed=None if seed is None else seed + index,
+                      cpu_strategy=make_cpu_strategy(cpu))
+        logger.watch(match).play()
+    logger.flush()
+    return logger.first_session, logger.session
+
+
+def format_key(by, key):
+    parts = []
+    for name, value in zip(by, key):
+        if name == "difficulty":
+            value = DIFFICULTY_NAMES.get(value, value)
+        elif name == "player":
+            value = "player" if value else "cpu"
+        elif name == "sudden_death":
+            value = "sudden death" if value else "regular"
+        parts.append(f"{name}={value}")
+    return " ".join(parts) or "all kicks"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Query and fill a kick analytics store")
+    parser.add_argument("store", help="store directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    stats = commands.add_parser("stats", help="conversion rates, optionally grouped")
+    kicks = commands.add_parser("kicks", help="print matching kicks")
+    for command in (stats, kicks):
+        command.add_argument("--difficulty", choices=list(DIFFICULTY_NAMES.values()))
+        command.add_argument("--session", type=int)
+        command.add_argument("--zone", type=int, choices=range(ZONES), metavar=f"0-{ZONES - 1}")
+        command.add_argument("--kicker", choices=("player", "cpu"))
+        command.add_argument("--sudden-death", choices=("yes", "no"))
+        command.add_argument("--round", type=int)
+    stats.add_argument("--by", nargs="+", default=[], choices=[f for f in FIELDS if f != "goal"],
+                       help="group by these fields")
+    kicks.add_argument("--limit", type=int, default=20)
+
+    generate_parser = commands.add_parser("generate", help="log headless matches as a new session")
+    generate_parser.add_argument("--matches", type=int, default=1000)
+    generate_parser.add_argument("--difficulty", choices=list(DIFFICULTY_NAMES.values()),
+                                 default="normal")
+    generate_parser.add_argument("--cpu", choices=CPU_STRATEGIES, default="random")
+    generate_parser.add_argument("--seed", type=int)
+    return parser.parse_args(argv)
+
+
+def filters_from(args):
+    by_name = {name: level for level, name in DIFFICULTY_NAMES.items()}
+    return {
+        "difficulty": by_name[args.difficulty] if args.difficulty else None,
+        "session": args.session,
+        "zone": args.zone,
+        "player": None if args.kicker is None else args.kicker == "player",
+        "sudden_death": None if args.sudden_death is None else args.sudden_death == "yes",
+        "round": args.round,
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "generate":
+        by_name = {name: level for level, name in DIFFICULTY_NAMES.items()}
+        with KickStore(args.store) as store:
+            start = time.perf_counter()
+            before = store.records
+            first, last = generate(store, args.matches, by_name[args.difficulty], args.cpu,
+                                   args.seed)
+            elapsed = time.perf_counter() - start
+            sessions = f"session {first}" if first == last else f"sessions {first}-{last}"
+            print(f"{sessions}: {store.records - before} kicks from {args.matches} matches "
+                  f"in {elapsed:.1f} s")
+        return 0
+
+    store = KickStore(args.store, create=False)
+    filters = filters_from(args)
+    if args.command == "kicks":
+        for count, kick in enumerate(store.kicks(**filters)):
+            if count == args.limit:
+                break
+            print(f"session {kick.session} match {kick.match} {DIFFICULTY_NAMES[kick.difficulty]:6} "
+                  f"{'player' if kick.player else 'cpu':6} round {kick.round:3}"
+                  f"{' (sudden death)' if kick.sudden_death else ''}: "
+                  f"shot {kick.target} keeper {kick.keeper} zone {kick.zone} "
+                  f"{'GOAL' if kick.goal else 'saved'}")
+        return 0
+
+    start = time.perf_counter()
+    results = store.conversion(args.by, **filters)
+    elapsed = time.perf_counter() - start
+    for key, (kicks, goals) in results.items():
+        print(f"{format_key(args.by, key):40} {kicks:12} kicks {goals / kicks:7.1%} scored")
+    print(f"{store.records} kicks in the store, queried in {elapsed * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
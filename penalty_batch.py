@@ -0,0 +1,210 @@
+"""NumPy batch simulator for many independent shootouts.
+
+Every match is played with the default headless policies of
+``penalty_engine.Match.play``: the player shoots uniformly inside the goal
+and positions their goalkeeper uniformly before each CPU kick. Kicks are
+resolved with the same geometry as ``Match.check_goal``, but the flight of
+the ball and the CPU goalkeeper is evaluated in closed form, tabulated once
+for every position the random choices can produce, and looked up for all
+matches at once instead of stepping frame by frame.
+"""
+import functools
+
+import numpy as np
+
+from penalty_engine import (
+    MAX_ROUNDS, GOAL_WIDTH, GOAL_HEIGHT, GOAL_X, GOAL_Y, PENALTY_SPOT,
+    BALL_SPEED, GOALKEEPER_SPEED, ARRIVAL_DISTANCE, TIME_STEP, DIFFICULTY_EASY, DIFFICULTY_NORMAL, DIFFICULTY_HARD,
+    KICK_ORDER_ABAB, decision_table, goalkeeper_sizes, player_takes_kick,
+)
+
+
+class BatchResult:
+    """Per-match arrays of a simulated batch.
+
+    ``player_results``/``cpu_results`` hold 1 for a goal, 0 for a miss and -1
+    for a kick that was skipped because the match was already decided.
+    ``sudden_death`` flags matches that needed sudden death and ``sd_rounds``
+    counts the sudden-death rounds they lasted.
+    """
+    def __init__(self, player_score, cpu_score, player_results, cpu_results,
+                 sudden_death, sd_rounds):
+        self.player_score = player_score
+        self.cpu_score = cpu_score
+        self.player_results = player_results
+        self.cpu_results = cpu_results
+        self.sudden_death = sudden_death
+        self.sd_rounds = sd_rounds
+
+    def __len__(self):
+        return len(self.player_score)
+
+    def player_wins(self):
+        return self.player_score > self.cpu_score
+
+
+def _travel_steps(distance, speed):
+    # Vectorized penalty_engine.travel_steps
+    steps = np.floor((distance - ARRIVAL_DISTANCE) / speed) + 1
+    return np.maximum(steps, 0)
+
+
+def _goal_grid(width, height, margin=0):
+    # Every integer position random.randint can pick inside the goal, flattened
+    xs = np.arange(GOAL_X + margin, GOAL_X + GOAL_WIDTH - margin - int(width) + 1)
+    ys = np.arange(GOAL_Y + margin, GOAL_Y + GOAL_HEIGHT - margin - int(height) + 1)
+    grid_x, grid_y = np.meshgrid(xs, ys, indexing="ij")
+    return grid_x.ravel(), grid_y.ravel()
+
+
+@functools.lru_cache(maxsize=None)
+def _ball_table():
+    # Ball position and step count at the step Match.move_ball calls
+    # check_goal, for every target the kickers can pick
+    target_x, target_y = _goal_grid(0, 0, margin=20)
+    dx = target_x - PENALTY_SPOT[0]
+    dy = target_y - PENALTY_SPOT[1]
+    distance = np.sqrt(dx ** 2 + dy ** 2)
+    steps = _travel_steps(distance, BALL_SPEED * TIME_STEP)
+    scale = steps * (BALL_SPEED * TIME_STEP) / distance
+    return PENALTY_SPOT[0] + dx * scale, PENALTY_SPOT[1] + dy * scale, steps
+
+
+@functools.lru_cache(maxsize=None)
+def _cpu_keeper_table(difficulty):
+    # Start, per-step velocity and step count of the CPU goalkeeper running
+    # from the centre to each random target it can pick
+    cpu_w, cpu_h, _, _ = goalkeeper_sizes(difficulty)
+    start_x = GOAL_X + (GOAL_WIDTH - int(cpu_w)) // 2
+    start_y = GOAL_Y + (GOAL_HEIGHT - int(cpu_h)) // 2
+    target_x, target_y = _goal_grid(cpu_w, cpu_h)
+    dx = target_x - start_x
+    dy = target_y - start_y
+    distance = np.sqrt(dx ** 2 + dy ** 2)
+    safe = np.where(distance > 0, distance, 1)
+    speed = GOALKEEPER_SPEED * TIME_STEP
+    return (start_x, start_y, dx / safe * speed, dy / safe * speed,
+            _travel_steps(distance, speed))
+
+
+@functools.lru_cache(maxsize=None)
+def _player_keeper_table(difficulty):
+    _, _, player_w, player_h = goalkeeper_sizes(difficulty)
+    return _goal_grid(player_w, player_h)
+
+
+def _scored(ball_x, ball_y, gk_x, gk_y, gk_width, gk_height):
+    # Vectorized Match.check_goal
+    in_goal = ((GOAL_X < ball_x) & (ball_x < GOAL_X + GOAL_WIDTH)
+               & (GOAL_Y < ball_y) & (ball_y < GOAL_Y + GOAL_HEIGHT))
+    blocked = ((gk_x < ball_x) & (ball_x < gk_x + int(gk_width))
+               & (gk_y < ball_y) & (ball_y < gk_y + int(gk_height)))
+    return in_goal & ~blocked
+
+
+def _ball_flights(rng, n):
+    ball_x, ball_y, ball_steps = _ball_table()
+    shot = rng.integers(0, len(ball_x), size=n)
+    return ball_x[shot], ball_y[shot], ball_steps[shot]
+
+
+def player_kicks(rng, n, difficulty):
+    """Outcomes of n player kicks against the CPU goalkeeper (bool array)"""
+    cpu_w, cpu_h, _, _ = goalkeeper_sizes(difficulty)
+    ball_x, ball_y, ball_steps = _ball_flights(rng, n)
+
+    # The CPU goalkeeper starts centred and runs toward a random target
+    start_x, start_y, step_x, step_y, keeper_steps = _cpu_keeper_table(difficulty)
+    target = rng.integers(0, len(keeper_steps), size=n)
+    steps = np.minimum(ball_steps, keeper_steps[target])
+    gk_x = start_x + step_x[target] * steps
+    gk_y = start_y + step_y[target] * steps
+    return _scored(ball_x, ball_y, gk_x, gk_y, cpu_w, cpu_h)
+
+
+def cpu_kicks(rng, n, difficulty):
+    """Outcomes of n CPU kicks against the player's goalkeeper (bool array)"""
+    _, _, player_w, player_h = goalkeeper_sizes(difficulty)
+    ball_x, ball_y, _ = _ball_flights(rng, n)
+    keeper_x, keeper_y = _player_keeper_table(difficulty)
+    position = rng.integers(0, len(keeper_x), size=n)
+    return _scored(ball_x, ball_y, keeper_x[position], keeper_y[position], player_w, player_h)
+
+
+def simulate_batch(n, difficulty=DIFFICULTY_NORMAL, rng=None, kick_order=KICK_ORDER_ABAB):
+    """Simulate n independent shootouts and return a BatchResult"""
+    rng = np.random.default_rng(rng)
+    decided_after = np.array(decision_table(MAX_ROUNDS, kick_order))
+
+    # Draw every regulation kick up front, then drop the ones taken after the
+    # match was already decided
+    player_goals = player_kicks(rng, n * MAX_ROUNDS, difficulty).reshape(n, MAX_ROUNDS)
+    cpu_goals = cpu_kicks(rng, n * MAX_ROUNDS, difficulty).reshape(n, MAX_ROUNDS)
+    player_taken = np.empty((n, MAX_ROUNDS), bool)
+    cpu_taken = np.empty((n, MAX_ROUNDS), bool)
+    player_score = np.zeros(n, np.int32)
+    cpu_score = np.zeros(n, np.int32)
+    decided = np.zeros(n, bool)
+    for kick in range(2 * MAX_ROUNDS):
+        i = kick // 2
+        if player_takes_kick(kick, kick_order):
+            player_taken[:, i] = ~decided
+            player_score += player_goals[:, i] & ~decided
+        else:
+            cpu_taken[:, i] = ~decided
+            cpu_score += cpu_goals[:, i] & ~decided
+        decided = decided_after[kick + 1, player_score, cpu_score]
+
+    player_results = np.where(player_taken, player_goals, -1).astype(np.int8)
+    cpu_results = np.where(cpu_taken, cpu_goals, -1).astype(np.int8)
+
+    # Sudden death: both sides kick until exactly one of them scores
+    sudden_death = player_score == cpu_score
+    sd_rounds = np.zeros(n, np.int32)
+    active = np.flatnonzero(sudden_death)
+    while active.size:
+        player_goals = player_kicks(rng, active.size, difficulty)
+        cpu_goals = cpu_kicks(rng, active.size, difficulty)
+        player_score[active] += player_goals
+        cpu_score[active] += cpu_goals
+        sd_rounds[active] += 1
+        active = active[player_goals == cpu_goals]
+
+    return BatchResult(player_score, cpu_score, player_results, cpu_results,
+                       sudden_death, sd_rounds)
+
+
+def win_rates(n, difficulty=DIFFICULTY_NORMAL, rng=None, chunk_size=1_000_000,
+              kick_order=KICK_ORDER_ABAB):
+    """Aggregate statistics over n matches, simulated in bounded-memory chunks"""
+    rng = np.random.default_rng(rng)
+    player_wins = sudden_deaths = sd_rounds = 0
+    remaining = n
+    while remaining > 0:
+        batch = simulate_batch(min(chunk_size, remaining), difficulty, rng, kick_order)
+        player_wins += int(np.count_nonzero(batch.player_wins()))
+        sudden_deaths += int(np.count_nonzero(batch.sudden_death))
+        sd_rounds += int(batch.sd_rounds.sum())
+        remaining -= len(batch)
+    return {
+        "matches": n,
+        "player_win_rate": player_wins / n,
+        "cpu_win_rate": 1 - player_wins / n,
+        "sudden_death_rate": sudden_deaths / n,
+        "mean_sudden_death_rounds": sd_rounds / sudden_deaths if sudden_deaths else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    matches = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    for difficulty, name in ((DIFFICULTY_EASY, "Easy"), (DIFFICULTY_NORMAL, "Normal"),
+                             (DIFFICULTY_HARD, "Hard")):
+        start = time.perf_counter()
+        stats = win_rates(matches, difficulty)
+        elapsed = time.perf_counter() - start
+        print(f"{name}: player wins {stats['player_win_rate']:.2%}, "
+              f"sudden death {stats['sudden_death_rate']:.2%} "
+              f"({matches / elapsed:.0f} matches/s)")
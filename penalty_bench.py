@@ -0,0 +1,210 @@
+"""Benchmarks for drawing, simulation throughput and startup.
+
+Runs headless under the SDL dummy video driver and writes the results as
+JSON. Every result is a time per operation in microseconds (lower is
+better), so a run can be compared against a saved baseline directly::
+
+    python3 penalty_bench.py --output baseline.json
+    python3 penalty_bench.py --baseline baseline.json  # exits 1 on a regression
+"""
+import os
+
+# Benchmarks never open a real window
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import pygame
+
+import soccer_penalty
+from penalty_engine import (
+    MAX_ROUNDS, DIFFICULTY_NORMAL, KickResults, random_goal_target, random_keeper_position,
+)
+
+# Default share a result may grow by before it counts as a regression
+DEFAULT_THRESHOLD = 0.10
+
+# Rounds into sudden death for the sudden-death drawing states
+LONG_SUDDEN_DEATH_ROUNDS = 23
+VERY_LONG_SUDDEN_DEATH_ROUNDS = 1000
+
+STARTUP_SCRIPT = (
+    "import soccer_penalty as sp; sp.init_display(); "
+    "sp.TitleScreen().draw(); sp.pygame.display.flip()"
+)
+
+
+def normal_state():
+    # A regulation match half way through, with a shot on its way
+    game = soccer_penalty.Game(DIFFICULTY_NORMAL, realtime=False, seed=1)
+    while game.kicks_taken < MAX_ROUNDS:
+        if game.awaiting_player_kick():
+            game.player_shoot(random_goal_target(game))
+        elif game.awaiting_cpu_kick():
+            game.cpu_goalkeeper_move(random_keeper_position(game))
+        if game.ball_moving:
+            game.resolve_kick()
+        game.step()
+    if game.awaiting_player_kick():
+        game.player_shoot(random_goal_target(game))
+    game.step()
+    return game
+
+
+def sudden_death_state(rounds=LONG_SUDDEN_DEATH_ROUNDS):
+    # A tied match deep into sudden death, built directly rather than by
+    # hoping a random match lasts that long
+    game = normal_state()
+    game.player_score = game.cpu_score = MAX_ROUNDS + rounds - 1
+    game.player_results = [1] * MAX_ROUNDS
+    game.cpu_results = [1] * MAX_ROUNDS
+    game.sudden_death = True
+    game.sd_round = rounds
+    game.kicks_taken = 2 * (MAX_ROUNDS + rounds - 1)
+    played = rounds - 1
+    game.sd_player_results = KickResults([1, 0] * (played // 2) + [1] * (played % 2) + [-1])
+    game.sd_cpu_results = KickResults(game.sd_player_results)
+    game.result_message = "GOAL!"
+    return game
+
+
+def time_per_call(func, repeat, number):
+    """Run func number times per repeat and return the per-call times in seconds"""
+    func()  # Warm up caches before timing
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return timings
+
+
+def stepped_match(seed):
+    # One headless match stepped through every fixed step of every kick
+    game = soccer_penalty.Game(DIFFICULTY_NORMAL, realtime=False, seed=seed)
+    while not game.game_over:
+        if game.awaiting_player_kick():
+            game.player_shoot(random_goal_target(game))
+        elif game.awaiting_cpu_kick():
+            game.cpu_goalkeeper_move(random_keeper_position(game))
+        game.step()
+
+
+def startup_time():
+    # Import, open the window and draw the title screen in a fresh interpreter
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], check=True,
+                   cwd=os.path.dirname(os.path.abspath(__file__)))
+    return time.perf_counter() - start
+
+
+def benchmarks(quick=False):
+    """Yield (name, zero-argument callable, calls per repeat)"""
+    frames = 200 if quick else 2000
+    states = (("normal", normal_state()), ("sudden_death", sudden_death_state()),
+              ("sudden_death_1000", sudden_death_state(VERY_LONG_SUDDEN_DEATH_ROUNDS)))
+    for state, game in states:
+        for method in ("draw_field", "draw_goalkeeper", "draw_ball",
+                       "draw_scoreboard", "draw_results_table", "draw"):
+            yield f"{method}[{state}]", getattr(game, method), frames
+
+    seeds = iter(range(1 << 30))
+    matches = 20 if quick else 200
+    yield "match_play", lambda: soccer_penalty.Game(
+        DIFFICULTY_NORMAL, realtime=False, seed=next(seeds)).play(), matches
+    yield "match_stepped", lambda: stepped_match(next(seeds)), matches // 4
+
+
+def run(quick=False, selected=None):
+    repeat = 3 if quick else 7
+    soccer_penalty.init_display()
+    results = {}
+    for name, func, number in benchmarks(quick):
+        if selected and not any(pattern in name for pattern in selected):
+            continue
+        timings = time_per_call(func, repeat, number)
+        results[name] = summarize(timings)
+
+    if not selected or any(pattern in "startup" for pattern in selected):
+        results["startup"] = summarize([startup_time() for _ in range(repeat)])
+    pygame.quit()
+    return results
+
+
+def summarize(timings):
+    return {
+        "median_us": statistics.median(timings) * 1e6,
+        "min_us": min(timings) * 1e6,
+        "repeat": len(timings),
+    }
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "sdl": ".".join(map(str, pygame.get_sdl_version())),
+        "platform": platform.platform(),
+        "video_driver": os.environ["SDL_VIDEODRIVER"],
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Return (name, baseline us, current us, ratio) for every result that got slower"""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        ratio = result["median_us"] / previous["median_us"]
+        if ratio > 1 + threshold:
+            regressions.append((name, previous["median_us"], result["median_us"], ratio))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the penalty shootout game")
+    parser.add_argument("--output", metavar="PATH", help="write the results as JSON")
+    parser.add_argument("--baseline", metavar="PATH",
+                        help="compare against saved results and exit 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown before a result counts as a regression")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations, for a smoke test")
+    parser.add_argument("benchmarks", nargs="*",
+                        help="only run benchmarks whose name contains one of these")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(args.quick, args.benchmarks)
+    report = {"environment": environment(), "results": results}
+
+    for name, result in results.items():
+        print(f"{name:32} {result['median_us']:12.1f} us  (min {result['min_us']:.1f})")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after, ratio in regressions:
+            print(f"REGRESSION {name}: {before:.1f} us -> {after:.1f} us ({ratio - 1:+.0%})")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
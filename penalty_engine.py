@@ -0,0 +1,946 @@
+"""Headless penalty shootout engine.
+
+The rules of the shootout live here without any pygame dependency so the
+same state machine can drive the game window, tools and bulk simulations.
+"""
+import copy
+import functools
+import math
+import operator
+import random
+
+# Screen dimensions
+SCREEN_WIDTH = 800
+SCREEN_HEIGHT = 600
+
+# Game settings
+MAX_ROUNDS = 5  # Best of 5 shots
+GOAL_WIDTH = 400
+GOAL_HEIGHT = 200
+BALL_RADIUS = 15
+GOALKEEPER_WIDTH = 80
+GOALKEEPER_HEIGHT = 120
+
+# Goal position (top-left corner of the goal mouth)
+GOAL_X = SCREEN_WIDTH // 2 - GOAL_WIDTH // 2
+GOAL_Y = SCREEN_HEIGHT // 4 - GOAL_HEIGHT // 2
+PENALTY_SPOT = (SCREEN_WIDTH // 2, SCREEN_HEIGHT - 100)
+
+# The simulation always advances in fixed steps, whatever the display rate
+SIMULATION_RATE = 60  # Steps per second
+TIME_STEP = 1 / SIMULATION_RATE
+TIME_EPSILON = 1e-9  # Slack for timers counted down in float steps
+
+# Movement speeds in pixels per second
+BALL_SPEED = 900
+GOALKEEPER_SPEED = 600
+ARRIVAL_DISTANCE = 10  # Ball and goalkeeper stop once this close to their target
+
+# Pauses between kicks in seconds
+RESULT_WAIT_TIME = 1.0
+SUDDEN_DEATH_WAIT_TIME = 2.0
+CPU_PREPARATION_TIME = 3.0
+
+# Difficulty levels
+DIFFICULTY_EASY = 0
+DIFFICULTY_NORMAL = 1
+DIFFICULTY_HARD = 2
+
+# Kick orders
+KICK_ORDER_ABAB = 0  # Player kicks first in every round
+KICK_ORDER_ABBA = 1  # The first kicker alternates every round
+
+# How a kick is decided
+COLLISION_POINT = 0  # The ball's centre against the goalkeeper box, once the ball has arrived
+COLLISION_SWEPT = 1  # The ball's circle against the moving goalkeeper over the whole flight
+COLLISION_MODES = ("point", "swept")  # Names of the modes, by value
+
+
+def goalkeeper_sizes(difficulty):
+    """Return (cpu width, cpu height, player width, player height) for a difficulty"""
+    if difficulty == DIFFICULTY_EASY:
+        # Easy: CPU goalkeeper is smaller, player goalkeeper is larger
+        return (GOALKEEPER_WIDTH * 0.7, GOALKEEPER_HEIGHT * 0.7,  # 70% of normal size
+                GOALKEEPER_WIDTH * 1.3, GOALKEEPER_HEIGHT * 1.3)  # 130% of normal size
+    elif difficulty == DIFFICULTY_NORMAL:
+        # Normal: Both goalkeepers are normal size
+        return (GOALKEEPER_WIDTH, GOALKEEPER_HEIGHT,
+                GOALKEEPER_WIDTH, GOALKEEPER_HEIGHT)
+    else:
+        # Hard: CPU goalkeeper is larger, player goalkeeper is smaller
+        return (GOALKEEPER_WIDTH * 1.3, GOALKEEPER_HEIGHT * 1.3,  # 130% of normal size
+                GOALKEEPER_WIDTH * 0.7, GOALKEEPER_HEIGHT * 0.7)  # 70% of normal size
+
+
+def player_takes_kick(kick_index, kick_order=KICK_ORDER_ABAB):
+    """Return True if the player takes the given kick (0-based, sudden death included)"""
+    round_index, second = divmod(kick_index, 2)
+    player_first = kick_order == KICK_ORDER_ABAB or round_index % 2 == 0
+    return player_first != bool(second)
+
+
+@functools.lru_cache(maxsize=None)
+def decision_table(max_rounds=MAX_ROUNDS, kick_order=KICK_ORDER_ABAB):
+    """Precompute whether the regular rounds are decided.
+
+    ``table[kicks_taken][player_score][cpu_score]`` is True when one side leads
+    by more than the other can make up with the kicks it has left.
+    """
+    kickers = [player_takes_kick(k, kick_order) for k in range(2 * max_rounds)]
+    table = []
+    for taken in range(2 * max_rounds + 1):
+        player_left = kickers[taken:].count(True)
+        cpu_left = len(kickers) - taken - player_left
+        table.append(tuple(
+            tuple(player > cpu + cpu_left or cpu > player + player_left
+                  for cpu in range(max_rounds + 1))
+            for player in range(max_rounds + 1)
+        ))
+    return tuple(table)
+
+
+def travel_steps(distance, step_length):
+    """Number of fixed steps a mover takes before it is within ARRIVAL_DISTANCE"""
+    if distance < ARRIVAL_DISTANCE:
+        return 0
+    return int((distance - ARRIVAL_DISTANCE) // step_length) + 1
+
+
+class Motion:
+    """Straight-line travel toward a target at constant speed, in closed form.
+
+    Matches stepping the mover ``speed * dt`` per step until it is within
+    ARRIVAL_DISTANCE of the target (the last step may carry it slightly past),
+    but the duration and the position at any time are computed directly.
+    With ``dt=0`` the motion is continuous instead and ends exactly on the
+    target. A Motion never changes after it is created, so snapshots share it.
+    """
+    __slots__ = ("start", "target", "speed", "dt", "direction", "steps", "duration")
+
+    def __init__(self, start, target, speed, dt=TIME_STEP):
+        self.start = (start[0], start[1])
+        self.target = (target[0], target[1])
+        self.speed = speed
+        self.dt = dt
+        dx = target[0] - start[0]
+        dy = target[1] - start[1]
+        distance = math.sqrt(dx**2 + dy**2)
+        self.direction = (dx / distance, dy / distance) if distance > 0 else (0, 0)
+        if dt:
+            self.steps = travel_steps(distance, speed * dt)
+            self.duration = self.steps * dt
+        else:
+            self.steps = None
+            self.duration = distance / speed
+        
+    def position(self, t):
+        # Position t seconds after leaving the start, clamped to the journey
+        travelled = self.speed * min(max(t, 0), self.duration)
+        return [self.start[0] + self.direction[0] * travelled,
+                self.start[1] + self.direction[1] * travelled]
+        
+    def arrived(self, t):
+        return t >= self.duration - TIME_EPSILON
+        
+    def velocity(self, t):
+        # (vx, vy) at t seconds, zero before the start and after arrival
+        if t < 0 or t >= self.duration:
+            return (0.0, 0.0)
+        return (self.direction[0] * self.speed, self.direction[1] * self.speed)
+
+
+def _box_entry(start, velocity, low, high, limit):
+    # Earliest s in [0, limit] at which start + velocity * s is inside the box
+    enter, leave = 0.0, limit
+    for axis in (0, 1):
+        if velocity[axis] == 0:
+            if not low[axis] <= start[axis] <= high[axis]:
+                return None
+            continue
+        near = (low[axis] - start[axis]) / velocity[axis]
+        far = (high[axis] - start[axis]) / velocity[axis]
+        if near > far:
+            near, far = far, near
+        enter, leave = max(enter, near), min(leave, far)
+        if enter > leave:
+            return None
+    return enter
+
+
+def _circle_entry(start, velocity, center, radius, limit):
+    # Earliest s in [0, limit] at which start + velocity * s is within radius of center
+    ox, oy = start[0] - center[0], start[1] - center[1]
+    a = velocity[0] ** 2 + velocity[1] ** 2
+    b = ox * velocity[0] + oy * velocity[1]
+    c = ox ** 2 + oy ** 2 - radius ** 2
+    if c <= 0:
+        return 0.0
+    discriminant = b * b - a * c
+    if a == 0 or b >= 0 or discriminant < 0:
+        return None
+    s = (-b - math.sqrt(discriminant)) / a
+    return s if s <= limit else None
+
+
+def circle_box_contact(start, velocity, width, height, radius, limit):
+    """First time a circle moving from ``start`` touches the box (0, 0)-(width, height).
+
+    The circle moves at a constant ``velocity`` for at most ``limit``
+    seconds. Touching is the centre coming within ``radius`` of the box,
+    i.e. entering the box grown by radius with rounded corners: the union
+    of two crossed boxes and four corner circles, each entered in closed
+    form. Returns None if there is no contact in time.
+    """
+    # The rounded box lies inside the grown box, which most kicks miss entirely
+    if _box_entry(start, velocity, (-radius, -radius), (width + radius, height + radius),
+                  limit) is None:
+        return None
+    entries = [
+        _box_entry(start, velocity, (-radius, 0), (width + radius, height), limit),
+        _box_entry(start, velocity, (0, -radius), (width, height + radius), limit),
+    ]
+    for corner in ((0, 0), (width, 0), (0, height), (width, height)):
+        entries.append(_circle_entry(start, velocity, corner, radius, limit))
+    entries = [s for s in entries if s is not None]
+    return min(entries) if entries else None
+
+
+def swept_contact(ball, keeper_pos, keeper, width, height, radius=BALL_RADIUS):
+    """Time at which the ball first touches the goalkeeper during its flight, or None.
+
+    ``ball`` is the ball's Motion and ``keeper`` the goalkeeper's (None for
+    one standing at ``keeper_pos``); both start at time 0. In the
+    goalkeeper's frame the ball moves in a straight line until the
+    goalkeeper stops, and in another one after that, so the contact time
+    is exact whatever step the match is simulated with.
+    """
+    times = [0.0, ball.duration]
+    if keeper and keeper.duration < ball.duration:
+        times.insert(1, keeper.duration)
+    for begin, end in zip(times, times[1:]):
+        ball_pos = ball.position(begin)
+        keeper_at = keeper.position(begin) if keeper else keeper_pos
+        ball_velocity = ball.velocity(begin)
+        keeper_velocity = keeper.velocity(begin) if keeper else (0.0, 0.0)
+        contact = circle_box_contact(
+            (ball_pos[0] - keeper_at[0], ball_pos[1] - keeper_at[1]),
+            (ball_velocity[0] - keeper_velocity[0], ball_velocity[1] - keeper_velocity[1]),
+            width, height, radius, end - begin)
+        if contact is not None:
+            return begin + contact
+    return None
+
+
+class KickResults:
+    """Growable sequence of kick results packed two bits per kick.
+
+    Holds the same values as a list of results (1 for a goal, 0 for a miss,
+    -1 for a kick not yet taken) and supports the list operations the match
+    uses, so a sudden death of any length keeps its whole history in a
+    quarter of a byte per kick.
+    """
+    __slots__ = ("bits", "length")
+
+    def __init__(self, results=()):
+        self.bits = bytearray()
+        self.length = 0
+        for result in results:
+            self.append(result)
+
+    def __len__(self):
+        return self.length
+
+    def _index(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("kick result index out of range")
+        return index
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.length))]
+        index = self._index(index)
+        return (self.bits[index >> 2] >> ((index & 3) << 1) & 3) - 1
+
+    def __setitem__(self, index, result):
+        index = self._index(index)
+        shift = (index & 3) << 1
+        byte = index >> 2
+        self.bits[byte] = self.bits[byte] & ~(3 << shift) | (result + 1) << shift
+
+    def __iter__(self):
+        for index in range(self.length):
+            yield self[index]
+
+    def __eq__(self, other):
+        if isinstance(other, KickResults):
+            return self.length == other.length and self.bits == other.bits
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return f"KickResults({list(self)!r})"
+
+    def append(self, result):
+        if self.length & 3 == 0:
+            self.bits.append(0)
+        self.length += 1
+        self[-1] = result
+
+    def state(self):
+        # Immutable copy for snapshots
+        return self.length, bytes(self.bits)
+
+    @classmethod
+    def from_state(cls, state):
+        results = cls()
+        results.length, bits = state
+        results.bits = bytearray(bits)
+        return results
+
+
+# Match state saved by Match.snapshot(): plain values, then lists, which are
+# copied as tuples so a snapshot never shares anything mutable with the match,
+# then kick histories, copied packed
+SNAPSHOT_FIELDS = (
+    "realtime", "kick_order", "seed", "step_count", "difficulty",
+    "player_score", "cpu_score", "current_round", "kicks_taken", "player_turn",
+    "game_over", "result_message", "ball_moving", "sudden_death",
+    "cpu_goalkeeper_width", "cpu_goalkeeper_height",
+    "player_goalkeeper_width", "player_goalkeeper_height",
+    "goal_scored", "ball_motion", "ball_time", "goalkeeper_motion", "goalkeeper_time",
+    "waiting_time", "cpu_preparation_time", "preparing_for_cpu_kick",
+    "check_win_after_waiting", "sd_round", "collision", "impact_time",
+)
+SNAPSHOT_LIST_FIELDS = (
+    "ball_pos", "target_pos", "goalkeeper_pos", "goalkeeper_target",
+    "player_results", "cpu_results",
+)
+SNAPSHOT_HISTORY_FIELDS = ("sd_player_results", "sd_cpu_results")
+_snapshot_values = operator.attrgetter(*SNAPSHOT_FIELDS)
+_snapshot_lists = operator.attrgetter(*SNAPSHOT_LIST_FIELDS)
+_snapshot_histories = operator.attrgetter(*SNAPSHOT_HISTORY_FIELDS)
+
+
+class Match:
+    """Rules and state of a single shootout, independent of any display.
+
+    With ``realtime=False`` the pauses between kicks are skipped so a match
+    can be stepped as fast as the interpreter allows. Given the same ``seed``
+    and the same player input, a match always plays out identically.
+
+    By default the CPU aims and dives uniformly at random. A ``cpu_strategy``
+    object with ``kick_target(match)`` and ``keeper_target(match)`` methods
+    (see penalty_strategy) makes those choices instead. A strategy that
+    learns also has ``record_shot(match)``, called once the CPU goalkeeper
+    has chosen its dive against a player shot, and ``state()`` and
+    ``restore(state)``, so its state is part of every snapshot.
+
+    With ``collision=COLLISION_SWEPT`` the ball and goalkeeper move
+    continuously and a kick is saved if the ball's circle touches the
+    goalkeeper at any moment of its flight, which gives the same outcome
+    whatever step the match is simulated with (see swept_contact).
+
+    The whole state can be captured with ``snapshot()`` and put back with
+    ``restore()``; ``clone()`` makes an independent copy (see also
+    penalty_snapshot for saving to disk and rewinding).
+    """
+    __slots__ = SNAPSHOT_FIELDS + SNAPSHOT_LIST_FIELDS + SNAPSHOT_HISTORY_FIELDS + (
+        "rng", "player_rng", "cpu_strategy", "recorder", "__weakref__")
+
+    # How the two sides are called in messages
+    side_names = ("Player", "CPU")
+
+    def __init__(self, difficulty=DIFFICULTY_NORMAL, realtime=True, kick_order=KICK_ORDER_ABAB,
+                 seed=None, cpu_strategy=None, collision=COLLISION_POINT):
+        self.realtime = realtime
+        self.kick_order = kick_order
+        self.collision = collision
+        self.cpu_strategy = cpu_strategy
+        
+        # Every random choice of the match comes from its own seeded generator.
+        # Headless player policies draw from a separate stream so that
+        # replaying the recorded player input leaves the CPU's choices intact.
+        self.seed = random.getrandbits(64) if seed is None else seed
+        self.rng = random.Random(self.seed)
+        self.player_rng = random.Random(self.rng.getrandbits(64))
+        self.step_count = 0  # Simulation steps completed
+        self.recorder = None  # Optional observer of kicks and keeper moves, see penalty_replay
+        self.difficulty = difficulty
+        self.player_score = 0
+        self.cpu_score = 0
+        self.current_round = 1
+        self.kicks_taken = 0  # Kicks taken so far, including sudden death
+        self.player_turn = True
+        self.game_over = False
+        self.result_message = ""
+        self.ball_pos = list(PENALTY_SPOT)
+        self.target_pos = None
+        self.ball_moving = False
+        self.sudden_death = False  # Flag for sudden death mode
+        
+        # Set goalkeeper sizes based on difficulty
+        (self.cpu_goalkeeper_width, self.cpu_goalkeeper_height,
+         self.player_goalkeeper_width, self.player_goalkeeper_height) = goalkeeper_sizes(difficulty)
+        
+        # Position goalkeeper in the center of the goal
+        self.goalkeeper_pos = [
+            GOAL_X + (GOAL_WIDTH - self.get_current_goalkeeper_width()) // 2,
+            GOAL_Y + (GOAL_HEIGHT - self.get_current_goalkeeper_height()) // 2
+        ]
+        
+        self.goalkeeper_target = None
+        self.goal_scored = None
+        
+        # Closed-form flight of the ball and the CPU goalkeeper, and how long
+        # each has been under way
+        self.ball_motion = None
+        self.ball_time = 0
+        self.goalkeeper_motion = None
+        self.goalkeeper_time = 0
+        self.impact_time = None  # When the ball touches the goalkeeper, swept collision only
+        
+        self.waiting_time = 0
+        self.cpu_preparation_time = 0  # Seconds before CPU kicks
+        self.preparing_for_cpu_kick = False
+        self.check_win_after_waiting = False  # Flag to check for win after showing result
+        
+        # Track individual kick results (1 for goal, 0 for miss, -1 for not yet taken)
+        self.player_results = [-1] * MAX_ROUNDS
+        self.cpu_results = [-1] * MAX_ROUNDS
+        
+        # For sudden death rounds, every round kept however long it lasts
+        self.sd_player_results = KickResults()
+        self.sd_cpu_results = KickResults()
+        self.sd_round = 0
+        
+    def get_current_goalkeeper_width(self):
+        # Return the appropriate goalkeeper width based on whose turn it is
+        if self.player_turn:
+            return self.cpu_goalkeeper_width  # CPU is the goalkeeper when player kicks
+        else:
+            return self.player_goalkeeper_width  # Player is the goalkeeper when CPU kicks
+            
+    def get_current_goalkeeper_height(self):
+        # Return the appropriate goalkeeper height based on whose turn it is
+        if self.player_turn:
+            return self.cpu_goalkeeper_height  # CPU is the goalkeeper when player kicks
+        else:
+            return self.player_goalkeeper_height  # Player is the goalkeeper when CPU kicks
+
+    def pause_time(self, seconds):
+        # Pauses only exist for the viewer, a headless match skips them
+        return seconds if self.realtime else 0
+
+    def awaiting_player_kick(self):
+        # The player may shoot once the previous kick has been settled
+        return (self.player_turn and not self.ball_moving
+                and self.goal_scored is None and not self.game_over)
+
+    def awaiting_cpu_kick(self):
+        # The player's goalkeeper can be positioned until the CPU shoots
+        return (not self.player_turn and not self.ball_moving
+                and self.goal_scored is None and not self.game_over)
+
+    def step(self, dt=TIME_STEP):
+        """Advance the match by dt seconds (one fixed simulation step)"""
+        self.move_ball(dt)
+        self.move_goalkeeper(dt)
+        self.update_cpu_preparation(dt)  # Handle CPU preparation time
+
+        # If ball stopped moving, prepare for next turn
+        if not self.ball_moving and self.goal_scored is not None:
+            self.next_turn(dt)
+        self.step_count += 1
+
+    def play(self, kicker=None, keeper=None):
+        """Run the match to the end without a display.
+
+        ``kicker(match)`` returns the player's shot target and ``keeper(match)``
+        the position of the player's goalkeeper before each CPU kick. Both
+        default to uniformly random choices.
+        """
+        kicker = kicker or random_goal_target
+        keeper = keeper or random_keeper_position
+        while not self.game_over:
+            if self.awaiting_player_kick():
+                self.player_shoot(kicker(self))
+                if not self.ball_moving:
+                    raise ValueError("kicker must aim inside the goal")
+            elif self.awaiting_cpu_kick():
+                self.cpu_goalkeeper_move(keeper(self))
+            if self.ball_moving:
+                self.resolve_kick()
+            self.step()
+        return self
+
+    def snapshot(self):
+        """Immutable copy of the match state, random generators and CPU strategy included"""
+        strategy_state = getattr(self.cpu_strategy, "state", None)
+        return (_snapshot_values(self),
+                tuple(None if value is None else tuple(value) for value in _snapshot_lists(self)),
+                tuple(history.state() for history in _snapshot_histories(self)),
+                self.rng.getstate(), self.player_rng.getstate(),
+                strategy_state() if strategy_state else None)
+
+    def restore(self, snapshot):
+        """Put the match back in a state returned by snapshot()"""
+        values, lists, histories, rng_state, player_rng_state, strategy_state = snapshot
+        for name, value in zip(SNAPSHOT_FIELDS, values):
+            setattr(self, name, value)
+        for name, value in zip(SNAPSHOT_LIST_FIELDS, lists):
+            setattr(self, name, None if value is None else list(value))
+        for name, state in zip(SNAPSHOT_HISTORY_FIELDS, histories):
+            setattr(self, name, KickResults.from_state(state))
+        self.rng.setstate(rng_state)
+        self.player_rng.setstate(player_rng_state)
+        if strategy_state is not None and hasattr(self.cpu_strategy, "restore"):
+            self.cpu_strategy.restore(strategy_state)
+        return self
+
+    def clone(self):
+        """Independent copy of the match that plays on identically.
+
+        A CPU strategy with state is copied, a stateless one shared. The
+        recorder is not, so exploring a clone never shows up in a replay.
+        """
+        match = object.__new__(type(self))
+        if hasattr(self, "__dict__"):
+            match.__dict__.update(self.__dict__)  # Subclass state, e.g. a replay position
+        # Generators are filled in by restore(), so skip seeding them first
+        match.rng = random.Random.__new__(random.Random)
+        match.player_rng = random.Random.__new__(random.Random)
+        match.cpu_strategy = self.cpu_strategy
+        if hasattr(self.cpu_strategy, "restore"):
+            # restore() below gives the copy state of its own
+            match.cpu_strategy = copy.copy(self.cpu_strategy)
+        match.recorder = None
+        return match.restore(self.snapshot())
+
+    def current_ball_motion(self, dt=TIME_STEP):
+        # Start a new flight when the ball is kicked toward a new target
+        if self.ball_motion is None or self.ball_motion.target != tuple(self.target_pos):
+            swept = self.collision == COLLISION_SWEPT
+            self.ball_motion = Motion(self.ball_pos, self.target_pos, BALL_SPEED, 0 if swept else dt)
+            self.ball_time = 0
+            if swept:
+                # The goalkeeper sets off with the ball, so the whole kick is known now
+                keeper = self.current_goalkeeper_motion(dt) if self.goalkeeper_target else None
+                self.impact_time = swept_contact(
+                    self.ball_motion, self.goalkeeper_pos, keeper,
+                    int(self.get_current_goalkeeper_width()),
+                    int(self.get_current_goalkeeper_height()))
+        return self.ball_motion
+    def current_goalkeeper_motion(self, dt=TIME_STEP):
+        if (self.goalkeeper_motion is None
+                or self.goalkeeper_motion.target != tuple(self.goalkeeper_target)):
+            self.goalkeeper_motion = Motion(self.goalkeeper_pos, self.goalkeeper_target,
+                                            GOALKEEPER_SPEED,
+                                            0 if self.collision == COLLISION_SWEPT else dt)
+            self.goalkeeper_time = 0
+        return self.goalkeeper_motion
+    def kick_end_time(self, motion):
+        # Flight time after which the kick is decided: the ball's arrival, or
+        # with swept collision its first touch of the goalkeeper
+        return motion.duration if self.impact_time is None else self.impact_time
+    def stop_goalkeeper(self):
+        # With swept collision the goalkeeper stops where the kick was decided
+        if self.goalkeeper_target:
+            self.goalkeeper_pos = self.current_goalkeeper_motion().position(self.ball_time)
+            self.goalkeeper_target = None
+            self.goalkeeper_motion = None
+    def move_ball(self, dt=TIME_STEP):
+        if self.ball_moving and self.target_pos:
+            motion = self.current_ball_motion(dt)
+            end = self.kick_end_time(motion)
+            if self.ball_time >= end - TIME_EPSILON:  # Ball reached target or goalkeeper
+                self.ball_moving = False
+                self.ball_motion = None
+                if self.collision == COLLISION_SWEPT:
+                    self.ball_time = end
+                    self.stop_goalkeeper()
+                self.check_goal()
+                return
+            
+            self.ball_time += dt
+            self.ball_pos = motion.position(min(self.ball_time, end))
+            
+    def move_goalkeeper(self, dt=TIME_STEP):
+        if self.goalkeeper_target:
+            motion = self.current_goalkeeper_motion(dt)
+            if motion.arrived(self.goalkeeper_time):  # Goalkeeper reached target
+                self.goalkeeper_target = None
+                self.goalkeeper_motion = None
+                return
+            
+            self.goalkeeper_time += dt
+            self.goalkeeper_pos = motion.position(self.goalkeeper_time)
+    def resolve_kick(self):
+        """Settle the kick in flight at once and return whether it was a goal.
+
+        The ball and goalkeeper are placed where the stepped simulation would
+        have them when the ball arrives, without stepping through the flight.
+        """
+        if not self.ball_moving:
+            return self.goal_scored
+        
+        motion = self.current_ball_motion()
+        remaining = max(self.kick_end_time(motion) - self.ball_time, 0)
+        self.ball_time += remaining
+        self.ball_pos = motion.position(self.ball_time)
+        
+        # The goalkeeper keeps running for the rest of the flight
+        if self.goalkeeper_target:
+            keeper_motion = self.current_goalkeeper_motion()
+            self.goalkeeper_time += remaining
+            self.goalkeeper_pos = keeper_motion.position(self.goalkeeper_time)
+        
+        self.ball_moving = False
+        self.ball_motion = None
+        if self.collision == COLLISION_SWEPT:
+            self.stop_goalkeeper()
+        self.check_goal()
+        return self.goal_scored
+    def check_goal(self):
+        goal_x = SCREEN_WIDTH // 2 - GOAL_WIDTH // 2
+        goal_y = SCREEN_HEIGHT // 4 - GOAL_HEIGHT // 2
+        
+        # Check if ball is in goal area
+        in_goal_x = goal_x < self.ball_pos[0] < goal_x + GOAL_WIDTH
+        in_goal_y = goal_y < self.ball_pos[1] < goal_y + GOAL_HEIGHT
+        
+        # Check if goalkeeper blocked
+        if self.collision == COLLISION_SWEPT:
+            blocked = self.impact_time is not None  # Touched on the way
+        else:
+            gk_left = self.goalkeeper_pos[0]
+            gk_right = self.goalkeeper_pos[0] + int(self.get_current_goalkeeper_width())
+            gk_top = self.goalkeeper_pos[1]
+            gk_bottom = self.goalkeeper_pos[1] + int(self.get_current_goalkeeper_height())
+            
+            blocked = (gk_left < self.ball_pos[0] < gk_right and 
+                      gk_top < self.ball_pos[1] < gk_bottom)
+        
+        if in_goal_x and in_goal_y and not blocked:
+            self.goal_scored = True
+            self.result_message = "GOAL!"
+            if self.player_turn:
+                self.player_score += 1
+                if self.sudden_death:
+                    self.sd_player_results[-1] = 1  # 1 for goal
+                else:
+                    self.player_results[self.current_round - 1] = 1  # 1 for goal
+            else:
+                self.cpu_score += 1
+                if self.sudden_death:
+                    self.sd_cpu_results[-1] = 1  # 1 for goal
+                else:
+                    self.cpu_results[self.current_round - 1] = 1  # 1 for goal
+        else:
+            self.goal_scored = False
+            self.result_message = "SAVED!"
+            if self.player_turn:
+                if self.sudden_death:
+                    self.sd_player_results[-1] = 0  # 0 for miss
+                else:
+                    self.player_results[self.current_round - 1] = 0  # 0 for miss
+            else:
+                if self.sudden_death:
+                    self.sd_cpu_results[-1] = 0  # 0 for miss
+                else:
+                    self.cpu_results[self.current_round - 1] = 0  # 0 for miss
+        
+        self.kicks_taken += 1
+        if self.recorder:
+            self.recorder.record_result(self)
+        
+        # Always set waiting time to show the result before checking for win
+        self.waiting_time = self.pause_time(RESULT_WAIT_TIME)  # Show the result for 1 second
+        
+        # Flag to check for win after waiting time
+        self.check_win_after_waiting = True
+    def next_turn(self, dt=TIME_STEP):
+        # If we're waiting after a goal/save, just count down
+        if self.waiting_time > TIME_EPSILON:
+            self.waiting_time -= dt
+            return
+            
+        # Check if we need to check for win after showing the result
+        if self.check_win_after_waiting:
+            self.check_win_after_waiting = False
+            
+            # Handle sudden death mode differently
+            if self.sudden_death:
+                # In sudden death, we check for a winner after both players have kicked
+                player_result = self.sd_player_results[-1]
+                cpu_result = self.sd_cpu_results[-1]
+                
+                # One player scored and the other missed
+                if -1 not in (player_result, cpu_result) and player_result != cpu_result:
+                    self.end_game()
+                    return
+                # If both scored or both missed, continue to next sudden death round
+            elif self.is_decided():
+                # Neither side can catch up with the kicks it has left
+                self.end_game()
+                return
+            elif self.kicks_taken == 2 * MAX_ROUNDS:
+                # Scores are tied after the regular rounds, go to sudden death
+                self.start_sudden_death()
+                return
+        
+        # If game is already marked as over, end it now
+        if self.game_over:
+            self.end_game()
+            return
+        
+        self.result_message = ""
+        self.ball_pos = list(PENALTY_SPOT)
+        
+        # The kick order decides who shoots next
+        self.player_turn = self.player_kicks_next()
+        if self.sudden_death:
+            if self.kicks_taken % 2 == 0:  # Both sides have kicked this round
+                self.sd_round += 1  # Increment sudden death round
+                self.sd_player_results.append(-1)  # Add placeholder for new round
+                self.sd_cpu_results.append(-1)
+        else:
+            self.current_round = self.kicks_taken // 2 + 1
+        
+        self.reset_kick()
+    def is_decided(self):
+        # Look up whether the regular rounds can still change the winner
+        table = decision_table(MAX_ROUNDS, self.kick_order)
+        return table[self.kicks_taken][self.player_score][self.cpu_score]
+    def player_kicks_next(self):
+        return player_takes_kick(self.kicks_taken, self.kick_order)
+    def reset_kick(self):
+        # Put the ball on the spot and the goalkeeper facing it in the middle of the goal
+        goal_x = SCREEN_WIDTH // 2 - GOAL_WIDTH // 2
+        goal_y = SCREEN_HEIGHT // 4 - GOAL_HEIGHT // 2
+        
+        # Use integer values for goalkeeper position calculation
+        current_gk_width = int(self.get_current_goalkeeper_width())
+        current_gk_height = int(self.get_current_goalkeeper_height())
+        
+        self.goalkeeper_pos = [
+            goal_x + (GOAL_WIDTH - current_gk_width) // 2,
+            goal_y + (GOAL_HEIGHT - current_gk_height) // 2
+        ]
+        
+        self.target_pos = None
+        self.ball_moving = False
+        self.goalkeeper_target = None
+        self.goal_scored = None
+        self.ball_motion = None
+        self.goalkeeper_motion = None
+        self.impact_time = None
+        
+        if not self.player_turn:
+            # Prepare for CPU's turn with a delay
+            self.preparing_for_cpu_kick = True
+            self.cpu_preparation_time = self.pause_time(CPU_PREPARATION_TIME)  # 3 seconds
+    def update_cpu_preparation(self, dt=TIME_STEP):
+        if self.preparing_for_cpu_kick:
+            if self.cpu_preparation_time > TIME_EPSILON:
+                self.cpu_preparation_time -= dt
+            else:
+                self.preparing_for_cpu_kick = False
+                
+                # If game is already marked as over, end it now
+                if self.game_over:
+                    self.end_game()
+                    return
+                
+                # Proceed with CPU's kick if the game isn't over
+                self.cpu_shoot()
+                
+    def cpu_shoot(self):
+        # CPU randomly selects target
+        goal_x = SCREEN_WIDTH // 2 - GOAL_WIDTH // 2
+        goal_y = SCREEN_HEIGHT // 4 - GOAL_HEIGHT // 2
+        
+        if self.cpu_strategy:
+            target_x, target_y = self.cpu_strategy.kick_target(self)
+        else:
+            target_x = self.rng.randint(goal_x + 20, goal_x + GOAL_WIDTH - 20)
+            target_y = self.rng.randint(goal_y + 20, goal_y + GOAL_HEIGHT - 20)
+        self.target_pos = [target_x, target_y]
+        
+        # Player controls goalkeeper
+        self.ball_moving = True
+        if self.recorder:
+            self.recorder.record_shot(self)
+    def player_shoot(self, pos):
+        # Only one shot per kick, not again while its result is on show
+        if self.awaiting_player_kick():
+            goal_x = SCREEN_WIDTH // 2 - GOAL_WIDTH // 2
+            goal_y = SCREEN_HEIGHT // 4 - GOAL_HEIGHT // 2
+            
+            # Check if click is in goal area
+            if (goal_x < pos[0] < goal_x + GOAL_WIDTH and 
+                goal_y < pos[1] < goal_y + GOAL_HEIGHT):
+                self.target_pos = pos
+                self.ball_moving = True
+                
+                if self.cpu_strategy:
+                    random_x, random_y = self.cpu_strategy.keeper_target(self)
+                else:
+                    # CPU goalkeeper moves randomly within the goal area
+                    # Convert float values to integers for randint
+                    random_x = self.rng.randint(goal_x, int(goal_x + GOAL_WIDTH - self.cpu_goalkeeper_width))
+                    random_y = self.rng.randint(goal_y, int(goal_y + GOAL_HEIGHT - self.cpu_goalkeeper_height))
+                self.goalkeeper_target = [random_x, random_y]
+                if hasattr(self.cpu_strategy, "record_shot"):
+                    self.cpu_strategy.record_shot(self)  # Learnt after the dive is chosen
+                if self.recorder:
+                    self.recorder.record_shot(self)
+                
+    def cpu_goalkeeper_move(self, pos):
+        # Allow goalkeeper movement during CPU preparation time or when it's CPU's turn
+        if self.player_turn or self.ball_moving:
+            return
+            
+        goal_x = SCREEN_WIDTH // 2 - GOAL_WIDTH // 2
+        goal_y = SCREEN_HEIGHT // 4 - GOAL_HEIGHT // 2
+        max_x = goal_x + GOAL_WIDTH - int(self.player_goalkeeper_width)
+        max_y = goal_y + GOAL_HEIGHT - int(self.player_goalkeeper_height)
+        
+        # Limit goalkeeper movement to goal area
+        if pos[0] < goal_x:
+            pos = (goal_x, pos[1])
+        elif pos[0] > max_x:
+            pos = (max_x, pos[1])
+            
+        # Also allow vertical movement
+        if pos[1] < goal_y:
+            pos = (pos[0], goal_y)
+        elif pos[1] > max_y:
+            pos = (pos[0], max_y)
+            
+        # Update both x and y positions
+        self.goalkeeper_pos[0] = pos[0]
+        self.goalkeeper_pos[1] = pos[1]
+        if self.recorder:
+            self.recorder.record_keeper_move(self)
+    def start_sudden_death(self):
+        """Start sudden death mode after a tie in regular rounds"""
+        self.sudden_death = True
+        self.sd_round = 1
+        self.sd_player_results.append(-1)  # Add placeholder for first sudden death round
+        self.sd_cpu_results.append(-1)
+        self.player_turn = self.player_kicks_next()  # The kick order carries on into sudden death
+        self.result_message = "SUDDEN DEATH!"
+        self.preparing_for_cpu_kick = False
+        
+        # Reset ball and goalkeeper for the first sudden death kick
+        self.ball_pos = list(PENALTY_SPOT)
+        self.reset_kick()
+        self.waiting_time = self.pause_time(SUDDEN_DEATH_WAIT_TIME)  # Show message for 2 seconds
+        
+    def end_game(self):
+        # If game is already over, just update the message
+        if not self.game_over:
+            self.game_over = True
+            player, cpu = self.side_names
+            if self.player_score > self.cpu_score:
+                self.result_message = f"{player.upper()} WINS!"
+            elif self.cpu_score > self.player_score:
+                self.result_message = f"{cpu.upper()} WINS!"
+            else:
+                self.result_message = "IT'S A DRAW!"
+                
+            # Display additional message if game ended early
+            if not self.sudden_death and self.current_round <= MAX_ROUNDS:
+                remaining = MAX_ROUNDS - self.current_round
+                if self.current_round == MAX_ROUNDS:
+                    # Final round, show appropriate message
+                    if self.player_score > self.cpu_score:
+                        self.result_message += f"\n{player} wins in the final round!"
+                    elif self.cpu_score > self.player_score:
+                        self.result_message += f"\n{cpu} wins in the final round!"
+                elif remaining > 0:
+                    # Earlier rounds, show remaining kicks
+                    if self.player_score > self.cpu_score:
+                        self.result_message += f"\n{player} wins with {remaining} kicks remaining!"
+                    else:
+                        self.result_message += f"\n{cpu} wins with {remaining} kicks remaining!"
+            elif self.sudden_death:
+                # Sudden death message
+                if self.player_score > self.cpu_score:
+                    self.result_message += f"\n{player} wins in sudden death round {self.sd_round}!"
+                else:
+                    self.result_message += f"\n{cpu} wins in sudden death round {self.sd_round}!"
+            
+    def restart_game(self, difficulty=None):
+        if difficulty is not None:
+            self.difficulty = difficulty
+        self.__init__(self.difficulty, self.realtime, self.kick_order,
+                      cpu_strategy=self.cpu_strategy, collision=self.collision)
+
+
+class Recorders:
+    """Several observers behind a Match's single recorder hook"""
+    def __init__(self, recorders):
+        self.recorders = list(recorders)
+
+    def record_shot(self, match):
+        for recorder in self.recorders:
+            recorder.record_shot(match)
+
+    def record_keeper_move(self, match):
+        for recorder in self.recorders:
+            recorder.record_keeper_move(match)
+
+    def record_result(self, match):
+        for recorder in self.recorders:
+            recorder.record_result(match)
+
+
+def add_recorder(match, recorder):
+    """Attach an observer with record_shot, record_keeper_move and record_result"""
+    if match.recorder is None:
+        match.recorder = recorder
+    elif isinstance(match.recorder, Recorders):
+        match.recorder.recorders.append(recorder)
+    else:
+        match.recorder = Recorders([match.recorder, recorder])
+    return recorder
+
+
+def random_goal_target(match):
+    # Uniform shot inside the goal with the same margins as the CPU kicker
+    target_x = match.player_rng.randint(GOAL_X + 20, GOAL_X + GOAL_WIDTH - 20)
+    target_y = match.player_rng.randint(GOAL_Y + 20, GOAL_Y + GOAL_HEIGHT - 20)
+    return (target_x, target_y)
+
+
+def random_keeper_position(match):
+    # Uniform goalkeeper position anywhere the goal allows
+    max_x = GOAL_X + GOAL_WIDTH - int(match.player_goalkeeper_width)
+    max_y = GOAL_Y + GOAL_HEIGHT - int(match.player_goalkeeper_height)
+    return (match.player_rng.randint(GOAL_X, max_x), match.player_rng.randint(GOAL_Y, max_y))
+
+
+def simulate_match(difficulty=DIFFICULTY_NORMAL, kicker=None, keeper=None, seed=None,
+                   cpu_strategy=None):
+    """Play one headless match and return the finished Match"""
+    return Match(difficulty, realtime=False, seed=seed,
+                 cpu_strategy=cpu_strategy).play(kicker, keeper)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    matches = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    for difficulty, name in ((DIFFICULTY_EASY, "Easy"), (DIFFICULTY_NORMAL, "Normal"),
+                             (DIFFICULTY_HARD, "Hard")):
+        start = time.perf_counter()
+        wins = 0
+        for _ in range(matches):
+            match = simulate_match(difficulty)
+            wins += match.player_score > match.cpu_score
+        elapsed = time.perf_counter() - start
+        print(f"{name}: player wins {wins / matches:.1%} "
+              f"({matches / elapsed:.0f} matches/s)")
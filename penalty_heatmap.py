@@ -0,0 +1,204 @@
+"""Conversion-rate heatmap of the goal mouth.
+
+The goal is split into the zones of penalty_adaptive and every zone is
+tinted from red (shots there never score) to green (they always do),
+more opaque the more kicks it has seen. The counts start from a kick
+analytics store, answered from its per-zone counts, and grow with the
+kicks of the session: a heatmap is a match recorder, so after every
+check_goal it repaints the one zone that was shot at on its cached
+surface instead of rebuilding it. The caller draws the surface, or better
+composites the changed areas into a layer it blits anyway, so the overlay
+costs next to nothing per frame.
+
+SaveHint draws a penalty_savefield field over the goal the same way, so
+the player can see where the random CPU goalkeeper is likely to get to.
+
+Needs NumPy, which colours the zones and bins the pixels of the goal
+mouth into zones for a full repaint.
+"""
+import functools
+
+import pygame
+
+from penalty_adaptive import HISTOGRAM_COLUMNS, HISTOGRAM_ROWS, ShotHistogram
+from penalty_engine import GOAL_WIDTH, GOAL_HEIGHT, GOAL_X, GOAL_Y, add_recorder
+from penalty_savefield import load_save_field
+
+ZONES = HISTOGRAM_COLUMNS * HISTOGRAM_ROWS
+HEATMAP_RECT = pygame.Rect(GOAL_X, GOAL_Y, GOAL_WIDTH, GOAL_HEIGHT)
+
+MISS_COLOR = (230, 40, 40)
+GOAL_COLOR = (40, 230, 40)
+MAX_ALPHA = 120
+HALF_ALPHA_KICKS = 10  # Kicks after which a zone is drawn at half of MAX_ALPHA
+
+SAVE_COLOR = (0, 0, 60)
+SAVE_ALPHA = 200  # Alpha of a certain save
+
+
+def zone_map():
+    """Zone of every pixel of the goal mouth, indexed [x, y] like surfarray"""
+    import numpy as np
+
+    columns = np.arange(GOAL_WIDTH) * HISTOGRAM_COLUMNS // GOAL_WIDTH
+    rows = np.arange(GOAL_HEIGHT) * HISTOGRAM_ROWS // GOAL_HEIGHT
+    return rows[np.newaxis, :] * HISTOGRAM_COLUMNS + columns[:, np.newaxis]
+
+
+class ShotHeatmap:
+    """Kicks and goals per zone for one difficulty and kicker, drawn on a surface.
+
+    ``surface`` covers HEATMAP_RECT. Every repaint bumps ``version`` and
+    records the screen area it touched; ``take_changes`` hands those areas
+    over to whoever composites the surface.
+    """
+    def __init__(self, difficulty, player=True, render_label=None):
+        import numpy as np
+
+        self.difficulty = difficulty
+        self.player = player
+        self.render_label = render_label  # text -> surface, for the rate in each zone
+        self.kicks = np.zeros(ZONES, dtype=np.int64)
+        self.goals = np.zeros(ZONES, dtype=np.int64)
+        self.surface = pygame.Surface(HEATMAP_RECT.size, pygame.SRCALPHA)
+        self.version = 0
+        self.changes = []
+        self.repaint()
+
+    def load(self, store):
+        """Add the counts of every matching kick in a KickStore"""
+        import numpy as np
+
+        counts = store.conversion(by=("zone",), difficulty=self.difficulty, player=self.player)
+        for (zone,), (kicks, goals) in counts.items():
+            self.kicks[zone] += kicks
+            self.goals[zone] += goals
+        if counts:
+            self.repaint()
+        return int(np.sum(self.kicks))
+
+    def watch(self, match):
+        add_recorder(match, self)
+        return match
+
+    def record_shot(self, match):
+        pass
+
+    def record_keeper_move(self, match):
+        pass
+
+    def record_result(self, match):
+        # Called by check_goal once the kick is settled
+        if match.difficulty != self.difficulty or bool(match.player_turn) != self.player:
+            return
+        zone = ShotHistogram.zone(*match.target_pos)
+        self.kicks[zone] += 1
+        self.goals[zone] += bool(match.goal_scored)
+        self.paint_zone(zone)
+
+    def colors(self):
+        """RGBA of every zone as a (ZONES, 4) array"""
+        import numpy as np
+
+        kicks = self.kicks.astype(float)
+        rate = np.divide(self.goals, kicks, out=np.zeros(ZONES), where=kicks > 0)
+        colors = np.empty((ZONES, 4))
+        colors[:, :3] = (np.outer(1 - rate, MISS_COLOR) + np.outer(rate, GOAL_COLOR))
+        colors[:, 3] = MAX_ALPHA * kicks / (kicks + HALF_ALPHA_KICKS)
+        return colors.round().astype(np.uint8)
+
+    def repaint(self):
+        """Redraw every zone"""
+        colors = self.colors()[zone_map()]
+        pixels = pygame.surfarray.pixels3d(self.surface)
+        pixels[...] = colors[..., :3]
+        del pixels  # Unlocks the surface
+        alpha = pygame.surfarray.pixels_alpha(self.surface)
+        alpha[...] = colors[..., 3]
+        del alpha
+        for zone in range(ZONES):
+            self._label(zone)
+        self._changed(HEATMAP_RECT.copy())
+
+    def paint_zone(self, zone):
+        """Redraw one zone after its counts changed"""
+        left, top, width, height = ShotHistogram.zone_rect(zone)
+        rect = pygame.Rect(left - GOAL_X, top - GOAL_Y, width, height)
+        self.surface.fill(tuple(self.colors()[zone]), rect)
+        self._label(zone)
+        self._changed(rect.move(GOAL_X, GOAL_Y))
+
+    def _label(self, zone):
+        if self.render_label is None or not self.kicks[zone]:
+            return
+        left, top, width, height = ShotHistogram.zone_rect(zone)
+        label = self.render_label(f"{self.goals[zone] / self.kicks[zone]:.0%}")
+        center = (left - GOAL_X + width // 2, top - GOAL_Y + height // 2)
+        self.surface.blit(label, label.get_rect(center=center))
+
+    def _changed(self, rect):
+        self.version += 1
+        self.changes.append(rect)
+
+    def take_changes(self):
+        """Screen areas repainted since the last call"""
+        changes, self.changes = self.changes, []
+        return changes
+
+
+class Heatmaps:
+    """The player's ShotHeatmap for each difficulty, created on first use.
+
+    A new heatmap starts from the kicks in ``store``, if there is one.
+    """
+    def __init__(self, store=None, render_label=None):
+        self.store = store
+        self.render_label = render_label
+        self.heatmaps = {}
+
+    def get(self, difficulty):
+        heatmap = self.heatmaps.get(difficulty)
+        if heatmap is None:
+            heatmap = self.heatmaps[difficulty] = ShotHeatmap(difficulty, render_label=self.render_label)
+            if self.store is not None:
+                heatmap.load(self.store)
+        return heatmap
+
+    def watch(self, match):
+        """Feed the match's kicks to its difficulty's heatmap and return that heatmap"""
+        heatmap = self.get(match.difficulty)
+        heatmap.watch(match)
+        return heatmap
+
+
+class SaveHint:
+    """A SaveField drawn over the goal: the darker, the likelier a save.
+
+    It never changes, so it has the ShotHeatmap drawing interface with a
+    single change, the first time it is composited.
+    """
+    def __init__(self, field):
+        import numpy as np
+
+        self.field = field
+        self.surface = pygame.Surface(HEATMAP_RECT.size, pygame.SRCALPHA)
+        self.surface.fill(SAVE_COLOR)
+        # Every pixel takes the value of its grid cell, as in SaveField.cell
+        columns = np.clip((np.arange(GOAL_WIDTH) - 1) // field.grid, 0, len(field.xs) - 1)
+        rows = np.clip((np.arange(GOAL_HEIGHT) - 1) // field.grid, 0, len(field.ys) - 1)
+        alpha = pygame.surfarray.pixels_alpha(self.surface)
+        # The square root spreads the typical 0-30% saves over a visible range
+        alpha[...] = (SAVE_ALPHA * np.sqrt(field.saved[np.ix_(columns, rows)])).round().astype(np.uint8)
+        del alpha
+        self.version = 0
+        self.changes = [HEATMAP_RECT.copy()]
+
+    def take_changes(self):
+        changes, self.changes = self.changes, []
+        return changes
+
+
+@functools.lru_cache(maxsize=None)
+def save_hint(difficulty):
+    """The SaveHint of a difficulty, loaded once per process"""
+    return SaveHint(load_save_field(difficulty))
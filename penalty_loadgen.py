@@ -0,0 +1,126 @@
+"""Load generator for penalty_server.
+
+Opens a number of connections, keeps a number of matches in flight on each
+and plays them with uniformly random shots and goalkeeper positions until
+the requested number of matches is done. Reports finished matches per
+second and the latency of every kick, from sending the input to receiving
+the settled state, as percentiles::
+
+    python3 penalty_server.py &
+    python3 penalty_loadgen.py --connections 8 --concurrency 250 --matches 20000
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from penalty_engine import GOAL_WIDTH, GOAL_HEIGHT, GOAL_X, GOAL_Y
+from penalty_server import (
+    DEFAULT_HOST, DEFAULT_PORT, STATUS_PLAYER_TURN, STATUS_GAME_OVER, MatchClient,
+)
+from penalty_strategy import CPU_STRATEGIES
+
+
+def percentile(sorted_values, share):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(share * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+async def play_matches(client, budget, rng, difficulty, cpu, latencies):
+    # Play matches one after another while the shared budget lasts
+    finished = 0
+    while budget[0] > 0:
+        budget[0] -= 1
+        match_id, state = await client.new_match(difficulty, cpu, rng.getrandbits(64))
+        while not state["status"] & STATUS_GAME_OVER:
+            start = time.perf_counter()
+            if state["status"] & STATUS_PLAYER_TURN:
+                delta = await client.kick(match_id, (
+                    rng.randint(GOAL_X + 20, GOAL_X + GOAL_WIDTH - 20),
+                    rng.randint(GOAL_Y + 20, GOAL_Y + GOAL_HEIGHT - 20)))
+            else:
+                # The server clamps the goalkeeper into the goal
+                delta = await client.keeper(match_id, (
+                    rng.randint(GOAL_X, GOAL_X + GOAL_WIDTH),
+                    rng.randint(GOAL_Y, GOAL_Y + GOAL_HEIGHT)))
+            latencies.append(time.perf_counter() - start)
+            state.update(delta)
+        client.close_match(match_id)
+        finished += 1
+    return finished
+
+
+async def run_load(matches, connections, concurrency, host=DEFAULT_HOST, port=DEFAULT_PORT,
+                   unix=None, difficulty=1, cpu=0, seed=0):
+    """Play ``matches`` matches and return a summary dictionary"""
+    rng = random.Random(seed)
+    clients = [await MatchClient.connect(host, port, unix) for _ in range(connections)]
+    budget = [matches]  # Matches not yet started, shared by every player
+    latencies = []
+    start = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(
+            play_matches(client, budget, random.Random(rng.getrandbits(64)), difficulty, cpu,
+                         latencies)
+            for client in clients for _ in range(concurrency)))
+    finally:
+        elapsed = time.perf_counter() - start
+        for client in clients:
+            await client.close()
+
+    latencies.sort()
+    return {
+        "matches": sum(results),
+        "kicks": len(latencies),
+        "seconds": elapsed,
+        "matches_per_second": sum(results) / elapsed,
+        "kicks_per_second": len(latencies) / elapsed,
+        "latency_ms": {
+            "mean": statistics.fmean(latencies) * 1e3 if latencies else 0.0,
+            "p50": percentile(latencies, 0.50) * 1e3,
+            "p90": percentile(latencies, 0.90) * 1e3,
+            "p99": percentile(latencies, 0.99) * 1e3,
+            "max": latencies[-1] * 1e3 if latencies else 0.0,
+        },
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure penalty_server throughput and latency")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", metavar="PATH", help="connect to a Unix socket instead of TCP")
+    parser.add_argument("--matches", type=int, default=10000, help="matches to play in total")
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=100,
+                        help="matches in flight per connection")
+    parser.add_argument("--difficulty", choices=("easy", "normal", "hard"), default="normal")
+    parser.add_argument("--cpu", choices=CPU_STRATEGIES, default="random")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="PATH", help="write the summary as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    summary = asyncio.run(run_load(
+        args.matches, args.connections, args.concurrency, args.host, args.port, args.unix,
+        ("easy", "normal", "hard").index(args.difficulty), CPU_STRATEGIES.index(args.cpu),
+        args.seed))
+    latency = summary["latency_ms"]
+    print(f"{summary['matches']} matches, {summary['kicks']} kicks in {summary['seconds']:.1f} s: "
+          f"{summary['matches_per_second']:.0f} matches/s, {summary['kicks_per_second']:.0f} kicks/s")
+    print(f"kick latency: mean {latency['mean']:.2f} ms, p50 {latency['p50']:.2f} ms, "
+          f"p90 {latency['p90']:.2f} ms, p99 {latency['p99']:.2f} ms, max {latency['max']:.2f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,536 @@
+"""Two-player matches between two processes, with rollback.
+
+The host takes the player's side and the guest the CPU's: whoever kicks
+clicks a target, whoever keeps steers the goalkeeper with the mouse, before
+and during the kick. Both processes run the same NetMatch from the same
+seed, and the only thing they exchange is each side's input for every
+simulation step, so the matches stay identical.
+
+Nobody waits for the network. Each process simulates its own input at
+once and predicts the other side's input as "the mouse stays where it was,
+no click". When the real input for an already simulated step arrives and
+differs, the match is restored from the snapshot taken before that step and
+re-simulated up to the present (a rollback). A process only stalls when its
+opponent falls more than MAX_ROLLBACK steps behind.
+
+Inputs go over UDP. Every packet repeats all inputs the opponent has not
+acknowledged yet, so lost packets need no retransmission logic. LossyLink
+adds artificial latency, jitter and packet loss to outgoing packets for
+testing, and ``--selftest`` plays two scripted peers over loopback::
+
+    python3 penalty_netplay.py --host                 # wait on port 8766
+    python3 penalty_netplay.py --join 192.168.1.5     # connect to a host
+    python3 penalty_netplay.py --selftest --latency 80 --jitter 30 --loss 0.2
+
+Packets (little-endian) start with "PKNP" and a type byte::
+
+    "H"  guest hello
+    "S"  start: u8 difficulty, u8 kick order, u64 seed
+    "I"  inputs: u32 ack, u32 first step, u16 count, count x (i16 x/y, u8 flags)
+
+``ack`` is how many of the receiver's inputs the sender has, so the
+receiver resends from there.
+"""
+import argparse
+import heapq
+import random
+import socket
+import struct
+import time
+
+from penalty_engine import (
+    GOAL_WIDTH, GOAL_HEIGHT, GOAL_X, GOAL_Y, TIME_STEP, TIME_EPSILON,
+    DIFFICULTY_EASY, DIFFICULTY_NORMAL, DIFFICULTY_HARD, KICK_ORDER_ABAB, COLLISION_POINT,
+    COLLISION_SWEPT, Match,
+)
+
+DEFAULT_PORT = 8766
+MAX_ROLLBACK = 15  # Steps simulated ahead of the opponent's last known input
+MAX_PACKET_INPUTS = 120  # Inputs repeated in one packet
+HELLO_INTERVAL = 0.1  # Seconds between handshake packets
+
+HOST, GUEST = 0, 1
+
+PACKET_MAGIC = b"PKNP"
+PACKET_TYPE = struct.Struct("<4sc")
+START = struct.Struct("<BBQ")
+INPUTS_HEADER = struct.Struct("<IIH")
+INPUT = struct.Struct("<hhB")
+
+# Input flags
+INPUT_CLICK = 1
+
+# Until the first input of a side arrives it is assumed to rest mid-goal
+NEUTRAL_INPUT = (GOAL_X + GOAL_WIDTH // 2, GOAL_Y + GOAL_HEIGHT // 2, 0)
+
+DIFFICULTIES = {"easy": DIFFICULTY_EASY, "normal": DIFFICULTY_NORMAL, "hard": DIFFICULTY_HARD}
+
+
+def predict(known):
+    # The opponent's next input: the mouse stays put and nobody clicks
+    if not known:
+        return NEUTRAL_INPUT
+    x, y, _ = known[-1]
+    return (x, y, 0)
+
+
+class GuestSide:
+    """The Match cpu_strategy of a NetMatch: the guest's choices come from input"""
+    name = "guest"
+
+    def kick_target(self, match):
+        return match.guest_target
+
+    def keeper_target(self, match):
+        return tuple(match.goalkeeper_target)
+
+
+class NetMatch(Match):
+    """A match between two people, driven by one input per side per step.
+
+    Both goalkeepers run toward their owner's mouse at goalkeeper speed
+    until the kick is decided; the host shoots with a click whenever it is
+    their kick, the guest once the countdown before their kick is over.
+
+    Only point collision is supported: swept collision fixes the time of
+    contact from the goalkeeper's target when the ball is kicked, and here
+    the goalkeepers keep following their mouse until the kick is decided.
+    """
+    side_names = ("Host", "Guest")
+
+    def __init__(self, difficulty=DIFFICULTY_NORMAL, realtime=True, kick_order=KICK_ORDER_ABAB,
+                 seed=None, cpu_strategy=None, collision=COLLISION_POINT):
+        if collision != COLLISION_POINT:
+            raise ValueError("network matches only support point collision")
+        super().__init__(difficulty, realtime, kick_order, seed, GuestSide(), collision)
+        self.guest_target = None
+
+    def update_cpu_preparation(self, dt=TIME_STEP):
+        if (self.preparing_for_cpu_kick and self.cpu_preparation_time <= TIME_EPSILON
+                and not self.game_over):
+            self.preparing_for_cpu_kick = False  # The guest shoots when they click
+            return
+        super().update_cpu_preparation(dt)
+
+    def keeper_aim(self, x, y):
+        # The mouse position clamped to where the goalkeeper fits in the goal
+        max_x = GOAL_X + GOAL_WIDTH - int(self.get_current_goalkeeper_width())
+        max_y = GOAL_Y + GOAL_HEIGHT - int(self.get_current_goalkeeper_height())
+        return [min(max(x, GOAL_X), max_x), min(max(y, GOAL_Y), max_y)]
+
+    def apply_inputs(self, host, guest):
+        """Apply one step's input of each side; call before step()"""
+        if self.game_over or self.goal_scored is not None:
+            return
+        kicker, keeper = (host, guest) if self.player_turn else (guest, host)
+        self.goalkeeper_target = self.keeper_aim(keeper[0], keeper[1])
+        if not kicker[2] & INPUT_CLICK:
+            return
+        if self.awaiting_player_kick():
+            self.player_shoot((kicker[0], kicker[1]))
+        elif self.awaiting_cpu_kick() and not self.preparing_for_cpu_kick:
+            if GOAL_X < kicker[0] < GOAL_X + GOAL_WIDTH and GOAL_Y < kicker[1] < GOAL_Y + GOAL_HEIGHT:
+                self.guest_target = (kicker[0], kicker[1])
+                self.cpu_shoot()
+
+
+class RollbackSession:
+    """Keeps a NetMatch in step with its opponent's input, rolling back on mispredictions"""
+    def __init__(self, match, side, max_rollback=MAX_ROLLBACK):
+        self.match = match
+        self.side = side
+        self.max_rollback = max_rollback
+        self.inputs = ([], [])  # Known input of each side, by step
+        self.local = self.inputs[side]
+        self.remote = self.inputs[1 - side]
+        self.snapshots = {}  # Step -> snapshot before it, for steps with predicted input
+        self.predictions = {}  # Step -> remote input it was simulated with
+        self.remote_ack = 0  # Local inputs the opponent has
+        self.rollbacks = 0
+        self.resimulated = 0
+        self.deepest_rollback = 0
+        self.stalls = 0
+
+    @property
+    def step(self):
+        return self.match.step_count
+
+    def confirmed(self):
+        # Steps simulated with both sides' real input
+        return min(len(self.remote), self.step)
+
+    def advance(self, local_input):
+        """Simulate the next step with this local input, or return False to wait"""
+        if self.step - len(self.remote) >= self.max_rollback:
+            self.stalls += 1
+            return False
+        self.local.append(local_input)
+        self._simulate(self.step)
+        return True
+
+    def _simulate(self, step):
+        remote = self.remote[step] if step < len(self.remote) else None
+        if remote is None:
+            remote = self.predictions[step] = predict(self.remote)
+            self.snapshots[step] = self.match.snapshot()
+        if self.side == HOST:
+            self.match.apply_inputs(self.local[step], remote)
+        else:
+            self.match.apply_inputs(remote, self.local[step])
+        self.match.step()
+
+    def receive(self, first, inputs):
+        """Take the opponent's inputs for steps first, first + 1, ..."""
+        start = len(self.remote)
+        self.remote.extend(inputs[start - first:])
+        if len(self.remote) == start:
+            return
+        # The earliest step that was simulated with a wrong guess
+        wrong = next((step for step in range(start, min(len(self.remote), self.step))
+                      if self.predictions[step] != self.remote[step]), None)
+        if wrong is not None:
+            self.rollback(wrong)
+        for step in range(start, min(len(self.remote), self.step)):
+            self.predictions.pop(step, None)
+            self.snapshots.pop(step, None)
+
+    def rollback(self, step):
+        # Restore the state before step and simulate back up to the present
+        present = self.step
+        self.match.restore(self.snapshots[step])
+        self.rollbacks += 1
+        self.resimulated += present - step
+        self.deepest_rollback = max(self.deepest_rollback, present - step)
+        for redo in range(step, present):
+            self.predictions.pop(redo, None)
+            self.snapshots.pop(redo, None)
+            self._simulate(redo)
+
+    def packet(self):
+        """An inputs packet with every local input the opponent lacks"""
+        first = self.remote_ack
+        inputs = self.local[first:first + MAX_PACKET_INPUTS]
+        return (PACKET_TYPE.pack(PACKET_MAGIC, b"I")
+                + INPUTS_HEADER.pack(len(self.remote), first, len(inputs))
+                + b"".join(INPUT.pack(*i) for i in inputs))
+
+    def handle_inputs(self, data):
+        ack, first, count = INPUTS_HEADER.unpack_from(data)
+        self.remote_ack = max(self.remote_ack, ack)
+        if first <= len(self.remote) < first + count:
+            self.receive(first, list(INPUT.iter_unpack(
+                data[INPUTS_HEADER.size:INPUTS_HEADER.size + count * INPUT.size])))
+
+
+class LossyLink:
+    """Sends datagrams after an artificial delay, dropping some of them"""
+    def __init__(self, sock, address, latency=0.0, jitter=0.0, loss=0.0, seed=None,
+                 clock=time.perf_counter):
+        self.sock = sock
+        self.address = address
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.clock = clock
+        self.queue = []  # (due time, sequence, packet)
+        self.sequence = 0
+        self.sent = 0
+        self.dropped = 0
+
+    def send(self, packet):
+        if self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        due = self.clock() + self.latency + self.rng.uniform(0, self.jitter)
+        heapq.heappush(self.queue, (due, self.sequence, packet))
+        self.sequence += 1
+        self.flush()
+
+    def flush(self):
+        # Put every packet that is due on the wire
+        now = self.clock()
+        while self.queue and self.queue[0][0] <= now:
+            _, _, packet = heapq.heappop(self.queue)
+            try:
+                self.sock.sendto(packet, self.address)
+                self.sent += 1
+            except (BlockingIOError, ConnectionRefusedError):
+                self.dropped += 1
+
+
+def receive_packets(sock):
+    """(address, type, body) of every datagram waiting on a non-blocking socket"""
+    packets = []
+    while True:
+        try:
+            data, address = sock.recvfrom(65536)
+        except (BlockingIOError, ConnectionRefusedError):
+            return packets
+        if len(data) >= PACKET_TYPE.size:
+            magic, kind = PACKET_TYPE.unpack_from(data)
+            if magic == PACKET_MAGIC:
+                packets.append((address, kind, data[PACKET_TYPE.size:]))
+
+
+class Peer:
+    """One end of a netplay connection: handshake, then input exchange"""
+    def __init__(self, sock, side, address=None, link_options=None, difficulty=DIFFICULTY_NORMAL,
+                 seed=None, match_class=NetMatch):
+        self.sock = sock
+        self.side = side
+        self.address = address  # The guest knows the host; the host learns the guest's
+        self.link_options = link_options or {}
+        self.link = LossyLink(sock, address, **self.link_options) if address else None
+        self.difficulty = difficulty
+        self.seed = random.getrandbits(64) if seed is None else seed
+        self.match_class = match_class
+        self.session = None
+        self.last_hello = -HELLO_INTERVAL
+
+    def poll(self, now):
+        """Handle incoming packets and send what is due; True once the match runs"""
+        for address, kind, body in receive_packets(self.sock):
+            if self.side == HOST and kind == b"H" and self.address in (None, address):
+                if self.link is None:
+                    self.address = address
+                    self.link = LossyLink(self.sock, address, **self.link_options)
+                self.start_match()
+            elif self.side == GUEST and kind == b"S" and self.session is None:
+                difficulty, kick_order, seed = START.unpack_from(body)
+                self.session = RollbackSession(
+                    self.match_class(difficulty, kick_order=kick_order, seed=seed), GUEST)
+            elif kind == b"I" and self.session is not None and address == self.address:
+                self.session.handle_inputs(body)
+
+        if self.link:
+            if self.session is None:
+                if self.side == GUEST and now - self.last_hello >= HELLO_INTERVAL:
+                    self.link.send(PACKET_TYPE.pack(PACKET_MAGIC, b"H"))
+                    self.last_hello = now
+            elif self.side == HOST and not self.session.remote and now - self.last_hello >= HELLO_INTERVAL:
+                # Repeat the start until the guest's first input shows it arrived
+                self.send_start()
+                self.last_hello = now
+            self.link.flush()
+        return self.session is not None
+
+    def start_match(self):
+        if self.session is None:
+            self.session = RollbackSession(
+                self.match_class(self.difficulty, seed=self.seed), HOST)
+        self.send_start()
+
+    def send_start(self):
+        match = self.session.match
+        self.link.send(PACKET_TYPE.pack(PACKET_MAGIC, b"S")
+                       + START.pack(match.difficulty, match.kick_order, match.seed))
+
+    def send_inputs(self):
+        if self.session is not None and self.link:
+            self.link.send(self.session.packet())
+
+
+class ScriptedInput:
+    """A bot that wanders its mouse around the goal and clicks now and then"""
+    def __init__(self, seed, click_chance=1 / 40):
+        self.rng = random.Random(seed)
+        self.click_chance = click_chance
+        self.x, self.y = NEUTRAL_INPUT[:2]
+
+    def __call__(self):
+        self.x = min(max(self.x + self.rng.randint(-25, 25), GOAL_X + 10), GOAL_X + GOAL_WIDTH - 10)
+        self.y = min(max(self.y + self.rng.randint(-15, 15), GOAL_Y + 10), GOAL_Y + GOAL_HEIGHT - 10)
+        return (self.x, self.y, INPUT_CLICK if self.rng.random() < self.click_chance else 0)
+
+
+def selftest(latency=0.08, jitter=0.03, loss=0.1, seed=0, difficulty=DIFFICULTY_NORMAL,
+             max_steps=100_000):
+    """Play two scripted peers over loopback and check that they agree.
+
+    Time is simulated (one step per iteration), so the injected latency is
+    measured in steps and the test runs as fast as the machine allows. Both
+    final states must equal a match replayed offline from the exchanged
+    inputs. Returns the two peers.
+    """
+    now = [0.0]
+    clock = lambda: now[0]
+    sockets = []
+    for _ in range(2):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("127.0.0.1", 0))
+        sock.setblocking(False)
+        sockets.append(sock)
+    host_address = sockets[0].getsockname()
+    options = {"latency": latency, "jitter": jitter, "loss": loss, "clock": clock}
+    peers = [
+        Peer(sockets[0], HOST, link_options=dict(options, seed=seed + 1), difficulty=difficulty,
+             seed=seed),
+        Peer(sockets[1], GUEST, host_address, link_options=dict(options, seed=seed + 2)),
+    ]
+    bots = [ScriptedInput(seed + 3), ScriptedInput(seed + 4)]
+    pending = [None, None]  # A bot input that had to wait for a stall to clear
+    try:
+        for _ in range(max_steps):
+            for peer, bot, side in zip(peers, bots, (HOST, GUEST)):
+                if not peer.poll(now[0]):
+                    continue
+                session = peer.session
+                if not session.match.game_over:
+                    pending[side] = pending[side] or bot()
+                    if session.advance(pending[side]):
+                        pending[side] = None
+                peer.send_inputs()
+            now[0] += TIME_STEP
+            time.sleep(0)
+            if all(p.session and p.session.match.game_over
+                   and p.session.confirmed() == p.session.step for p in peers):
+                break
+        else:
+            raise RuntimeError("selftest match did not finish")
+    finally:
+        for sock in sockets:
+            sock.close()
+
+    # Replay the agreed inputs without a network and compare
+    host, guest = (p.session for p in peers)
+    reference = NetMatch(difficulty, seed=seed)
+    while not reference.game_over:
+        step = reference.step_count
+        reference.apply_inputs(host.local[step], guest.local[step])
+        reference.step()
+    if not host.match.snapshot() == guest.match.snapshot() == reference.snapshot():
+        raise RuntimeError("peers diverged")
+
+    # A rematch starts over from a fresh match
+    reference.restart_game()
+    if reference.game_over or reference.kicks_taken or reference.step_count:
+        raise RuntimeError("restarting a network match failed")
+
+    # Swept contact is fixed at the kick, while the goalkeepers keep moving
+    try:
+        NetMatch(difficulty, collision=COLLISION_SWEPT)
+    except ValueError:
+        pass
+    else:
+        raise RuntimeError("a network match accepted swept collision")
+    return peers
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Two-player penalty shootout over the network")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--host", action="store_true", help="wait for a guest to join")
+    mode.add_argument("--join", metavar="HOST[:PORT]", help="join a waiting host")
+    mode.add_argument("--selftest", action="store_true",
+                      help="play two scripted peers over loopback and check they agree")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--difficulty", choices=list(DIFFICULTIES), default="normal")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--latency", type=float, default=0.0, metavar="MS",
+                        help="delay added to every packet sent")
+    # Unset, --selftest uses its own network conditions and play() none
+    parser.add_argument("--jitter", type=float, metavar="MS",
+                        help="random extra delay of up to MS per packet")
+    parser.add_argument("--loss", type=float, help="share of packets dropped")
+    return parser.parse_args(argv)
+
+
+def play(args):
+    # The pygame front end, imported here so the self-test needs no display
+    import pygame
+    import soccer_penalty
+    from soccer_penalty import Game, TEXT_FONT, WHITE
+
+    class NetGame(NetMatch, Game):
+        pass
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    options = {"latency": args.latency / 1000, "jitter": (args.jitter or 0) / 1000,
+               "loss": args.loss or 0}
+    if args.host:
+        sock.bind(("", args.port))
+        peer = Peer(sock, HOST, link_options=options, difficulty=DIFFICULTIES[args.difficulty],
+                    seed=args.seed, match_class=NetGame)
+    else:
+        host, _, port = args.join.partition(":")
+        address = socket.getaddrinfo(host, int(port or args.port), socket.AF_INET,
+                                     socket.SOCK_DGRAM)[0][4]
+        peer = Peer(sock, GUEST, address, link_options=options, match_class=NetGame)
+
+    soccer_penalty.init_display()
+    screen = pygame.display.get_surface()
+    clock = soccer_penalty.clock
+    mouse = NEUTRAL_INPUT[:2]
+    clicked = False
+    accumulator = 0.0
+    last_time = time.perf_counter()
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN
+                                             and event.key == pygame.K_ESCAPE):
+                running = False
+            elif event.type == pygame.MOUSEMOTION:
+                mouse = event.pos
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                mouse = event.pos
+                clicked = True
+
+        now = time.perf_counter()
+        frame_time = min(now - last_time, 0.25)
+        last_time = now
+        if not peer.poll(now):
+            screen.fill((0, 0, 0))
+            text = "Waiting for a guest..." if args.host else "Joining..."
+            screen.blit(*soccer_penalty.text_cache.place(
+                text, TEXT_FONT, WHITE, center=screen.get_rect().center))
+            pygame.display.flip()
+            clock.tick(30)
+            continue
+
+        game = peer.session.match
+        accumulator += frame_time
+        while accumulator >= TIME_STEP and not game.game_over:
+            local = (mouse[0], mouse[1], INPUT_CLICK if clicked else 0)
+            if not peer.session.advance(local):
+                accumulator = 0.0  # Waiting for the opponent, do not build up a backlog
+                break
+            clicked = False
+            accumulator -= TIME_STEP
+        peer.send_inputs()
+
+        game.render_alpha = 1.0
+        game.draw()
+        pygame.display.flip()
+        clock.tick(60)
+    pygame.quit()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.selftest:
+        start = time.perf_counter()
+        conditions = {}
+        if args.jitter is not None:
+            conditions["jitter"] = args.jitter / 1000
+        if args.loss is not None:
+            conditions["loss"] = args.loss
+        peers = selftest(args.latency / 1000 or 0.08, seed=args.seed or 0,
+                         difficulty=DIFFICULTIES[args.difficulty], **conditions)
+        elapsed = time.perf_counter() - start
+        match = peers[0].session.match
+        print(f"match agreed after {match.step_count} steps ({elapsed:.2f} s): "
+              f"{match.result_message.splitlines()[0]} {match.player_score}-{match.cpu_score}")
+        for name, peer in zip(("host", "guest"), peers):
+            s = peer.session
+            print(f"{name:5}: {s.rollbacks} rollbacks, {s.resimulated} steps re-simulated "
+                  f"(deepest {s.deepest_rollback}), {s.stalls} stalls, "
+                  f"{peer.link.sent} packets sent, {peer.link.dropped} dropped")
+        return
+    play(args)
+
+
+if __name__ == "__main__":
+    main()
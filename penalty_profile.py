@@ -0,0 +1,262 @@
+"""Per-frame profiling of the game loop.
+
+FrameProfiler records named spans (start and duration in nanoseconds) into
+a fixed-size ring buffer, so profiling can stay on for a whole session with
+constant memory: once full, the oldest spans are overwritten. The buffer can
+be exported at any time as Chrome trace JSON (chrome://tracing or
+https://ui.perfetto.dev), and per-frame phase totals feed the on-screen
+overlay. NullProfiler has the same interface and does nothing, so the game
+loop is written once and costs nothing when profiling is off.
+
+The game also reports input-to-photon latency: the time from the earliest
+moment a mouse sample that moved the goalkeeper can have arrived to the
+end of presenting the frame that shows it. These are recorded as "input"
+spans on a trace track of their own and kept for the overlay.
+
+Running the module checks that timing a match does not change it::
+
+    python3 penalty_profile.py
+"""
+import contextlib
+import json
+import os
+import time
+from array import array
+
+DEFAULT_CAPACITY = 1 << 16  # Spans kept in the ring buffer
+FRAME_HISTORY = 240  # Frame times kept for the overlay
+LATENCY_HISTORY = 240  # Input latencies kept for the overlay
+
+# Top-level phases of a frame, summed per frame for the overlay
+FRAME_PHASES = ("events", "simulate", "draw", "present", "tick")
+
+INPUT_SPAN = "input"  # Input-to-photon latency, which overlaps the frames
+
+# Match methods wrapped by FrameProfiler.instrument
+INSTRUMENTED_METHODS = (
+    "move_ball", "move_goalkeeper", "update_cpu_preparation", "next_turn",
+    "draw_field", "draw_goalkeeper", "draw_ball", "draw_scoreboard", "draw_results_table",
+)
+
+
+class _Span:
+    # Context manager recording one span, reused for every span of its name
+    __slots__ = ("profiler", "name_id", "start")
+
+    def __init__(self, profiler, name_id):
+        self.profiler = profiler
+        self.name_id = name_id
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name_id, self.start, time.perf_counter_ns())
+
+
+class FrameProfiler:
+    """Ring buffer of timed spans plus a short history of frame times"""
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.names = []
+        self.name_ids = {}
+        self.span_names = array("H", bytes(2 * capacity))
+        self.span_starts = array("q", bytes(8 * capacity))
+        self.span_durations = array("q", bytes(8 * capacity))
+        self.count = 0  # Spans recorded since the start, including overwritten ones
+        self.spans_by_name = {}
+
+        self.frame_times = array("d", bytes(8 * FRAME_HISTORY))  # Seconds
+        self.frames = 0
+        self.origin = time.perf_counter_ns()
+        self.frame_start = self.origin
+
+        # Phase totals in nanoseconds for the frame in progress and the last one
+        self.phase_ids = [self.name_id(phase) for phase in FRAME_PHASES]
+        self.phase_totals = [0] * len(self.names)
+        self.last_phase_totals = dict.fromkeys(FRAME_PHASES, 0)
+        self.frame_id = self.name_id("frame")
+
+        self.latencies = array("d", bytes(8 * LATENCY_HISTORY))  # Seconds
+        self.latency_count = 0
+        self.input_id = self.name_id(INPUT_SPAN)
+
+        self.timed_classes = {}  # Game class -> its subclass with timed methods
+
+    def name_id(self, name):
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = self.name_ids[name] = len(self.names)
+            self.names.append(name)
+        return name_id
+
+    def record(self, name_id, start, end):
+        i = self.count % self.capacity
+        self.span_names[i] = name_id
+        self.span_starts[i] = start
+        self.span_durations[i] = end - start
+        self.count += 1
+        if name_id < len(self.phase_totals):
+            self.phase_totals[name_id] += end - start
+
+    def span(self, name):
+        """Context manager timing the enclosed block as one span"""
+        span = self.spans_by_name.get(name)
+        if span is None:
+            span = self.spans_by_name[name] = _Span(self, self.name_id(name))
+        return span
+
+    def wrap(self, func, name):
+        # func, timed as a span of the given name on every call
+        name_id = self.name_id(name)
+        record = self.record
+        clock = time.perf_counter_ns
+
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name_id, start, clock())
+        return timed
+
+    def instrument(self, game):
+        """Time the simulation and drawing methods of one game instance.
+
+        The game is switched to a subclass of its class with timed methods,
+        so a copy made by Match.clone() is timed as itself instead of calling
+        back into the original's methods.
+        """
+        cls = type(game)
+        if cls in self.timed_classes.values():
+            return game  # Already timed
+        timed_class = self.timed_classes.get(cls)
+        if timed_class is None:
+            # No new slots, so the instance layout and __class__ assignment still fit
+            methods = {"__slots__": ()}
+            for method in INSTRUMENTED_METHODS:
+                if hasattr(cls, method):
+                    methods[method] = self.wrap(getattr(cls, method), method)
+            timed_class = self.timed_classes[cls] = type(cls.__name__, (cls,), methods)
+        game.__class__ = timed_class
+        return game
+
+    def end_frame(self):
+        """Close the current frame and start the next one"""
+        now = time.perf_counter_ns()
+        self.record(self.frame_id, self.frame_start, now)
+        self.frame_times[self.frames % FRAME_HISTORY] = (now - self.frame_start) / 1e9
+        self.frames += 1
+        self.frame_start = now
+
+        for phase, phase_id in zip(FRAME_PHASES, self.phase_ids):
+            self.last_phase_totals[phase] = self.phase_totals[phase_id]
+            self.phase_totals[phase_id] = 0
+
+    def record_input_latency(self, start, end):
+        """Record the latency of one input, from its arrival to its frame on screen (ns)"""
+        self.record(self.input_id, start, end)
+        self.latencies[self.latency_count % LATENCY_HISTORY] = (end - start) / 1e9
+        self.latency_count += 1
+
+    def recent_frame_times(self):
+        # Frame times in seconds, oldest first
+        return _oldest_first(self.frame_times, self.frames)
+
+    def recent_input_latencies(self):
+        # Input latencies in seconds, oldest first
+        return _oldest_first(self.latencies, self.latency_count)
+
+    def spans(self):
+        """Yield (name, start ns, duration ns) for the buffered spans, oldest first"""
+        first = max(0, self.count - self.capacity)
+        for n in range(first, self.count):
+            i = n % self.capacity
+            yield self.names[self.span_names[i]], self.span_starts[i], self.span_durations[i]
+
+    def chrome_trace(self):
+        """The buffered spans as a Chrome trace event dictionary"""
+        events = [
+            {"name": name, "ph": "X", "pid": os.getpid(), "tid": int(name == INPUT_SPAN),
+             "ts": (start - self.origin) / 1000, "dur": duration / 1000}
+            for name, start, duration in self.spans()
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+def _oldest_first(ring, count):
+    # Contents of a ring buffer written ``count`` times, oldest first
+    if count <= len(ring):
+        return ring[:count].tolist()
+    i = count % len(ring)
+    return (ring[i:] + ring[:i]).tolist()
+
+
+class NullProfiler:
+    """Drop-in FrameProfiler that records nothing"""
+    frames = 0
+    last_phase_totals = dict.fromkeys(FRAME_PHASES, 0)
+
+    def span(self, name):
+        return contextlib.nullcontext()
+
+    def instrument(self, game):
+        return game
+
+    def end_frame(self):
+        pass
+
+    def record_input_latency(self, start, end):
+        pass
+
+    def recent_frame_times(self):
+        return []
+
+    def recent_input_latencies(self):
+        return []
+
+
+def selftest(seed=0, steps=30):
+    """Check that timing a match does not change how it or its clones play.
+
+    A clone of an instrumented match is stepped through a kick: the
+    original must stay as it was, the clone must play like an untimed
+    match from the same seed, and its steps must still be timed.
+    """
+    from penalty_engine import GOAL_X, GOAL_Y, GOAL_WIDTH, GOAL_HEIGHT, Match
+    from penalty_snapshot import pack_snapshot
+
+    class DictMatch(Match):
+        pass  # Instance attributes are copied by clone(), as for the game's Game
+
+    target = (GOAL_X + GOAL_WIDTH // 3, GOAL_Y + GOAL_HEIGHT // 3)
+    profiler = FrameProfiler()
+    timed = profiler.instrument(DictMatch(realtime=False, seed=seed))
+    reference = Match(realtime=False, seed=seed)
+    for match in (timed, reference):
+        match.player_shoot(target)
+        match.step()
+
+    # Packed, as a snapshot holds the Motion objects of the kick in flight
+    before = pack_snapshot(timed.snapshot())
+    copy = timed.clone()
+    spans = profiler.count
+    for _ in range(steps):
+        copy.step()
+        reference.step()
+    if pack_snapshot(timed.snapshot()) != before:
+        raise RuntimeError("stepping a clone changed the instrumented match")
+    if pack_snapshot(copy.snapshot()) != pack_snapshot(reference.snapshot()):
+        raise RuntimeError("a clone of an instrumented match played differently")
+    if profiler.count == spans:
+        raise RuntimeError("the steps of a clone were not timed")
+
+
+if __name__ == "__main__":
+    selftest()
+    print("instrumented matches and their clones play independently")
@@ -0,0 +1,380 @@
+"""Compact binary match records and a replay player.
+
+A match is fully determined by its seed and the player's input, so a record
+only stores the seed and, for every kick, the shot target, where the
+goalkeeper went, the outcome and the mouse samples that moved the player's
+goalkeeper. Replaying the input into a Match with the same seed rebuilds the
+match exactly, either stepped in real time for viewing or settled kick by
+kick far faster than real time.
+
+File layout (little-endian), one match after another::
+
+    match   "PKRP" u8 version, u8 difficulty, u8 kick order, u8 flags,
+            u64 seed, u16 kick count, u16 sample count,
+            u8 CPU strategy, u16 strategy state size, strategy state
+    kick    u8 flags, u32 shot step, i16 target x/y, i16 goalkeeper x/y,
+            u16 sample count
+    sample  u32 step, i16 x/y
+
+Each kick is followed by the goalkeeper samples that led up to it, and the
+match by the samples taken after its last kick. The strategy state is what
+a learning CPU (penalty_adaptive) knew when the match started. Version 1
+files, which had no strategy fields, can still be read.
+
+For a player kick the goalkeeper position is the CPU goalkeeper's target,
+for a CPU kick it is where the player's goalkeeper stood when the CPU shot.
+"""
+import argparse
+import os
+import struct
+import sys
+import time
+
+from penalty_engine import (
+    SIMULATION_RATE, TIME_STEP, DIFFICULTY_NORMAL, KICK_ORDER_ABAB, COLLISION_POINT,
+    COLLISION_SWEPT, COLLISION_MODES, Match, add_recorder,
+)
+from penalty_strategy import CPU_STRATEGIES, make_cpu_strategy
+
+REPLAY_MAGIC = b"PKRP"
+REPLAY_VERSION = 2
+
+MATCH_PREFIX = struct.Struct("<4sB")  # Magic and version
+MATCH_HEADER_V1 = struct.Struct("<BBBQHH")
+MATCH_HEADER = struct.Struct("<BBBQHHBH")
+KICK_HEADER = struct.Struct("<BIhhhhH")
+SAMPLE = struct.Struct("<Ihh")
+
+# Match flags
+MATCH_REALTIME = 1  # Recorded with the pauses between kicks
+MATCH_EQUILIBRIUM = 2  # Version 1 only: the CPU played the equilibrium strategy
+MATCH_SWEPT = 4  # Played with swept collision
+
+# Kick flags
+KICK_PLAYER = 1  # The player took the kick
+KICK_GOAL = 2
+
+# A stepped replay allows each kick this many steps, pauses included, before
+# giving up (headless records settle kicks instantly, so their recorded steps
+# run ahead of a stepped replay)
+REPLAY_KICK_STEPS = 10 * SIMULATION_RATE
+
+
+class ReplayError(Exception):
+    """Raised for malformed replay files and replays that diverge"""
+
+
+class KickRecord:
+    """One kick: who shot where, where the goalkeeper went and the outcome.
+
+    ``samples`` are the ``(step, x, y)`` goalkeeper mouse positions recorded
+    since the previous kick, at most one per simulation step.
+    """
+    __slots__ = ("player", "goal", "step", "target", "keeper", "samples")
+
+    def __init__(self, player, goal, step, target, keeper, samples=()):
+        self.player = player
+        self.goal = goal
+        self.step = step
+        self.target = target
+        self.keeper = keeper
+        self.samples = list(samples)
+
+
+class MatchRecord:
+    """Seed, settings and kicks of one recorded match.
+
+    ``samples`` holds the goalkeeper samples taken after the last kick.
+    ``strategy`` names the CPU strategy (see penalty_strategy.CPU_STRATEGIES)
+    and ``strategy_state`` is its saved state at the start of the match.
+    """
+    def __init__(self, difficulty=DIFFICULTY_NORMAL, kick_order=KICK_ORDER_ABAB, seed=0,
+                 realtime=False, kicks=(), samples=(), strategy="random", strategy_state=b"",
+                 collision=COLLISION_POINT):
+        self.difficulty = difficulty
+        self.kick_order = kick_order
+        self.seed = seed
+        self.realtime = realtime
+        self.collision = collision
+        self.strategy = strategy
+        self.strategy_state = strategy_state
+        self.kicks = list(kicks)
+        self.samples = list(samples)
+
+    def scores(self):
+        # Final (player, cpu) score
+        player = sum(kick.goal for kick in self.kicks if kick.player)
+        cpu = sum(kick.goal for kick in self.kicks if not kick.player)
+        return player, cpu
+
+
+class ReplayRecorder:
+    """Observes a Match through its recorder hooks and builds a MatchRecord"""
+    def __init__(self, match):
+        strategy = match.cpu_strategy
+        state = getattr(strategy, "state", None)
+        self.record = MatchRecord(match.difficulty, match.kick_order, match.seed, match.realtime,
+                                  strategy=strategy.name if strategy else "random",
+                                  strategy_state=state() if state else b"",
+                                  collision=match.collision)
+        add_recorder(match, self)
+
+    def record_shot(self, match):
+        if match.player_turn:
+            keeper = match.goalkeeper_target
+        else:
+            keeper = match.goalkeeper_pos
+        self.record.kicks.append(KickRecord(
+            match.player_turn, False, match.step_count,
+            (int(match.target_pos[0]), int(match.target_pos[1])),
+            (int(keeper[0]), int(keeper[1])), self.record.samples))
+        self.record.samples = []  # The samples so far led up to this kick
+
+    def record_keeper_move(self, match):
+        samples = self.record.samples
+        sample = (match.step_count, int(match.goalkeeper_pos[0]), int(match.goalkeeper_pos[1]))
+        if samples and samples[-1][0] == sample[0]:
+            samples[-1] = sample  # Only the last position in a step matters
+        elif not samples or samples[-1][1:] != sample[1:]:
+            samples.append(sample)
+
+    def record_result(self, match):
+        self.record.kicks[-1].goal = match.goal_scored
+
+
+def write_match(f, record):
+    """Append one MatchRecord to a binary file object"""
+    parts = [MATCH_PREFIX.pack(REPLAY_MAGIC, REPLAY_VERSION),
+             MATCH_HEADER.pack(record.difficulty, record.kick_order,
+                               (MATCH_REALTIME if record.realtime else 0)
+                               | (MATCH_SWEPT if record.collision == COLLISION_SWEPT else 0),
+                               record.seed,
+                               len(record.kicks), len(record.samples),
+                               CPU_STRATEGIES.index(record.strategy), len(record.strategy_state)),
+             record.strategy_state]
+    for kick in record.kicks:
+        flags = (KICK_PLAYER if kick.player else 0) | (KICK_GOAL if kick.goal else 0)
+        parts.append(KICK_HEADER.pack(flags, kick.step, kick.target[0], kick.target[1],
+                                      kick.keeper[0], kick.keeper[1], len(kick.samples)))
+        parts.extend(SAMPLE.pack(*sample) for sample in kick.samples)
+    parts.extend(SAMPLE.pack(*sample) for sample in record.samples)
+    f.write(b"".join(parts))
+
+
+def _read_exact(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise ReplayError("truncated replay file")
+    return data
+
+
+def _read_samples(f, count):
+    return list(SAMPLE.iter_unpack(_read_exact(f, SAMPLE.size * count)))
+
+
+def read_matches(f):
+    """Yield every MatchRecord in a binary file object, one at a time"""
+    while True:
+        prefix = f.read(MATCH_PREFIX.size)
+        if not prefix:
+            return
+        if len(prefix) != MATCH_PREFIX.size:
+            raise ReplayError("truncated replay file")
+        magic, version = MATCH_PREFIX.unpack(prefix)
+        if magic != REPLAY_MAGIC:
+            raise ReplayError("not a replay file")
+        if version == 1:
+            (difficulty, kick_order, flags, seed, kick_count,
+             sample_count) = MATCH_HEADER_V1.unpack(_read_exact(f, MATCH_HEADER_V1.size))
+            strategy = "equilibrium" if flags & MATCH_EQUILIBRIUM else "random"
+            state = b""
+        elif version == REPLAY_VERSION:
+            (difficulty, kick_order, flags, seed, kick_count, sample_count, strategy_id,
+             state_size) = MATCH_HEADER.unpack(_read_exact(f, MATCH_HEADER.size))
+            if strategy_id >= len(CPU_STRATEGIES):
+                raise ReplayError(f"unknown CPU strategy {strategy_id}")
+            strategy = CPU_STRATEGIES[strategy_id]
+            state = _read_exact(f, state_size)
+        else:
+            raise ReplayError(f"unsupported replay version {version}")
+        record = MatchRecord(difficulty, kick_order, seed, bool(flags & MATCH_REALTIME),
+                             strategy=strategy, strategy_state=state,
+                             collision=COLLISION_SWEPT if flags & MATCH_SWEPT else COLLISION_POINT)
+        for _ in range(kick_count):
+            flags, step, tx, ty, kx, ky, kick_samples = KICK_HEADER.unpack(
+                _read_exact(f, KICK_HEADER.size))
+            record.kicks.append(KickRecord(bool(flags & KICK_PLAYER), bool(flags & KICK_GOAL),
+                                           step, (tx, ty), (kx, ky), _read_samples(f, kick_samples)))
+        record.samples = _read_samples(f, sample_count)
+        yield record
+
+
+def load_matches(path):
+    with open(path, "rb") as f:
+        return list(read_matches(f))
+
+
+def save_matches(path, records, append=True):
+    with open(path, "ab" if append else "wb") as f:
+        for record in records:
+            write_match(f, record)
+
+
+def recorded_target(match):
+    # Headless kicker that shoots where the recorded player shot
+    kick = match.current_kick()
+    if kick is None or not kick.player:
+        raise ReplayError(f"replay diverged at kick {match.kicks_taken + 1}")
+    return kick.target
+
+
+def recorded_keeper(match):
+    # Headless goalkeeper that stands where the recorded player's goalkeeper stood
+    kick = match.current_kick()
+    if kick is None or kick.player:
+        raise ReplayError(f"replay diverged at kick {match.kicks_taken + 1}")
+    return kick.keeper
+
+
+class ReplayMatch(Match):
+    """A Match driven by recorded player input instead of a live player.
+
+    Stepping it feeds each shot and goalkeeper sample in at the step it was
+    recorded, so a real-time replay looks exactly like the original. ``play``
+    settles the kicks one after another without stepping through them.
+    """
+    def __init__(self, record, realtime=None):
+        self.record = record
+        self.feed_input = True  # Feed recorded input in from step()
+        self.sample_kick = 0  # Kick whose goalkeeper samples are being fed
+        self.next_sample = 0
+        if realtime is None:
+            realtime = record.realtime
+        cpu_strategy = make_cpu_strategy(record.strategy, record.strategy_state)
+        super().__init__(record.difficulty, realtime, record.kick_order, seed=record.seed,
+                         cpu_strategy=cpu_strategy, collision=record.collision)
+
+    def restart_game(self, difficulty=None):
+        self.__init__(self.record, self.realtime)
+
+    def current_kick(self):
+        # The recorded kick that is about to be taken, None once they run out
+        if self.kicks_taken < len(self.record.kicks):
+            return self.record.kicks[self.kicks_taken]
+        return None
+
+    def feed(self):
+        if self.ball_moving:
+            return
+        if self.sample_kick != self.kicks_taken:
+            self.sample_kick = self.kicks_taken
+            self.next_sample = 0
+        
+        # Goalkeeper samples due by now, then the shot itself
+        kick = self.current_kick()
+        samples = self.record.samples if kick is None else kick.samples
+        while (self.next_sample < len(samples)
+               and samples[self.next_sample][0] <= self.step_count):
+            self.cpu_goalkeeper_move(samples[self.next_sample][1:])
+            self.next_sample += 1
+        if (kick is not None and kick.player and kick.step <= self.step_count
+                and self.awaiting_player_kick()):
+            self.player_shoot(kick.target)
+
+    def step(self, dt=TIME_STEP):
+        if self.feed_input:
+            self.feed()
+        super().step(dt)
+
+    def play(self, kicker=None, keeper=None):
+        # The recorded goalkeeper positions are final, skip the mouse samples
+        self.feed_input = False
+        return super().play(kicker or recorded_target, keeper or recorded_keeper)
+
+
+def replay(record, stepped=False):
+    """Rebuild a recorded match and check it plays out as recorded.
+
+    By default every kick is settled at once; with ``stepped=True`` the match
+    is stepped through with the recorded timing (pauses skipped unless the
+    record was made in real time). Raises ReplayError if the replay diverges.
+    """
+    match = ReplayMatch(record)
+    recorder = ReplayRecorder(match)
+    if stepped:
+        last_step = record.kicks[-1].step if record.kicks else 0
+        limit = last_step + (len(record.kicks) + 1) * REPLAY_KICK_STEPS
+        while not match.game_over and match.step_count < limit:
+            match.step()
+    else:
+        match.play()
+    
+    kicks = recorder.record.kicks
+    if not match.game_over or len(kicks) != len(record.kicks):
+        raise ReplayError(f"replay has {len(kicks)} kicks, record has {len(record.kicks)}")
+    for number, (got, want) in enumerate(zip(kicks, record.kicks), 1):
+        if (got.player, got.goal, got.target, got.keeper) != (
+                want.player, want.goal, want.target, want.keeper):
+            raise ReplayError(f"replay diverged at kick {number}")
+    return match
+
+
+def record_match(difficulty=DIFFICULTY_NORMAL, kick_order=KICK_ORDER_ABAB, seed=None,
+                 kicker=None, keeper=None, cpu_strategy=None, collision=COLLISION_POINT):
+    """Play one headless match and return its MatchRecord"""
+    match = Match(difficulty, realtime=False, kick_order=kick_order, seed=seed,
+                  cpu_strategy=cpu_strategy, collision=collision)
+    recorder = ReplayRecorder(match)
+    match.play(kicker, keeper)
+    return recorder.record
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Verify and summarize penalty replay files")
+    parser.add_argument("path", help="replay file")
+    parser.add_argument("--generate", type=int, metavar="N",
+                        help="append N random headless matches to the file first")
+    parser.add_argument("--cpu", choices=CPU_STRATEGIES, default="random",
+                        help="CPU strategy for generated matches; an adaptive CPU keeps "
+                             "learning from one generated match to the next")
+    parser.add_argument("--collision", choices=COLLISION_MODES, default="point",
+                        help="collision test for generated matches")
+    parser.add_argument("--stepped", action="store_true",
+                        help="replay with the recorded step timing instead of settling kicks at once")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.generate:
+        cpu_strategy = make_cpu_strategy(args.cpu)
+        start = time.perf_counter()
+        with open(args.path, "ab") as f:
+            for _ in range(args.generate):
+                write_match(f, record_match(cpu_strategy=cpu_strategy,
+                                            collision=COLLISION_MODES.index(args.collision)))
+        elapsed = time.perf_counter() - start
+        print(f"Recorded {args.generate} matches ({args.generate / elapsed:.0f} matches/s)")
+    
+    start = time.perf_counter()
+    matches = player_wins = 0
+    with open(args.path, "rb") as f:
+        for record in read_matches(f):
+            replay(record, args.stepped)
+            player_score, cpu_score = record.scores()
+            player_wins += player_score > cpu_score
+            matches += 1
+    elapsed = time.perf_counter() - start
+    if not matches:
+        print("No matches in replay file")
+        return
+    size = os.path.getsize(args.path)
+    print(f"Replayed {matches} matches, player won {player_wins / matches:.1%} "
+          f"({size / matches:.0f} bytes/match, {matches / elapsed:.0f} matches/s)")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except ReplayError as error:
+        sys.exit(f"error: {error}")
@@ -0,0 +1,223 @@
+"""Probability that the CPU goalkeeper saves a shot, for every spot of the goal.
+
+When the CPU plays at random, ``Match.player_shoot`` sends its goalkeeper
+from the centre of the goal toward a target drawn uniformly from every
+integer position that keeps it inside the goal. For one shot the chance of
+a save is therefore the share of those targets for which the goalkeeper,
+caught part way by the ball, blocks it. The field holds that share for a
+grid of shots over the goal mouth, computed exactly rather than sampled:
+
+- the ball lands where its Motion stops, which for shots near the edges
+  can be outside the goal and so count as a save;
+- every goalkeeper target is moved with the same closed-form Motion for
+  the ball's flight time, as in Match.resolve_kick;
+- the block is check_goal's open point-in-box test, so the field is for
+  the default point collision mode.
+
+Shots with the same flight time see the goalkeeper targets in the same
+positions, so the targets are moved once per flight time and tested
+against all those shots at once with NumPy. A field takes up to a second
+on the default grid and several at pixel resolution, so fields are cached
+on disk next to the strategy tables and read back in milliseconds. The
+field serves the hint overlay, CPU logic and analytics alike::
+
+    python3 penalty_savefield.py --map
+"""
+import argparse
+import json
+import os
+import time
+
+from penalty_engine import (
+    GOAL_WIDTH, GOAL_HEIGHT, GOAL_X, GOAL_Y, PENALTY_SPOT, BALL_SPEED, GOALKEEPER_SPEED,
+    ARRIVAL_DISTANCE, TIME_STEP, DIFFICULTY_EASY, DIFFICULTY_NORMAL, DIFFICULTY_HARD,
+    goalkeeper_sizes,
+)
+from penalty_strategy import STRATEGY_CACHE_DIR
+
+FIELD_VERSION = 1
+SAVE_GRID = 4  # Pixels between the shots of the field
+SHOT_CHUNK = 256  # Shots tested against every goalkeeper target at a time
+
+DIFFICULTY_NAMES = {DIFFICULTY_EASY: "easy", DIFFICULTY_NORMAL: "normal", DIFFICULTY_HARD: "hard"}
+
+
+def shot_axes(grid=SAVE_GRID):
+    """x and y of the field's shots: the middle of each grid cell inside the goal"""
+    import numpy as np
+
+    # player_shoot only accepts clicks strictly inside the goal
+    xs = np.arange(GOAL_X + 1, GOAL_X + GOAL_WIDTH, grid) + (grid - 1) // 2
+    ys = np.arange(GOAL_Y + 1, GOAL_Y + GOAL_HEIGHT, grid) + (grid - 1) // 2
+    return (np.minimum(xs, GOAL_X + GOAL_WIDTH - 1), np.minimum(ys, GOAL_Y + GOAL_HEIGHT - 1))
+
+
+def _motions(start, dx, dy, speed):
+    # Direction and duration of Motion(start, start + (dx, dy), speed), element-wise
+    import numpy as np
+
+    distance = np.sqrt(dx ** 2 + dy ** 2)
+    moving = distance > 0
+    safe = np.where(moving, distance, 1.0)
+    direction_x = np.where(moving, dx / safe, 0.0)
+    direction_y = np.where(moving, dy / safe, 0.0)
+    # travel_steps
+    steps = np.where(distance < ARRIVAL_DISTANCE, 0,
+                     np.floor_divide(distance - ARRIVAL_DISTANCE, speed * TIME_STEP) + 1)
+    return direction_x, direction_y, steps.astype(np.int64) * TIME_STEP
+
+
+def compute_save_field(difficulty, grid=SAVE_GRID):
+    """(xs, ys, saved) where saved[i, j] is the save probability of a shot at (xs[i], ys[j])"""
+    import numpy as np
+
+    width, height, _, _ = goalkeeper_sizes(difficulty)
+    xs, ys = shot_axes(grid)
+    shot_x, shot_y = (axis.ravel() for axis in np.meshgrid(xs, ys, indexing="ij"))
+
+    # Where and when the ball arrives
+    direction_x, direction_y, flight = _motions(
+        PENALTY_SPOT, shot_x - PENALTY_SPOT[0], shot_y - PENALTY_SPOT[1], BALL_SPEED)
+    travelled = BALL_SPEED * flight
+    ball_x = PENALTY_SPOT[0] + direction_x * travelled
+    ball_y = PENALTY_SPOT[1] + direction_y * travelled
+    in_goal = ((GOAL_X < ball_x) & (ball_x < GOAL_X + GOAL_WIDTH)
+               & (GOAL_Y < ball_y) & (ball_y < GOAL_Y + GOAL_HEIGHT))
+
+    # Every target the random CPU goalkeeper may run to, from the centre of the goal
+    start = (GOAL_X + (GOAL_WIDTH - int(width)) // 2, GOAL_Y + (GOAL_HEIGHT - int(height)) // 2)
+    target_x, target_y = (axis.ravel() for axis in np.meshgrid(
+        np.arange(GOAL_X, int(GOAL_X + GOAL_WIDTH - width) + 1),
+        np.arange(GOAL_Y, int(GOAL_Y + GOAL_HEIGHT - height) + 1), indexing="ij"))
+    keeper_dx, keeper_dy, keeper_duration = _motions(
+        start, target_x - start[0], target_y - start[1], GOALKEEPER_SPEED)
+
+    saved = np.ones(len(shot_x))
+    for duration in np.unique(flight[in_goal]):
+        # Goalkeeper positions when a ball with this flight time arrives
+        keeper_travelled = GOALKEEPER_SPEED * np.minimum(duration, keeper_duration)
+        left = start[0] + keeper_dx * keeper_travelled
+        top = start[1] + keeper_dy * keeper_travelled
+        right = left + int(width)
+        bottom = top + int(height)
+
+        shots = np.flatnonzero(in_goal & (flight == duration))
+        for chunk in range(0, len(shots), SHOT_CHUNK):
+            index = shots[chunk:chunk + SHOT_CHUNK]
+            x = ball_x[index, np.newaxis]
+            y = ball_y[index, np.newaxis]
+            blocked = (left < x) & (x < right) & (top < y) & (y < bottom)
+            saved[index] = blocked.mean(axis=1)
+    return xs, ys, saved.reshape(len(xs), len(ys))
+
+
+class SaveField:
+    """Save probabilities of the random CPU goalkeeper over a grid of shots"""
+    def __init__(self, difficulty, grid, xs, ys, saved):
+        self.difficulty = difficulty
+        self.grid = grid
+        self.xs = xs
+        self.ys = ys
+        self.saved = saved
+
+    def cell(self, pos):
+        # Grid cell (column, row) of a point of the goal
+        column = min(max((int(pos[0]) - GOAL_X - 1) // self.grid, 0), len(self.xs) - 1)
+        row = min(max((int(pos[1]) - GOAL_Y - 1) // self.grid, 0), len(self.ys) - 1)
+        return column, row
+
+    def probability(self, pos):
+        """Save probability of a shot at pos (the nearest shot of the grid)"""
+        return float(self.saved[self.cell(pos)])
+
+    def mean(self):
+        """Save probability of a shot aimed uniformly over the goal"""
+        return float(self.saved.mean())
+
+    def safest(self, count=1):
+        """The ``count`` shots least likely to be saved, as (x, y, probability)"""
+        import numpy as np
+
+        best = np.argsort(self.saved, axis=None, kind="stable")[:count]
+        columns, rows = np.unravel_index(best, self.saved.shape)
+        return [(int(self.xs[c]), int(self.ys[r]), float(self.saved[c, r]))
+                for c, r in zip(columns, rows)]
+
+
+def cache_key(difficulty, grid):
+    # Everything the field depends on; a change invalidates the cache
+    return {
+        "version": FIELD_VERSION,
+        "difficulty": difficulty,
+        "goal": [GOAL_X, GOAL_Y, GOAL_WIDTH, GOAL_HEIGHT],
+        "spot": list(PENALTY_SPOT),
+        "speeds": [BALL_SPEED, GOALKEEPER_SPEED, ARRIVAL_DISTANCE, TIME_STEP],
+        "goalkeepers": list(goalkeeper_sizes(difficulty)),
+        "grid": grid,
+    }
+
+
+def cache_path(difficulty, grid):
+    return os.path.join(STRATEGY_CACHE_DIR, f"savefield-{difficulty}-{grid}.npz")
+
+
+def load_save_field(difficulty, grid=SAVE_GRID, compute_missing=True):
+    """SaveField of a difficulty, computed and cached first if missing or stale"""
+    import numpy as np
+
+    key = json.dumps(cache_key(difficulty, grid), sort_keys=True)
+    path = cache_path(difficulty, grid)
+    try:
+        with np.load(path) as cached:
+            if str(cached["key"]) == key:
+                return SaveField(difficulty, grid, cached["xs"], cached["ys"], cached["saved"])
+    except (OSError, ValueError, KeyError):
+        pass
+    if not compute_missing:
+        return None
+
+    xs, ys, saved = compute_save_field(difficulty, grid)
+    try:
+        os.makedirs(STRATEGY_CACHE_DIR, exist_ok=True)
+        temp = f"{path}.tmp.npz"
+        np.savez(temp, key=key, xs=xs, ys=ys, saved=saved)
+        os.replace(temp, path)
+    except OSError:
+        pass  # Unwritable cache, compute again next time
+    return SaveField(difficulty, grid, xs, ys, saved)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compute and show save-probability fields")
+    parser.add_argument("--difficulty", choices=tuple(DIFFICULTY_NAMES.values()),
+                        help="only this difficulty (default: all)")
+    parser.add_argument("--grid", type=int, default=SAVE_GRID,
+                        help="pixels between shots, 1 for every pixel")
+    parser.add_argument("--map", action="store_true", help="draw each field as text")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    shades = " .:-=+*#%@"
+    for difficulty, name in DIFFICULTY_NAMES.items():
+        if args.difficulty and args.difficulty != name:
+            continue
+        start = time.perf_counter()
+        field = load_save_field(difficulty, args.grid)
+        elapsed = time.perf_counter() - start
+        x, y, best = field.safest()[0]
+        print(f"{name}: {field.mean():.1%} of uniform shots saved, safest shot ({x}, {y}) "
+              f"saved {best:.1%}, {field.saved.size} shots in {elapsed:.2f} s")
+        if args.map:
+            # About 8 pixels per character across and 16 down
+            step_x = max(1, 8 // field.grid)
+            step_y = max(1, 16 // field.grid)
+            for row in range(0, len(field.ys), step_y):
+                print("  |" + "".join(
+                    shades[min(int(field.saved[column, row] * len(shades)), len(shades) - 1)]
+                    for column in range(0, len(field.xs), step_x)) + "|")
+
+
+if __name__ == "__main__":
+    main()
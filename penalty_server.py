@@ -0,0 +1,357 @@
+"""Asyncio server hosting many headless matches at once.
+
+Every match lives in a single event loop: there is no thread per match, a
+match only does work when one of its inputs arrives, and the loop moves on
+to other connections whenever a socket has nothing to read. Clients connect
+over TCP or a Unix socket and may run any number of matches per
+connection. Matches are headless, so each input settles the kick it starts
+and the match then waits for its next input.
+
+Messages (little-endian), client to server::
+
+    "N" u8 difficulty, u8 CPU strategy, u8 flags, u64 seed  new match
+    "K" u32 match, i16 x/y   the player shoots at (x, y)
+    "G" u32 match, i16 x/y   the player's goalkeeper stands at (x, y)
+                             and the CPU takes its kick
+    "X" u32 match            forget a match (no reply)
+
+Server to client, one reply per "N", "K" or "G", in request order::
+
+    "D" u32 match, u16 field mask, fields   state delta
+    "E" u32 match, u8 error
+
+A delta carries only the fields (DELTA_FIELDS) that changed since the last
+delta of that match; the first one, the reply to "N", carries them all.
+"""
+import argparse
+import asyncio
+import collections
+import os
+import struct
+import time
+
+from penalty_engine import DIFFICULTY_EASY, DIFFICULTY_NORMAL, DIFFICULTY_HARD, Match
+from penalty_strategy import CPU_STRATEGIES, make_cpu_strategy
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+REQUEST_TYPE = struct.Struct("<c")
+NEW_MATCH = struct.Struct("<BBBQ")
+INPUT = struct.Struct("<Ihh")
+CLOSE = struct.Struct("<I")
+DELTA_HEADER = struct.Struct("<IH")
+ERROR = struct.Struct("<IB")
+
+# "N" flags
+NEW_SEEDED = 1  # Use the given seed instead of a random one
+
+# Errors
+ERROR_UNKNOWN_MATCH = 1
+ERROR_BAD_REQUEST = 2  # Invalid difficulty or CPU strategy
+ERROR_NOT_AWAITED = 3  # The match is not waiting for that input
+ERROR_OUTSIDE_GOAL = 4  # A shot that misses the goal mouth is refused
+
+# Status bits
+STATUS_PLAYER_TURN = 1
+STATUS_SUDDEN_DEATH = 2
+STATUS_GAME_OVER = 4
+
+# Delta fields in mask bit order: (name, struct)
+DELTA_FIELDS = (
+    ("player_score", struct.Struct("<H")),
+    ("cpu_score", struct.Struct("<H")),
+    ("kicks_taken", struct.Struct("<H")),
+    ("current_round", struct.Struct("<H")),
+    ("sd_round", struct.Struct("<H")),
+    ("status", struct.Struct("<B")),
+    ("shot", struct.Struct("<hh")),  # Target of the last kick
+    ("keeper", struct.Struct("<hh")),  # Goalkeeper position when it arrived
+    ("goal", struct.Struct("<B")),  # Whether the last kick went in
+)
+
+DIFFICULTIES = (DIFFICULTY_EASY, DIFFICULTY_NORMAL, DIFFICULTY_HARD)
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class MatchError(Exception):
+    """An "E" reply: the server refused a request"""
+    def __init__(self, match_id, code):
+        super().__init__(f"match {match_id}: error {code}")
+        self.match_id = match_id
+        self.code = code
+
+
+def match_fields(match, shot, keeper, goal):
+    # Current values of DELTA_FIELDS, each as a tuple for its struct
+    status = ((STATUS_PLAYER_TURN if match.player_turn else 0)
+              | (STATUS_SUDDEN_DEATH if match.sudden_death else 0)
+              | (STATUS_GAME_OVER if match.game_over else 0))
+    return ((match.player_score,), (match.cpu_score,), (match.kicks_taken,),
+            (match.current_round,), (match.sd_round,), (status,), shot, keeper, (goal,))
+
+
+def pack_delta(match_id, fields, previous=None):
+    """A "D" message with the fields that differ from previous (all if None)"""
+    mask = 0
+    body = []
+    for bit, ((_, packer), value) in enumerate(zip(DELTA_FIELDS, fields)):
+        if previous is None or previous[bit] != value:
+            mask |= 1 << bit
+            body.append(packer.pack(*value))
+    return b"D" + DELTA_HEADER.pack(match_id, mask) + b"".join(body)
+
+
+async def read_delta(reader):
+    """(match id, {field: value}) of a "D" message whose type byte was read"""
+    match_id, mask = DELTA_HEADER.unpack(await reader.readexactly(DELTA_HEADER.size))
+    changes = {}
+    for bit, (name, packer) in enumerate(DELTA_FIELDS):
+        if mask >> bit & 1:
+            value = packer.unpack(await reader.readexactly(packer.size))
+            changes[name] = value if len(value) > 1 else value[0]
+    return match_id, changes
+
+
+class HostedMatch:
+    """A match on the server and the fields last sent to its client"""
+    __slots__ = ("match", "sent", "shot", "keeper", "goal")
+
+    def __init__(self, match):
+        self.match = match
+        self.shot = (0, 0)
+        self.keeper = (0, 0)
+        self.goal = 0
+        self.sent = None
+
+    def delta(self, match_id):
+        fields = match_fields(self.match, self.shot, self.keeper, self.goal)
+        message = pack_delta(match_id, fields, self.sent)
+        self.sent = fields
+        return message
+
+    def settle(self):
+        # Finish the kick in flight, then run until the next input is needed
+        match = self.match
+        while not match.game_over:
+            if match.ball_moving:
+                match.resolve_kick()
+                self.shot = (int(match.target_pos[0]), int(match.target_pos[1]))
+                self.keeper = (int(match.goalkeeper_pos[0]), int(match.goalkeeper_pos[1]))
+                self.goal = int(match.goal_scored)
+            elif match.awaiting_player_kick() or match.awaiting_cpu_kick():
+                break
+            match.step()
+
+
+class MatchServer:
+    """Hosts matches for any number of connections in one event loop"""
+    def __init__(self):
+        self.matches = {}
+        self.next_id = 1
+        self.connections = 0
+        self.matches_started = 0
+        self.matches_finished = 0
+        self.inputs = 0
+
+    def new_match(self, difficulty, cpu, flags, seed):
+        if difficulty >= len(DIFFICULTIES) or cpu >= len(CPU_STRATEGIES):
+            return None
+        match = Match(DIFFICULTIES[difficulty], realtime=False,
+                      seed=seed if flags & NEW_SEEDED else None,
+                      cpu_strategy=make_cpu_strategy(CPU_STRATEGIES[cpu]))
+        match_id = self.next_id
+        self.next_id = (self.next_id + 1) % (1 << 32) or 1
+        hosted = self.matches[match_id] = HostedMatch(match)
+        hosted.settle()
+        self.matches_started += 1
+        return match_id
+
+    def apply_input(self, kind, match_id, x, y):
+        """The reply to a "K" or "G" request"""
+        hosted = self.matches.get(match_id)
+        if hosted is None:
+            return b"E" + ERROR.pack(match_id, ERROR_UNKNOWN_MATCH)
+        match = hosted.match
+        if kind == b"K":
+            if not match.awaiting_player_kick():
+                return b"E" + ERROR.pack(match_id, ERROR_NOT_AWAITED)
+            match.player_shoot((x, y))
+            if not match.ball_moving:
+                return b"E" + ERROR.pack(match_id, ERROR_OUTSIDE_GOAL)
+        else:
+            if not match.awaiting_cpu_kick():
+                return b"E" + ERROR.pack(match_id, ERROR_NOT_AWAITED)
+            match.cpu_goalkeeper_move((x, y))
+            match.step()  # The CPU shoots as soon as it is ready
+        self.inputs += 1
+        hosted.settle()
+        if match.game_over:
+            self.matches_finished += 1
+        return hosted.delta(match_id)
+
+    async def handle(self, reader, writer):
+        """Serve one connection until it closes"""
+        self.connections += 1
+        owned = set()
+        try:
+            while True:
+                try:
+                    (kind,) = REQUEST_TYPE.unpack(await reader.readexactly(1))
+                except asyncio.IncompleteReadError:
+                    break
+                if kind == b"N":
+                    difficulty, cpu, flags, seed = NEW_MATCH.unpack(
+                        await reader.readexactly(NEW_MATCH.size))
+                    match_id = self.new_match(difficulty, cpu, flags, seed)
+                    if match_id is None:
+                        writer.write(b"E" + ERROR.pack(0, ERROR_BAD_REQUEST))
+                    else:
+                        owned.add(match_id)
+                        writer.write(self.matches[match_id].delta(match_id))
+                elif kind in (b"K", b"G"):
+                    match_id, x, y = INPUT.unpack(await reader.readexactly(INPUT.size))
+                    if match_id not in owned:
+                        writer.write(b"E" + ERROR.pack(match_id, ERROR_UNKNOWN_MATCH))
+                    else:
+                        writer.write(self.apply_input(kind, match_id, x, y))
+                elif kind == b"X":
+                    (match_id,) = CLOSE.unpack(await reader.readexactly(CLOSE.size))
+                    if match_id in owned:
+                        owned.discard(match_id)
+                        del self.matches[match_id]
+                else:
+                    raise ProtocolError(f"unknown request {kind!r}")
+                await writer.drain()
+        except (ProtocolError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for match_id in owned:
+                del self.matches[match_id]
+            self.connections -= 1
+            writer.close()
+
+
+class MatchClient:
+    """Client side of the protocol, for any number of concurrent matches.
+
+    Replies arrive in request order, so requests may be pipelined from
+    many coroutines over one connection.
+    """
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending = collections.deque()
+        self.receiver = asyncio.ensure_future(self._receive())
+
+    @classmethod
+    async def connect(cls, host=DEFAULT_HOST, port=DEFAULT_PORT, unix=None):
+        if unix:
+            reader, writer = await asyncio.open_unix_connection(unix)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def _receive(self):
+        try:
+            while True:
+                (kind,) = REQUEST_TYPE.unpack(await self.reader.readexactly(1))
+                if kind == b"D":
+                    reply = await read_delta(self.reader)
+                elif kind == b"E":
+                    match_id, error = ERROR.unpack(await self.reader.readexactly(ERROR.size))
+                    reply = MatchError(match_id, error)
+                else:
+                    raise ProtocolError(f"unknown reply {kind!r}")
+                future = self.pending.popleft()
+                if isinstance(reply, Exception):
+                    future.set_exception(reply)
+                else:
+                    future.set_result(reply)
+        except (ProtocolError, asyncio.IncompleteReadError, ConnectionError) as e:
+            while self.pending:
+                self.pending.popleft().set_exception(ConnectionError(f"connection lost: {e}"))
+
+    def _request(self, message):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append(future)
+        self.writer.write(message)
+        return future
+
+    async def new_match(self, difficulty=1, cpu=0, seed=None):
+        """(match id, all fields) of a new match"""
+        flags = NEW_SEEDED if seed is not None else 0
+        return await self._request(b"N" + NEW_MATCH.pack(difficulty, cpu, flags, seed or 0))
+
+    async def kick(self, match_id, pos):
+        """Shoot and return the delta once the kick is settled"""
+        return (await self._request(b"K" + INPUT.pack(match_id, *pos)))[1]
+
+    async def keeper(self, match_id, pos):
+        """Place the goalkeeper, let the CPU shoot and return the delta"""
+        return (await self._request(b"G" + INPUT.pack(match_id, *pos)))[1]
+
+    def close_match(self, match_id):
+        self.writer.write(b"X" + CLOSE.pack(match_id))
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.receiver.cancel()
+
+
+async def report(server, interval):
+    # Periodic throughput line
+    last = (time.perf_counter(), server.inputs, server.matches_finished)
+    while True:
+        await asyncio.sleep(interval)
+        now = (time.perf_counter(), server.inputs, server.matches_finished)
+        elapsed = now[0] - last[0]
+        print(f"{server.connections} connections, {len(server.matches)} matches, "
+              f"{(now[1] - last[1]) / elapsed:.0f} inputs/s, "
+              f"{(now[2] - last[2]) / elapsed:.0f} matches/s finished", flush=True)
+        last = now
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, unix=None, stats=0.0):
+    server = MatchServer()
+    if unix:
+        listener = await asyncio.start_unix_server(server.handle, unix)
+    else:
+        listener = await asyncio.start_server(server.handle, host, port)
+    where = unix or f"{host}:{port}"
+    print(f"serving matches on {where}", flush=True)
+    reporter = asyncio.ensure_future(report(server, stats)) if stats else None
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        if reporter:
+            reporter.cancel()
+        if unix and os.path.exists(unix):
+            os.remove(unix)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Host headless matches for network clients")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--stats", type=float, default=0.0, metavar="SECONDS",
+                        help="print throughput every SECONDS")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.stats))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
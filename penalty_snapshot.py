@@ -0,0 +1,230 @@
+"""Saving matches to disk and rewinding them.
+
+``Match.snapshot()`` captures the whole state of a match as nested tuples;
+this module packs such a snapshot into a compact binary form, writes it
+crash-safely (a temporary file, fsync, then an atomic rename), and keeps a
+ring buffer of recent snapshots for instant rewind.
+
+The packed form is a small tagged encoding: every value is one type byte
+followed by fixed-size struct fields. The Mersenne Twister state of each
+random generator, 625 words, is stored as packed uint32s, which is most of
+the roughly 5 KB a saved match takes. The state of a learning CPU
+strategy, when the match has one, is stored as its bytes.
+"""
+import argparse
+import os
+import struct
+import zlib
+from collections import deque
+
+from penalty_engine import (
+    SNAPSHOT_FIELDS, SNAPSHOT_LIST_FIELDS, SNAPSHOT_HISTORY_FIELDS, Match, Motion,
+)
+
+SNAPSHOT_MAGIC = b"PKSN"
+SNAPSHOT_VERSION = 3
+OLDEST_VERSION = 2  # Version 2 snapshots have no CPU strategy state
+SNAPSHOT_HEADER = struct.Struct("<4sBI")  # Magic, version, checksum of the field names
+
+# Snapshots whose fields do not match this engine are refused
+FIELDS_CHECKSUM = zlib.crc32(
+    " ".join(SNAPSHOT_FIELDS + SNAPSHOT_LIST_FIELDS + SNAPSHOT_HISTORY_FIELDS).encode())
+
+DEFAULT_REWIND = 600  # Snapshots kept by a RewindBuffer
+
+INT = struct.Struct("<q")
+UINT64 = struct.Struct("<Q")
+FLOAT = struct.Struct("<d")
+LENGTH = struct.Struct("<H")
+SIZE = struct.Struct("<I")
+MOTION = struct.Struct("<6d")  # Start, target, speed, dt
+
+U32_LIMIT = 1 << 32
+INT_MIN = -(1 << 63)
+INT_MAX = (1 << 63) - 1
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _pack_value(value, out):
+    if value is None:
+        out += b"N"
+    elif value is True:
+        out += b"T"
+    elif value is False:
+        out += b"F"
+    elif isinstance(value, int):
+        if INT_MIN <= value <= INT_MAX:
+            out += b"i" + INT.pack(value)
+        else:
+            out += b"Q" + UINT64.pack(value)  # Seeds use the full 64 bits
+    elif isinstance(value, float):
+        out += b"d" + FLOAT.pack(value)
+    elif isinstance(value, str):
+        data = value.encode()
+        out += b"s" + LENGTH.pack(len(data)) + data
+    elif isinstance(value, bytes):
+        out += b"b" + SIZE.pack(len(value)) + value  # Packed kick history
+    elif isinstance(value, Motion):
+        out += b"m" + MOTION.pack(*value.start, *value.target, value.speed, value.dt)
+    elif isinstance(value, tuple):
+        if value and all(type(v) is int and 0 <= v < U32_LIMIT for v in value):
+            out += b"u" + LENGTH.pack(len(value)) + struct.pack(f"<{len(value)}I", *value)
+        else:
+            out += b"t" + LENGTH.pack(len(value))
+            for item in value:
+                _pack_value(item, out)
+    else:
+        raise SnapshotError(f"cannot pack {type(value).__name__}")
+
+
+def _unpack_value(data, offset):
+    # Return (value, offset after it)
+    tag = data[offset:offset + 1]
+    offset += 1
+    if tag == b"N":
+        return None, offset
+    if tag == b"T":
+        return True, offset
+    if tag == b"F":
+        return False, offset
+    if tag == b"i":
+        return INT.unpack_from(data, offset)[0], offset + INT.size
+    if tag == b"Q":
+        return UINT64.unpack_from(data, offset)[0], offset + UINT64.size
+    if tag == b"d":
+        return FLOAT.unpack_from(data, offset)[0], offset + FLOAT.size
+    if tag == b"s":
+        (size,) = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        return data[offset:offset + size].decode(), offset + size
+    if tag == b"b":
+        (size,) = SIZE.unpack_from(data, offset)
+        offset += SIZE.size
+        if offset + size > len(data):
+            raise SnapshotError("truncated snapshot")
+        return bytes(data[offset:offset + size]), offset + size
+    if tag == b"m":
+        sx, sy, tx, ty, speed, dt = MOTION.unpack_from(data, offset)
+        return Motion((sx, sy), (tx, ty), speed, dt), offset + MOTION.size
+    if tag == b"u":
+        (count,) = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        return struct.unpack_from(f"<{count}I", data, offset), offset + 4 * count
+    if tag == b"t":
+        (count,) = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        items = []
+        for _ in range(count):
+            item, offset = _unpack_value(data, offset)
+            items.append(item)
+        return tuple(items), offset
+    raise SnapshotError(f"unknown value type {tag!r} at offset {offset - 1}")
+
+
+def pack_snapshot(snapshot):
+    """Bytes of a Match.snapshot()"""
+    out = bytearray(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, FIELDS_CHECKSUM))
+    _pack_value(snapshot, out)
+    return bytes(out)
+
+
+def unpack_snapshot(data):
+    """The Match.snapshot() packed by pack_snapshot"""
+    if len(data) < SNAPSHOT_HEADER.size:
+        raise SnapshotError("truncated snapshot")
+    magic, version, checksum = SNAPSHOT_HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotError("not a match snapshot")
+    if not OLDEST_VERSION <= version <= SNAPSHOT_VERSION:
+        raise SnapshotError(f"unsupported snapshot version {version}")
+    if checksum != FIELDS_CHECKSUM:
+        raise SnapshotError("snapshot was saved by an incompatible engine")
+    try:
+        snapshot, offset = _unpack_value(data, SNAPSHOT_HEADER.size)
+    except (struct.error, UnicodeDecodeError) as e:
+        raise SnapshotError(f"corrupt snapshot: {e}") from None
+    if offset != len(data):
+        raise SnapshotError("trailing data after snapshot")
+    if version == 2:
+        snapshot += (None,)  # Restoring leaves the CPU strategy as it is
+    return snapshot
+
+
+def save_match(path, match):
+    """Write the match state so that a crash never leaves a partial file"""
+    data = pack_snapshot(match.snapshot())
+    temp = f"{path}.tmp"
+    with open(temp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+
+
+def load_match(path, cls=Match, **kwargs):
+    """A new cls instance in the state saved at path.
+
+    ``kwargs`` go to the constructor, e.g. the ``cpu_strategy`` to resume
+    with; everything the snapshot covers, including what that strategy had
+    learnt, is then overwritten.
+    """
+    with open(path, "rb") as f:
+        snapshot = unpack_snapshot(f.read())
+    return cls(**kwargs).restore(snapshot)
+
+
+class RewindBuffer:
+    """The last ``capacity`` snapshots of a match, newest last.
+
+    Push once per step (or per kick) and rewind to any of them; older
+    snapshots drop off the front, so memory stays bounded.
+    """
+    def __init__(self, capacity=DEFAULT_REWIND):
+        self.snapshots = deque(maxlen=capacity)
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    def push(self, match):
+        self.snapshots.append(match.snapshot())
+
+    def clear(self):
+        self.snapshots.clear()
+
+    def rewind(self, match, back=1):
+        """Restore the snapshot ``back`` pushes ago (1 is the newest).
+
+        Newer snapshots are discarded and the restored one is kept, so
+        rewinding again by 1 returns to the same point. Returns False, and
+        leaves the match alone, when the buffer does not reach that far.
+        """
+        if back < 1 or back > len(self.snapshots):
+            return False
+        for _ in range(back - 1):
+            self.snapshots.pop()
+        match.restore(self.snapshots[-1])
+        return True
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Show the state of a saved match")
+    parser.add_argument("path", help="file written by save_match (e.g. soccer_penalty.py --autosave)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    match = load_match(args.path, realtime=False)
+    print(f"seed {match.seed}, difficulty {match.difficulty}, step {match.step_count}")
+    print(f"score {match.player_score}-{match.cpu_score} after {match.kicks_taken} kicks"
+          + (f", sudden death round {match.sd_round}" if match.sudden_death else "")
+          + (", game over" if match.game_over else ""))
+    print(f"player {match.player_results + list(match.sd_player_results)}")
+    print(f"cpu    {match.cpu_results + list(match.sd_cpu_results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""Equilibrium strategies for the CPU kicker and goalkeeper.
+
+Every kick is a zero-sum game between the kicker's target and the
+goalkeeper's position. The goal is discretised into a grid of targets and
+goalkeeper positions, the probability of a goal is evaluated for every pair
+with the engine's own ball and goalkeeper motion, and the mixed-strategy
+equilibrium is found by regret matching. Two games are solved per
+difficulty, since the goalkeepers differ in size:
+
+- the CPU kicker against the player's goalkeeper, who stands still
+- the player's kick against the CPU goalkeeper, who runs from the centre of
+  the goal toward the target it picked
+
+Solving needs NumPy and takes a few seconds, so the resulting sampling
+tables are cached on disk as JSON. Loading them needs nothing beyond the
+standard library and each draw is O(1) through an alias table.
+
+``make_cpu_strategy`` builds any of the CPU strategies by name, including
+the adaptive goalkeeper from penalty_adaptive.
+"""
+import functools
+import json
+import os
+
+from penalty_engine import (
+    GOAL_WIDTH, GOAL_HEIGHT, GOAL_X, GOAL_Y, PENALTY_SPOT, BALL_SPEED, GOALKEEPER_SPEED,
+    ARRIVAL_DISTANCE, TIME_STEP, DIFFICULTY_EASY, DIFFICULTY_NORMAL, DIFFICULTY_HARD,
+    Motion, goalkeeper_sizes,
+)
+from penalty_adaptive import AdaptiveStrategy
+
+STRATEGY_VERSION = 1
+STRATEGY_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "soccer_penalty")
+
+# Grid spacing in pixels for kick targets and goalkeeper positions
+KICK_GRID = 10
+KEEPER_GRID = 10
+
+# Regret matching stops once neither side can gain more than this
+SOLVER_TOLERANCE = 1e-3
+SOLVER_MAX_ITERATIONS = 20000
+MIN_PROBABILITY = 1e-4  # Smaller probabilities are dropped from the tables
+
+
+def _axis(low, high, step):
+    # Grid from low to high inclusive, always including both ends
+    values = list(range(low, high + 1, step))
+    if values[-1] != high:
+        values.append(high)
+    return values
+
+
+def kick_targets():
+    """Every target on the grid the CPU kicker may pick (same margins as cpu_shoot)"""
+    return [(x, y)
+            for x in _axis(GOAL_X + 20, GOAL_X + GOAL_WIDTH - 20, KICK_GRID)
+            for y in _axis(GOAL_Y + 20, GOAL_Y + GOAL_HEIGHT - 20, KICK_GRID)]
+
+
+def keeper_positions(width, height):
+    """Every top-left goalkeeper position on the grid that keeps it inside the goal"""
+    return [(x, y)
+            for x in _axis(GOAL_X, GOAL_X + GOAL_WIDTH - int(width), KEEPER_GRID)
+            for y in _axis(GOAL_Y, GOAL_Y + GOAL_HEIGHT - int(height), KEEPER_GRID)]
+
+
+def _scored(ball, keeper, width, height):
+    # Same test as Match.check_goal
+    in_goal = GOAL_X < ball[0] < GOAL_X + GOAL_WIDTH and GOAL_Y < ball[1] < GOAL_Y + GOAL_HEIGHT
+    blocked = (keeper[0] < ball[0] < keeper[0] + int(width)
+               and keeper[1] < ball[1] < keeper[1] + int(height))
+    return in_goal and not blocked
+
+
+def _ball_landings(targets):
+    # Where the ball is and how long it has flown when it reaches each target
+    landings = []
+    for target in targets:
+        motion = Motion(PENALTY_SPOT, target, BALL_SPEED)
+        landings.append((motion.position(motion.duration), motion.duration))
+    return landings
+
+
+def payoff_against_player(difficulty):
+    """Goal matrix for CPU kicks: rows are targets, columns player goalkeeper positions"""
+    _, _, width, height = goalkeeper_sizes(difficulty)
+    targets = kick_targets()
+    keepers = keeper_positions(width, height)
+    matrix = [[float(_scored(ball, keeper, width, height)) for keeper in keepers]
+              for ball, _ in _ball_landings(targets)]
+    return targets, keepers, matrix
+
+
+def payoff_against_cpu(difficulty):
+    """Goal matrix for player kicks: rows are targets, columns CPU goalkeeper targets.
+
+    The CPU goalkeeper starts in the centre of the goal and is caught by the
+    ball part way toward its target, exactly as in Match.resolve_kick.
+    """
+    width, height, _, _ = goalkeeper_sizes(difficulty)
+    start = (GOAL_X + (GOAL_WIDTH - int(width)) // 2, GOAL_Y + (GOAL_HEIGHT - int(height)) // 2)
+    targets = kick_targets()
+    keepers = keeper_positions(width, height)
+    motions = [Motion(start, keeper, GOALKEEPER_SPEED) for keeper in keepers]
+    matrix = [[float(_scored(ball, motion.position(flight), width, height)) for motion in motions]
+              for ball, flight in _ball_landings(targets)]
+    return targets, keepers, matrix
+
+
+def solve(matrix, tolerance=SOLVER_TOLERANCE, max_iterations=SOLVER_MAX_ITERATIONS):
+    """Equilibrium of a zero-sum matrix game where the row player maximizes.
+
+    Returns (row strategy, column strategy, game value, gap), where gap bounds
+    how much either side could gain by deviating. Uses regret matching+ with
+    linearly weighted averages, which converges quickly on these games.
+    """
+    import numpy as np
+
+    payoff = np.asarray(matrix, dtype=float)
+    rows, columns = payoff.shape
+    row_regret = np.zeros(rows)
+    column_regret = np.zeros(columns)
+    row_sum = np.zeros(rows)
+    column_sum = np.zeros(columns)
+    row = np.full(rows, 1 / rows)
+    column = np.full(columns, 1 / columns)
+    gap = 1.0
+    for iteration in range(1, max_iterations + 1):
+        row_values = payoff @ column
+        column_values = row @ payoff
+        row_regret = np.maximum(row_regret + row_values - row @ row_values, 0)
+        column_regret = np.maximum(column_regret + column @ column_values - column_values, 0)
+        row_sum += iteration * row
+        column_sum += iteration * column
+        row = _normalized(row_regret, rows)
+        column = _normalized(column_regret, columns)
+
+        if iteration % 100 == 0:
+            average_row = row_sum / row_sum.sum()
+            average_column = column_sum / column_sum.sum()
+            gap = (payoff @ average_column).max() - (average_row @ payoff).min()
+            if gap < tolerance:
+                break
+
+    row = row_sum / row_sum.sum()
+    column = column_sum / column_sum.sum()
+    value = float(row @ payoff @ column)
+    gap = float((payoff @ column).max() - (row @ payoff).min())
+    return row.tolist(), column.tolist(), value, gap
+
+
+def _normalized(regret, size):
+    total = regret.sum()
+    return regret / total if total > 0 else regret * 0 + 1 / size
+
+
+class AliasTable:
+    """O(1) sampling from a discrete distribution (Vose's alias method)"""
+    def __init__(self, values, probabilities):
+        n = len(values)
+        total = sum(probabilities)
+        scaled = [p * n / total for p in probabilities]
+        self.values = list(values)
+        self.accept = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            small_index = small.pop()
+            large_index = large.pop()
+            self.accept[small_index] = scaled[small_index]
+            self.alias[small_index] = large_index
+            scaled[large_index] -= 1 - scaled[small_index]
+            (small if scaled[large_index] < 1 else large).append(large_index)
+
+    def sample(self, rng):
+        i = rng.randrange(len(self.values))
+        return self.values[i if rng.random() < self.accept[i] else self.alias[i]]
+
+
+def _support(values, probabilities):
+    # Drop negligible probabilities and renormalize
+    kept = [(v, p) for v, p in zip(values, probabilities) if p >= MIN_PROBABILITY]
+    total = sum(p for _, p in kept)
+    return [list(v) for v, _ in kept], [p / total for _, p in kept]
+
+
+def cache_key(difficulty):
+    # Everything the tables depend on; a change invalidates the cache
+    return {
+        "version": STRATEGY_VERSION,
+        "difficulty": difficulty,
+        "goal": [GOAL_X, GOAL_Y, GOAL_WIDTH, GOAL_HEIGHT],
+        "spot": list(PENALTY_SPOT),
+        "speeds": [BALL_SPEED, GOALKEEPER_SPEED, ARRIVAL_DISTANCE, TIME_STEP],
+        "goalkeepers": list(goalkeeper_sizes(difficulty)),
+        "grid": [KICK_GRID, KEEPER_GRID],
+    }
+
+
+def cache_path(difficulty):
+    return os.path.join(STRATEGY_CACHE_DIR, f"strategy-{difficulty}.json")
+
+
+def solve_tables(difficulty):
+    """Solve both games of a difficulty and return its cacheable tables"""
+    targets, keepers, matrix = payoff_against_player(difficulty)
+    kick, _, kick_value, kick_gap = solve(matrix)
+    kick_targets_kept, kick_probabilities = _support(targets, kick)
+
+    targets, keepers, matrix = payoff_against_cpu(difficulty)
+    _, keeper, keeper_value, keeper_gap = solve(matrix)
+    keeper_targets_kept, keeper_probabilities = _support(keepers, keeper)
+
+    return {
+        "key": cache_key(difficulty),
+        "kick": {"targets": kick_targets_kept, "probabilities": kick_probabilities,
+                 "goal_probability": kick_value, "gap": kick_gap},
+        "keeper": {"targets": keeper_targets_kept, "probabilities": keeper_probabilities,
+                   "goal_probability": keeper_value, "gap": keeper_gap},
+    }
+
+
+def load_tables(difficulty, solve_missing=True):
+    """Cached tables for a difficulty, solved and saved first if missing or stale"""
+    try:
+        with open(cache_path(difficulty)) as f:
+            tables = json.load(f)
+        if tables.get("key") == cache_key(difficulty):
+            return tables
+    except (OSError, ValueError):
+        pass
+    if not solve_missing:
+        return None
+
+    tables = solve_tables(difficulty)
+    save_tables(difficulty, tables)
+    return tables
+
+
+def save_tables(difficulty, tables):
+    try:
+        os.makedirs(STRATEGY_CACHE_DIR, exist_ok=True)
+        with open(cache_path(difficulty), "w") as f:
+            json.dump(tables, f)
+    except OSError:
+        pass  # Unwritable cache, solve again next time
+
+
+class EquilibriumStrategy:
+    """CPU kicker and goalkeeper sampling from the equilibrium tables.
+
+    Pass it to Match as ``cpu_strategy``; all tables are loaded up front so
+    every kick is a constant-time draw from the match's own generator.
+    """
+    name = "equilibrium"
+
+    def __init__(self, difficulties=(DIFFICULTY_EASY, DIFFICULTY_NORMAL, DIFFICULTY_HARD)):
+        self.kicks = {}
+        self.keepers = {}
+        for difficulty in difficulties:
+            tables = load_tables(difficulty)
+            self.kicks[difficulty] = AliasTable(
+                [tuple(t) for t in tables["kick"]["targets"]], tables["kick"]["probabilities"])
+            self.keepers[difficulty] = AliasTable(
+                [tuple(t) for t in tables["keeper"]["targets"]], tables["keeper"]["probabilities"])
+
+    def kick_target(self, match):
+        return self.kicks[match.difficulty].sample(match.rng)
+
+    def keeper_target(self, match):
+        return self.keepers[match.difficulty].sample(match.rng)
+
+
+@functools.lru_cache(maxsize=None)
+def equilibrium_strategy():
+    """Shared EquilibriumStrategy for all difficulties, loaded once per process"""
+    return EquilibriumStrategy()
+
+
+# CPU strategies by name; "random" is the engine's own uniform choice
+CPU_STRATEGIES = ("random", "equilibrium", "adaptive")
+
+
+def make_cpu_strategy(name, state=None):
+    """Build a Match ``cpu_strategy`` by name, restoring a saved state if given"""
+    if name == "random":
+        return None
+    if name == "equilibrium":
+        return equilibrium_strategy()
+    if name == "adaptive":
+        return AdaptiveStrategy.from_state(state) if state else AdaptiveStrategy()
+    raise ValueError(f"unknown CPU strategy {name!r}")
+
+
+if __name__ == "__main__":
+    import time
+
+    for difficulty, name in ((DIFFICULTY_EASY, "Easy"), (DIFFICULTY_NORMAL, "Normal"),
+                             (DIFFICULTY_HARD, "Hard")):
+        start = time.perf_counter()
+        tables = solve_tables(difficulty)
+        elapsed = time.perf_counter() - start
+        save_tables(difficulty, tables)
+        kick = tables["kick"]
+        keeper = tables["keeper"]
+        print(f"{name}: CPU kicks score {kick['goal_probability']:.1%} "
+              f"({len(kick['targets'])} targets), player kicks score at most "
+              f"{keeper['goal_probability']:.1%} ({len(keeper['targets'])} keeper targets), "
+              f"solved in {elapsed:.1f} s")
@@ -0,0 +1,237 @@
+"""Round-robin tournaments of headless matches over a process pool.
+
+Every pairing of difficulty, player kicker strategy and player keeper
+strategy plays the same number of matches. The matches are split into
+chunks and played by worker processes, which write each result straight
+into a shared-memory array, so nothing but chunk bounds is pickled. Every
+match has its own seed derived from the tournament seed, so a tournament
+gives the same results however the chunks are scheduled.
+
+Strategies are plain functions of the Match, like the ``kicker`` and
+``keeper`` arguments of ``Match.play``; add one to KICKERS or KEEPERS to make
+it available by name. They should draw from ``match.player_rng``.
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from penalty_engine import (
+    GOAL_WIDTH, GOAL_HEIGHT, GOAL_X, GOAL_Y, DIFFICULTY_EASY, DIFFICULTY_NORMAL, DIFFICULTY_HARD,
+    Match, random_goal_target, random_keeper_position,
+)
+from penalty_strategy import CPU_STRATEGIES, make_cpu_strategy
+
+DIFFICULTY_NAMES = {DIFFICULTY_EASY: "easy", DIFFICULTY_NORMAL: "normal", DIFFICULTY_HARD: "hard"}
+
+# Per match: player score, cpu score, sudden-death rounds (int16 each)
+RESULT_FIELDS = 3
+RESULT_FORMAT = "h"
+RESULT_SIZE = 2
+
+DEFAULT_CHUNK_SIZE = 500
+CONFIDENCE_Z = 1.96  # 95% confidence intervals
+
+
+def corner_target(match):
+    # Shoot into a random corner, just inside the kicker margin
+    x = GOAL_X + 20 if match.player_rng.random() < 0.5 else GOAL_X + GOAL_WIDTH - 20
+    y = GOAL_Y + 20 if match.player_rng.random() < 0.5 else GOAL_Y + GOAL_HEIGHT - 20
+    return (x, y)
+
+
+def low_target(match):
+    # Shoot anywhere along the bottom band of the goal
+    x = match.player_rng.randint(GOAL_X + 20, GOAL_X + GOAL_WIDTH - 20)
+    y = match.player_rng.randint(GOAL_Y + GOAL_HEIGHT - 50, GOAL_Y + GOAL_HEIGHT - 20)
+    return (x, y)
+
+
+def centre_target(match):
+    return (GOAL_X + GOAL_WIDTH // 2, GOAL_Y + GOAL_HEIGHT // 2)
+
+
+def centre_keeper(match):
+    # Stay in the middle of the goal
+    return (GOAL_X + (GOAL_WIDTH - int(match.player_goalkeeper_width)) // 2,
+            GOAL_Y + (GOAL_HEIGHT - int(match.player_goalkeeper_height)) // 2)
+
+
+def corner_keeper(match):
+    # Guess a corner and wait there
+    max_x = GOAL_X + GOAL_WIDTH - int(match.player_goalkeeper_width)
+    max_y = GOAL_Y + GOAL_HEIGHT - int(match.player_goalkeeper_height)
+    return (match.player_rng.choice((GOAL_X, max_x)), match.player_rng.choice((GOAL_Y, max_y)))
+
+
+KICKERS = {
+    "uniform": random_goal_target,
+    "corners": corner_target,
+    "low": low_target,
+    "centre": centre_target,
+}
+
+KEEPERS = {
+    "uniform": random_keeper_position,
+    "centre": centre_keeper,
+    "corners": corner_keeper,
+}
+
+
+def match_seed(seed, pairing, index):
+    # Independent of chunking, so results do not depend on scheduling
+    return ((seed * 1_000_003 + pairing) * (1 << 32) + index) % (1 << 64)
+
+
+# Shared results buffer, attached once per worker process
+_results = None
+
+
+def _attach(name):
+    global _results
+    _results = shared_memory.SharedMemory(name=name)
+
+
+def _play_chunk(pairing, start, stop, matches, difficulty, kicker, keeper, seed, cpu):
+    # Play matches [start, stop) of one pairing into the shared results
+    kicker = KICKERS[kicker]
+    keeper = KEEPERS[keeper]
+    view = _results.buf.cast(RESULT_FORMAT)
+    try:
+        offset = (pairing * matches + start) * RESULT_FIELDS
+        for index in range(start, stop):
+            match = Match(difficulty, realtime=False, seed=match_seed(seed, pairing, index),
+                          cpu_strategy=make_cpu_strategy(cpu))
+            match.play(kicker, keeper)
+            view[offset] = match.player_score
+            view[offset + 1] = match.cpu_score
+            view[offset + 2] = match.sd_round if match.sudden_death else 0
+            offset += RESULT_FIELDS
+    finally:
+        view.release()
+    return stop - start
+
+
+def wilson_interval(successes, trials, z=CONFIDENCE_Z):
+    """Wilson score interval for a binomial proportion"""
+    if trials == 0:
+        return (0.0, 1.0)
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    centre = (p + z * z / (2 * trials)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return (max(0.0, centre - margin), min(1.0, centre + margin))
+
+
+def summarize(results):
+    """Statistics of one pairing from its (player, cpu, sd rounds) triples"""
+    matches = len(results)
+    wins = sum(player > cpu for player, cpu, _ in results)
+    sd_lengths = {}
+    for _, _, rounds in results:
+        if rounds:
+            sd_lengths[rounds] = sd_lengths.get(rounds, 0) + 1
+    sudden_deaths = sum(sd_lengths.values())
+    low, high = wilson_interval(wins, matches)
+    sd_low, sd_high = wilson_interval(sudden_deaths, matches)
+    return {
+        "matches": matches,
+        "player_win_rate": wins / matches if matches else 0.0,
+        "player_win_rate_ci": [low, high],
+        "sudden_death_rate": sudden_deaths / matches if matches else 0.0,
+        "sudden_death_rate_ci": [sd_low, sd_high],
+        "mean_sudden_death_rounds": (sum(r * n for r, n in sd_lengths.items()) / sudden_deaths
+                                     if sudden_deaths else 0.0),
+        "sudden_death_rounds": dict(sorted(sd_lengths.items())),
+    }
+
+
+def run_tournament(matches, difficulties=tuple(DIFFICULTY_NAMES), kickers=tuple(KICKERS),
+                   keepers=tuple(KEEPERS), workers=None, seed=0, chunk_size=DEFAULT_CHUNK_SIZE,
+                   cpu="random"):
+    """Play every pairing ``matches`` times and return a list of summaries.
+
+    ``cpu`` names the CPU strategy (penalty_strategy.CPU_STRATEGIES). A
+    learning CPU starts afresh in every match so results stay independent of
+    scheduling.
+    """
+    make_cpu_strategy(cpu)  # Solve any missing tables once, before the workers start
+    pairings = list(itertools.product(difficulties, kickers, keepers))
+    size = max(1, len(pairings) * matches * RESULT_FIELDS * RESULT_SIZE)
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        with ProcessPoolExecutor(workers, initializer=_attach, initargs=(shm.name,)) as pool:
+            futures = [
+                pool.submit(_play_chunk, pairing, start, min(start + chunk_size, matches),
+                            matches, difficulty, kicker, keeper, seed, cpu)
+                for pairing, (difficulty, kicker, keeper) in enumerate(pairings)
+                for start in range(0, matches, chunk_size)
+            ]
+            for future in futures:
+                future.result()  # Re-raise any worker error
+
+        # Merge straight from the shared array
+        view = shm.buf.cast(RESULT_FORMAT)
+        try:
+            summaries = []
+            for pairing, (difficulty, kicker, keeper) in enumerate(pairings):
+                begin = pairing * matches * RESULT_FIELDS
+                flat = view[begin:begin + matches * RESULT_FIELDS].tolist()
+                results = list(zip(flat[0::3], flat[1::3], flat[2::3]))
+                summary = {"difficulty": DIFFICULTY_NAMES[difficulty],
+                           "kicker": kicker, "keeper": keeper}
+                summary.update(summarize(results))
+                summaries.append(summary)
+        finally:
+            view.release()
+    finally:
+        shm.close()
+        shm.unlink()
+    return summaries
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run a round-robin tournament of headless matches")
+    parser.add_argument("--matches", type=int, default=2000, help="matches per pairing")
+    parser.add_argument("--difficulties", nargs="+", choices=list(DIFFICULTY_NAMES.values()),
+                        default=list(DIFFICULTY_NAMES.values()))
+    parser.add_argument("--kickers", nargs="+", choices=list(KICKERS), default=list(KICKERS))
+    parser.add_argument("--keepers", nargs="+", choices=list(KEEPERS), default=list(KEEPERS))
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cpu", choices=CPU_STRATEGIES, default="random",
+                        help="how the CPU aims and dives")
+    parser.add_argument("--json", metavar="PATH", help="write the summaries as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    by_name = {name: level for level, name in DIFFICULTY_NAMES.items()}
+    start = time.perf_counter()
+    summaries = run_tournament(args.matches, [by_name[name] for name in args.difficulties],
+                               args.kickers, args.keepers, args.workers, args.seed,
+                               args.chunk_size, args.cpu)
+    elapsed = time.perf_counter() - start
+
+    for s in summaries:
+        low, high = s["player_win_rate_ci"]
+        print(f"{s['difficulty']:7} {s['kicker']:8} {s['keeper']:8} "
+              f"win {s['player_win_rate']:6.1%} [{low:.1%}, {high:.1%}]  "
+              f"sudden death {s['sudden_death_rate']:5.1%} "
+              f"(mean {s['mean_sudden_death_rounds']:.2f} rounds)")
+    total = args.matches * len(summaries)
+    print(f"{total} matches in {elapsed:.1f} s ({total / elapsed:.0f} matches/s)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summaries, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Exact win probabilities of a shootout from any state.
+
+Given the probability that each side converts a kick, the chance that the
+player wins is computed exactly instead of by simulating matches:
+
+- The regular rounds are a small dynamic program over (kicks taken,
+  player score, CPU score), following the kick order and stopping where
+  Match.is_decided does.
+- Sudden death repeats rounds in which both sides kick until exactly one
+  of them scores, so from the start of a round the player wins with
+  p(1 - q) / (p(1 - q) + q(1 - p)), whoever kicks first.
+
+Every state is memoized, so after the first call for a pair of rates a
+lookup costs a dictionary hit. ``match_win_probability`` reads the state
+straight off a Match::
+
+    python3 penalty_winprob.py --player 0.8 --cpu 0.75
+    python3 penalty_winprob.py --difficulty hard --state 6 2 3
+"""
+import argparse
+import functools
+
+from penalty_engine import (
+    MAX_ROUNDS, KICK_ORDER_ABAB, KICK_ORDER_ABBA, DIFFICULTY_EASY, DIFFICULTY_NORMAL,
+    DIFFICULTY_HARD, decision_table, player_takes_kick,
+)
+
+# Conversion rates (player, CPU) of uniformly random kicks against the
+# engine's goalkeepers, measured over 20000 matches per difficulty
+DEFAULT_CONVERSION = {
+    DIFFICULTY_EASY: (0.921, 0.741),
+    DIFFICULTY_NORMAL: (0.841, 0.843),
+    DIFFICULTY_HARD: (0.738, 0.923),
+}
+
+# Kicks of weight given to DEFAULT_CONVERSION when blending in observed rates
+PRIOR_KICKS = 20
+
+
+def sudden_death_probability(p, q):
+    """Chance the player wins sudden death from the start of a round.
+
+    ``p`` and ``q`` are the player's and the CPU's conversion rates. When
+    no round can ever be decided (both always or never score) the sides
+    are even.
+    """
+    player = p * (1 - q)
+    cpu = q * (1 - p)
+    if player + cpu == 0:
+        return 0.5
+    return player / (player + cpu)
+
+
+@functools.lru_cache(maxsize=None)
+def win_probability(kicks_taken, player_score, cpu_score, p, q, kick_order=KICK_ORDER_ABAB,
+                    max_rounds=MAX_ROUNDS):
+    """Chance the player wins from a state before the next kick.
+
+    ``kicks_taken`` counts sudden death kicks too; in sudden death the
+    scores only matter through their difference.
+    """
+    regular_kicks = 2 * max_rounds
+    if kicks_taken >= regular_kicks:
+        # Sudden death: a round is decided once both sides have kicked
+        difference = player_score - cpu_score
+        if (kicks_taken - regular_kicks) % 2 == 0:
+            if difference:
+                return 1.0 if difference > 0 else 0.0
+            return sudden_death_probability(p, q)
+        # Only the parity of the round matters for who kicks, so the
+        # state is folded onto the first two sudden death rounds
+        kicks_taken = regular_kicks + (kicks_taken - regular_kicks) % 4
+        player_score, cpu_score = max(difference, 0), max(-difference, 0)
+    elif decision_table(max_rounds, kick_order)[kicks_taken][player_score][cpu_score]:
+        return 1.0 if player_score > cpu_score else 0.0
+
+    if player_takes_kick(kicks_taken, kick_order):
+        return (p * win_probability(kicks_taken + 1, player_score + 1, cpu_score, p, q,
+                                    kick_order, max_rounds)
+                + (1 - p) * win_probability(kicks_taken + 1, player_score, cpu_score, p, q,
+                                            kick_order, max_rounds))
+    return (q * win_probability(kicks_taken + 1, player_score, cpu_score + 1, p, q,
+                                kick_order, max_rounds)
+            + (1 - q) * win_probability(kicks_taken + 1, player_score, cpu_score, p, q,
+                                        kick_order, max_rounds))
+
+
+def match_win_probability(match, p, q):
+    """Chance the player wins ``match`` from its current state"""
+    if match.game_over:
+        if match.player_score == match.cpu_score:
+            return 0.5
+        return 1.0 if match.player_score > match.cpu_score else 0.0
+    return win_probability(match.kicks_taken, match.player_score, match.cpu_score, p, q,
+                           match.kick_order)
+
+
+def observed_rates(store, difficulty, prior_kicks=PRIOR_KICKS):
+    """(player, CPU) conversion rates from a KickStore, shrunk toward the defaults.
+
+    Every side starts from DEFAULT_CONVERSION weighted as ``prior_kicks``
+    kicks, so a store with few kicks still gives sensible rates.
+    """
+    rates = []
+    counts = store.conversion(by=("player",), difficulty=difficulty)
+    for player, prior in zip((True, False), DEFAULT_CONVERSION[difficulty]):
+        kicks, goals = counts.get((player,), (0, 0))
+        rates.append((goals + prior * prior_kicks) / (kicks + prior_kicks))
+    return tuple(rates)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Exact shootout win probabilities")
+    parser.add_argument("--difficulty", choices=("easy", "normal", "hard"), default="normal",
+                        help="take the default conversion rates of this difficulty")
+    parser.add_argument("--player", type=float, help="player conversion rate")
+    parser.add_argument("--cpu", type=float, help="CPU conversion rate")
+    parser.add_argument("--kick-order", choices=("abab", "abba"), default="abab")
+    parser.add_argument("--state", type=int, nargs=3, metavar=("KICKS", "PLAYER", "CPU"),
+                        help="print only the state after KICKS kicks at this score")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    p, q = DEFAULT_CONVERSION[("easy", "normal", "hard").index(args.difficulty)]
+    p = p if args.player is None else args.player
+    q = q if args.cpu is None else args.cpu
+    order = KICK_ORDER_ABBA if args.kick_order == "abba" else KICK_ORDER_ABAB
+
+    print(f"player converts {p:.3f}, CPU converts {q:.3f}")
+    if args.state:
+        kicks, player, cpu = args.state
+        print(f"after {kicks} kicks at {player}-{cpu}: player wins "
+              f"{win_probability(kicks, player, cpu, p, q, order):.2%}")
+        return
+
+    print(f"before the first kick: player wins {win_probability(0, 0, 0, p, q, order):.2%}")
+    print(f"sudden death: player wins {sudden_death_probability(p, q):.2%}")
+    print("by kicks taken (K), player score (P) and CPU score (columns):")
+    print(" K  P  " + "  ".join(f"{cpu:>6}" for cpu in range(MAX_ROUNDS + 1)))
+    for kicks in range(2 * MAX_ROUNDS + 1):
+        for player in range(MAX_ROUNDS + 1):
+            row = []
+            for cpu in range(MAX_ROUNDS + 1):
+                # Only scores reachable with the kicks each side has taken
+                player_kicks = sum(player_takes_kick(k, order) for k in range(kicks))
+                if player > player_kicks or cpu > kicks - player_kicks:
+                    row.append("     -")
+                else:
+                    row.append(f"{win_probability(kicks, player, cpu, p, q, order):6.1%}")
+            if any(cell.strip() != "-" for cell in row):
+                print(f"{kicks:>2} {player:>2}  " + "  ".join(row))
+
+
+if __name__ == "__main__":
+    main()
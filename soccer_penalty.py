@@ -1,15 +1,25 @@
+import argparse
+import functools
+import json
+import os
 import pygame
 import sys
-import random
-import math
+import time
+from collections import OrderedDict
 from pygame.locals import *
 
-# Initialize pygame
-pygame.init()
-
-# Screen dimensions
-SCREEN_WIDTH = 800
-SCREEN_HEIGHT = 600
+from penalty_engine import (
+    SCREEN_WIDTH, SCREEN_HEIGHT, MAX_ROUNDS, GOAL_WIDTH, GOAL_HEIGHT, BALL_RADIUS,
+    TIME_STEP, COLLISION_MODES,
+    DIFFICULTY_EASY, DIFFICULTY_NORMAL, Match,
+)
+from penalty_analytics import KickLogger, KickStore
+from penalty_heatmap import HEATMAP_RECT, Heatmaps, save_hint
+from penalty_profile import FRAME_PHASES, FrameProfiler, NullProfiler
+from penalty_replay import ReplayMatch, ReplayRecorder, load_matches, save_matches
+from penalty_snapshot import load_match, save_match
+from penalty_strategy import CPU_STRATEGIES, make_cpu_strategy
+from penalty_winprob import DEFAULT_CONVERSION, match_win_probability, observed_rates
 
 # Colors
 WHITE = (255, 255, 255)
@@ -21,36 +31,128 @@ YELLOW = (255, 255, 0)
 LIGHT_BLUE = (100, 100, 255)
 LIGHT_GREEN = (100, 255, 100)
 
-# Game settings
-MAX_ROUNDS = 5  # Best of 5 shots
-GOAL_WIDTH = 400
-GOAL_HEIGHT = 200
-BALL_RADIUS = 15
-GOALKEEPER_WIDTH = 80
-GOALKEEPER_HEIGHT = 120
+# Screen and clock, created by init_display() when the game starts
+screen = None
+clock = None
+
+# The only events queued; the rest (window, key-up, text input...) would
+# be queued and dropped every frame
+EVENT_TYPES = (QUIT, KEYDOWN, MOUSEBUTTONDOWN, MOUSEMOTION, MOUSEWHEEL, VIDEOEXPOSE)
+
+def init_display():
+    global screen, clock
+    # Only the modules the game uses; pygame.init() would also probe audio
+    pygame.display.init()
+    pygame.font.init()
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed(EVENT_TYPES)
+    
+    # Create the screen
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption('Soccer Penalty Shootout Game')
+    
+    # Clock for controlling game speed
+    clock = pygame.time.Clock()
+
+# Fonts as (name, size, bold), resolved on first use by the text cache
+TITLE_FONT = (None, 72, False)
+MENU_FONT = (None, 48, False)
+TEXT_FONT = (None, 36, False)
+HEADER_FONT = (None, 28, False)
+RESULT_FONT = ("Arial", 32, True)
+OVERLAY_FONT = (None, 20, False)
+
+# Resolved system font paths, kept on disk because scanning the installed
+# fonts is the slowest part of startup
+FONT_CACHE_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "soccer_penalty", "fonts.json")
+font_paths = None
+
+def load_font_paths():
+    try:
+        with open(FONT_CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_font_paths():
+    try:
+        os.makedirs(os.path.dirname(FONT_CACHE_PATH), exist_ok=True)
+        with open(FONT_CACHE_PATH, "w") as f:
+            json.dump(font_paths, f)
+    except OSError:
+        pass  # A read-only home directory only costs the font scan next time
+
+def load_font(font_key):
+    """Create the same font as pygame.font.SysFont without rescanning system fonts"""
+    global font_paths
+    name, size, bold = font_key
+    if name is None:
+        # The default font needs no lookup
+        path, set_bold = None, bold
+    else:
+        if font_paths is None:
+            font_paths = load_font_paths()
+        key = f"{name}:{int(bold)}"
+        cached = font_paths.get(key)
+        if cached is None or (cached[0] is not None and not os.path.exists(cached[0])):
+            def resolved(fontpath, size, set_bold, set_italic):
+                font_paths[key] = [fontpath, set_bold]
+                return None
+            pygame.font.SysFont(name, size, bold=bold, constructor=resolved)
+            save_font_paths()
+        path, set_bold = font_paths[key]
+    
+    font = pygame.font.Font(path, size)
+    if set_bold:
+        font.set_bold(True)
+    return font
+
+class TextCache:
+    """Font registry plus rendered text surfaces kept in LRU order"""
+    def __init__(self, max_surfaces=256):
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+        self.max_surfaces = max_surfaces
+        
+    def font(self, font_key):
+        font = self.fonts.get(font_key)
+        if font is None:
+            font = self.fonts[font_key] = load_font(font_key)
+        return font
+        
+    def render(self, text, font_key, color):
+        key = (text, font_key, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.font(font_key).render(text, True, color)
+            self.surfaces[key] = surface
+            if len(self.surfaces) > self.max_surfaces:
+                self.surfaces.popitem(last=False)  # Evict the least recently used
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
+        
+    def place(self, text, font_key, color, **anchor):
+        # (surface, rect) pair ready for Surface.blits, e.g. place(..., center=pos)
+        surface = self.render(text, font_key, color)
+        return surface, surface.get_rect(**anchor)
 
-# Create the screen
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption('Soccer Penalty Shootout Game')
+text_cache = TextCache()
 
-# Clock for controlling game speed
-clock = pygame.time.Clock()
+# Display rate and the longest frame the simulation catches up on
+DEFAULT_FPS = 60
+MAX_FRAME_TIME = 0.25
 
-# Fonts
-title_font = pygame.font.SysFont(None, 72)
-menu_font = pygame.font.SysFont(None, 48)
-font = pygame.font.SysFont(None, 36)
+# Longest wait for an event on a screen where nothing moves, in milliseconds
+IDLE_WAIT = 1000
 
 # Game states
 STATE_TITLE = 0
 STATE_GAME = 1
 STATE_GAME_OVER = 2
 
-# Difficulty levels
-DIFFICULTY_EASY = 0
-DIFFICULTY_NORMAL = 1
-DIFFICULTY_HARD = 2
-
 class Button:
     def __init__(self, x, y, width, height, text, color, hover_color):
         self.rect = pygame.Rect(x, y, width, height)
@@ -64,731 +166,386 @@ class Button:
         pygame.draw.rect(screen, color, self.rect)
         pygame.draw.rect(screen, WHITE, self.rect, 2)  # Border
         
-        text_surf = menu_font.render(self.text, True, WHITE)
-        text_rect = text_surf.get_rect(center=self.rect.center)
-        screen.blit(text_surf, text_rect)
+        screen.blit(*text_cache.place(self.text, MENU_FONT, WHITE, center=self.rect.center))
         
     def check_hover(self, pos):
         self.is_hovered = self.rect.collidepoint(pos)
         
     def is_clicked(self, pos, click):
         return self.rect.collidepoint(pos) and click
-class Game:
-    def __init__(self, difficulty=DIFFICULTY_NORMAL):
-        self.difficulty = difficulty
-        self.player_score = 0
-        self.cpu_score = 0
-        self.current_round = 1
-        self.player_turn = True
-        self.game_over = False
-        self.result_message = ""
-        self.ball_pos = [SCREEN_WIDTH // 2, SCREEN_HEIGHT - 100]
-        self.target_pos = None
-        self.ball_moving = False
-        self.sudden_death = False  # Flag for sudden death mode
-        
-        # Set goalkeeper sizes based on difficulty
-        if self.difficulty == DIFFICULTY_EASY:
-            # Easy: CPU goalkeeper is smaller, player goalkeeper is larger
-            self.cpu_goalkeeper_width = GOALKEEPER_WIDTH * 0.7  # 70% of normal size
-            self.cpu_goalkeeper_height = GOALKEEPER_HEIGHT * 0.7
-            self.player_goalkeeper_width = GOALKEEPER_WIDTH * 1.3  # 130% of normal size
-            self.player_goalkeeper_height = GOALKEEPER_HEIGHT * 1.3
-        elif self.difficulty == DIFFICULTY_NORMAL:
-            # Normal: Both goalkeepers are normal size
-            self.cpu_goalkeeper_width = GOALKEEPER_WIDTH
-            self.cpu_goalkeeper_height = GOALKEEPER_HEIGHT
-            self.player_goalkeeper_width = GOALKEEPER_WIDTH
-            self.player_goalkeeper_height = GOALKEEPER_HEIGHT
+def draw_pitch(surface):
+    # Draw grass
+    surface.fill(GREEN)
+    
+    # Draw a black background for the results table area
+    table_x = SCREEN_WIDTH - 220
+    table_y = SCREEN_HEIGHT - 170
+    table_width = 200
+    table_height = 150
+    pygame.draw.rect(surface, (0, 0, 0), (table_x, table_y, table_width, table_height))
+    
+    # Draw goal
+    goal_x = SCREEN_WIDTH // 2 - GOAL_WIDTH // 2
+    goal_y = SCREEN_HEIGHT // 4 - GOAL_HEIGHT // 2
+    pygame.draw.rect(surface, WHITE, (goal_x, goal_y, GOAL_WIDTH, GOAL_HEIGHT), 5)
+    
+    # Draw goal net
+    for i in range(0, GOAL_WIDTH, 20):
+        pygame.draw.line(surface, WHITE, (goal_x + i, goal_y), 
+                        (goal_x + i, goal_y + GOAL_HEIGHT), 1)
+    for i in range(0, GOAL_HEIGHT, 20):
+        pygame.draw.line(surface, WHITE, (goal_x, goal_y + i), 
+                        (goal_x + GOAL_WIDTH, goal_y + i), 1)
+    
+    # Draw penalty spot
+    pygame.draw.circle(surface, WHITE, (SCREEN_WIDTH // 2, SCREEN_HEIGHT - 100), 5)
+
+# The pitch never changes, so it is drawn once and blitted every frame
+pitch_layer = None
+
+def get_pitch_layer():
+    global pitch_layer
+    if pitch_layer is None:
+        pitch_layer = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert(screen)
+        draw_pitch(pitch_layer)
+    return pitch_layer
+
+# The pitch with an overlay over the goal (a shot heatmap or the save hint),
+# repainted only where the overlay changed
+field_layer = None
+field_heatmap = None
+
+def get_field_layer(heatmap):
+    global field_layer, field_heatmap
+    pitch = get_pitch_layer()
+    if heatmap is None:
+        return pitch
+    if field_layer is None:
+        field_layer = pitch.copy()
+    changes = heatmap.take_changes()
+    if heatmap is not field_heatmap:
+        changes = [HEATMAP_RECT]  # Another overlay, repaint it all
+        field_heatmap = heatmap
+    for rect in changes:
+        field_layer.blit(pitch, rect, rect)
+        field_layer.blit(heatmap.surface, rect, rect.move(-HEATMAP_RECT.x, -HEATMAP_RECT.y))
+    return field_layer
+
+# Results table layout (bottom right corner)
+TABLE_X = SCREEN_WIDTH - 200
+TABLE_Y = SCREEN_HEIGHT - 150
+CELL_WIDTH = 30
+CELL_HEIGHT = 30
+RESULTS_COLUMNS = MAX_ROUNDS  # Rounds on show at once, older ones are scrolled to
+
+# The whole table, title and row labels included, drawn as one surface
+TABLE_RECT = pygame.Rect(TABLE_X - 20, TABLE_Y - 30, SCREEN_WIDTH - TABLE_X + 20, 3 * CELL_HEIGHT + 31)
+
+@functools.lru_cache(maxsize=64)
+def render_results_table(header, color, start, player_results, cpu_results):
+    """Results table surface for one window of columns, starting at round start + 1"""
+    surface = pygame.Surface(TABLE_RECT.size, pygame.SRCALPHA)
+    left, top = TABLE_X - TABLE_RECT.x, TABLE_Y - TABLE_RECT.y
+    columns = len(player_results)
+    
+    # Draw grid
+    for i in range(columns + 1):
+        pygame.draw.line(surface, color,
+                         (left + i * CELL_WIDTH, top), (left + i * CELL_WIDTH, top + 3 * CELL_HEIGHT))
+    for i in range(4):
+        pygame.draw.line(surface, color,
+                         (left, top + i * CELL_HEIGHT), (left + columns * CELL_WIDTH, top + i * CELL_HEIGHT))
+    
+    place = text_cache.place
+    blits = [
+        place(header, HEADER_FONT, color, topleft=(left, top - 30)),
+        # Row headers
+        place("P", HEADER_FONT, color, topleft=(left - 20, top + CELL_HEIGHT)),
+        place("C", HEADER_FONT, color, topleft=(left - 20, top + 2 * CELL_HEIGHT)),
+    ]
+    
+    # Column headers (round numbers), smaller once they no longer fit a cell
+    for i in range(columns):
+        number = start + i + 1
+        if number < 10:
+            blits.append(place(f"{number}", HEADER_FONT, color, topleft=(left + i * CELL_WIDTH + 10, top)))
         else:
-            # Hard: CPU goalkeeper is larger, player goalkeeper is smaller
-            self.cpu_goalkeeper_width = GOALKEEPER_WIDTH * 1.3  # 130% of normal size
-            self.cpu_goalkeeper_height = GOALKEEPER_HEIGHT * 1.3
-            self.player_goalkeeper_width = GOALKEEPER_WIDTH * 0.7  # 70% of normal size
-            self.player_goalkeeper_height = GOALKEEPER_HEIGHT * 0.7
-        
-        # Position goalkeeper in the center of the goal
-        goal_x = SCREEN_WIDTH // 2 - GOAL_WIDTH // 2
-        goal_y = SCREEN_HEIGHT // 4 - GOAL_HEIGHT // 2
-        self.goalkeeper_pos = [
-            goal_x + (GOAL_WIDTH - self.get_current_goalkeeper_width()) // 2,
-            goal_y + (GOAL_HEIGHT - self.get_current_goalkeeper_height()) // 2
-        ]
-        
-        self.goalkeeper_target = None
-        self.goal_scored = None
-        self.waiting_time = 0
-        self.cpu_preparation_time = 0  # Time before CPU kicks
-        self.preparing_for_cpu_kick = False
-        self.check_win_after_waiting = False  # Flag to check for win after showing result
-        
-        # Track individual kick results (1 for goal, 0 for miss, -1 for not yet taken)
-        self.player_results = [-1] * MAX_ROUNDS
-        self.cpu_results = [-1] * MAX_ROUNDS
-        
-        # For sudden death rounds
-        self.sd_player_results = []
-        self.sd_cpu_results = []
-        self.sd_round = 0
+            font = HEADER_FONT if number < 100 else OVERLAY_FONT
+            blits.append(place(f"{number}", font, color,
+                               center=(left + i * CELL_WIDTH + CELL_WIDTH // 2, top + CELL_HEIGHT // 2)))
+    
+    # Results centered in cells: bright yellow O for a goal, red X for a miss
+    for i in range(columns):
+        cell_center_x = left + i * CELL_WIDTH + CELL_WIDTH // 2
+        for row, results in ((1, player_results), (2, cpu_results)):
+            center = (cell_center_x, top + row * CELL_HEIGHT + CELL_HEIGHT // 2)
+            if results[i] == 1:  # Goal
+                blits.append(place("O", RESULT_FONT, YELLOW, center=center))
+            elif results[i] == 0:  # Miss
+                blits.append(place("X", RESULT_FONT, RED, center=center))
+    surface.blits(blits, doreturn=False)
+    return surface
+
+class Game(Match):
+    # Pygame renderer over the headless match engine
+    
+    # How far the display is between the last simulation step and the next (0..1)
+    render_alpha = 1.0
+    
+    # Columns the results table is scrolled back from the latest round
+    results_scroll = 0
+    
+    # Shot heatmap of the match's difficulty (with --heatmap) and whether it is on show
+    heatmap = None
+    show_heatmap = False
+    
+    # Save-probability hint shown on the player's kicks (with --hints)
+    show_hints = False
+    
+    # (player, CPU) conversion rates behind the live win probability, None hides it
+    conversion = None
+    
+    def ball_draw_pos(self):
+        if self.ball_motion is None:
+            return self.ball_pos
+        # Sample the flight between the last step and the next one
+        return self.ball_motion.position(self.ball_time - (1 - self.render_alpha) * TIME_STEP)
+        
+    def goalkeeper_draw_pos(self):
+        if self.goalkeeper_motion is None:
+            return self.goalkeeper_pos  # Standing still or following the mouse
+        return self.goalkeeper_motion.position(
+            self.goalkeeper_time - (1 - self.render_alpha) * TIME_STEP)
+        
+    def field_overlay(self):
+        # The heatmap, else the save hint while the player aims, else nothing
+        if self.heatmap and self.show_heatmap:
+            return self.heatmap
+        if self.show_hints and self.player_turn:
+            return save_hint(self.difficulty)
+        return None
         
-    def get_current_goalkeeper_width(self):
-        # Return the appropriate goalkeeper width based on whose turn it is
-        if self.player_turn:
-            return self.cpu_goalkeeper_width  # CPU is the goalkeeper when player kicks
-        else:
-            return self.player_goalkeeper_width  # Player is the goalkeeper when CPU kicks
-            
-    def get_current_goalkeeper_height(self):
-        # Return the appropriate goalkeeper height based on whose turn it is
-        if self.player_turn:
-            return self.cpu_goalkeeper_height  # CPU is the goalkeeper when player kicks
-        else:
-            return self.player_goalkeeper_height  # Player is the goalkeeper when CPU kicks
     def draw_field(self):
-        # Draw grass
-        screen.fill(GREEN)
-        
-        # Draw a black background for the results table area
-        table_x = SCREEN_WIDTH - 220
-        table_y = SCREEN_HEIGHT - 170
-        table_width = 200
-        table_height = 150
-        pygame.draw.rect(screen, (0, 0, 0), (table_x, table_y, table_width, table_height))
-        
-        # Draw goal
-        goal_x = SCREEN_WIDTH // 2 - GOAL_WIDTH // 2
-        goal_y = SCREEN_HEIGHT // 4 - GOAL_HEIGHT // 2
-        pygame.draw.rect(screen, WHITE, (goal_x, goal_y, GOAL_WIDTH, GOAL_HEIGHT), 5)
+        screen.blit(get_field_layer(self.field_overlay()), (0, 0))
         
-        # Draw goal net
-        for i in range(0, GOAL_WIDTH, 20):
-            pygame.draw.line(screen, WHITE, (goal_x + i, goal_y), 
-                            (goal_x + i, goal_y + GOAL_HEIGHT), 1)
-        for i in range(0, GOAL_HEIGHT, 20):
-            pygame.draw.line(screen, WHITE, (goal_x, goal_y + i), 
-                            (goal_x + GOAL_WIDTH, goal_y + i), 1)
-        
-        # Draw penalty spot
-        pygame.draw.circle(screen, WHITE, (SCREEN_WIDTH // 2, SCREEN_HEIGHT - 100), 5)
-        
-    def draw_goalkeeper(self):
+    def goalkeeper_style(self):
         # Use different colors for player and CPU goalkeeper
         if self.player_turn:
             # When it's player's turn, the goalkeeper is CPU's (blue)
-            color = BLUE
-            width = self.cpu_goalkeeper_width
-            height = self.cpu_goalkeeper_height
+            return BLUE, self.cpu_goalkeeper_width, self.cpu_goalkeeper_height
         else:
             # When it's CPU's turn, the goalkeeper is player's (red)
-            color = RED
-            width = self.player_goalkeeper_width
-            height = self.player_goalkeeper_height
+            return RED, self.player_goalkeeper_width, self.player_goalkeeper_height
             
-        pygame.draw.rect(screen, color, 
-                        (self.goalkeeper_pos[0], self.goalkeeper_pos[1], 
-                         width, height))
+    def goalkeeper_rect(self):
+        _, width, height = self.goalkeeper_style()
+        x, y = self.goalkeeper_draw_pos()
+        return pygame.Rect(x, y, width, height)
+        
+    def ball_rect(self):
+        rect = pygame.Rect(0, 0, 2 * BALL_RADIUS + 2, 2 * BALL_RADIUS + 2)
+        x, y = self.ball_draw_pos()
+        rect.center = (int(x), int(y))
+        return rect
+        
+    def draw_goalkeeper(self):
+        color, width, height = self.goalkeeper_style()
+        x, y = self.goalkeeper_draw_pos()
+        pygame.draw.rect(screen, color, (x, y, width, height))
         
     def draw_ball(self):
-        pygame.draw.circle(screen, WHITE, (int(self.ball_pos[0]), int(self.ball_pos[1])), BALL_RADIUS)
-    def draw_scoreboard(self):
-        player_text = font.render(f"Player: {self.player_score}", True, WHITE)
-        cpu_text = font.render(f"CPU: {self.cpu_score}", True, WHITE)
+        x, y = self.ball_draw_pos()
+        pygame.draw.circle(screen, WHITE, (int(x), int(y)), BALL_RADIUS)
+    def scoreboard_blits(self):
+        render = text_cache.render
+        place = text_cache.place
         
         # Show round information based on whether we're in sudden death or not
         if self.sudden_death:
-            round_text = font.render(f"Sudden Death: Round {self.sd_round}", True, RED)
+            round_text = (f"Sudden Death: Round {self.sd_round}", RED)
         else:
-            round_text = font.render(f"Round: {self.current_round}/{MAX_ROUNDS}", True, WHITE)
-        
-        screen.blit(player_text, (20, 20))
-        screen.blit(cpu_text, (20, 60))
-        screen.blit(round_text, (SCREEN_WIDTH - 300, 20))
+            round_text = (f"Round: {self.current_round}/{MAX_ROUNDS}", WHITE)
         
-        # Draw difficulty indicator
+        # Difficulty indicator
         if self.difficulty == DIFFICULTY_EASY:
-            diff_text = font.render("Difficulty: Easy", True, LIGHT_GREEN)
+            diff_text = ("Difficulty: Easy", LIGHT_GREEN)
         elif self.difficulty == DIFFICULTY_NORMAL:
-            diff_text = font.render("Difficulty: Normal", True, YELLOW)
+            diff_text = ("Difficulty: Normal", YELLOW)
         else:
-            diff_text = font.render("Difficulty: Hard", True, RED)
-        screen.blit(diff_text, (SCREEN_WIDTH - 300, 60))
-        
-        # Draw penalty kick results table in the bottom right
-        self.draw_results_table()
+            diff_text = ("Difficulty: Hard", RED)
         
+        player, cpu = self.side_names
         if self.preparing_for_cpu_kick:
             # Show countdown timer
-            seconds_left = self.cpu_preparation_time // 60 + 1
-            turn_text = font.render(f"Get ready! CPU kicks in {seconds_left}...", True, WHITE)
+            seconds_left = int(self.cpu_preparation_time) + 1
+            turn_text = f"Get ready! {cpu} kicks in {seconds_left}..."
         elif self.player_turn:
-            turn_text = font.render("Player's Kick", True, WHITE)
+            turn_text = f"{player}'s Kick"
         else:
-            turn_text = font.render("CPU's Kick", True, WHITE)
-        screen.blit(turn_text, (SCREEN_WIDTH // 2 - 150, SCREEN_HEIGHT - 50))
+            turn_text = f"{cpu}'s Kick"
+        
+        blits = [
+            place(f"{player}: {self.player_score}", TEXT_FONT, WHITE, topleft=(20, 20)),
+            place(f"{cpu}: {self.cpu_score}", TEXT_FONT, WHITE, topleft=(20, 60)),
+            place(round_text[0], TEXT_FONT, round_text[1], topleft=(SCREEN_WIDTH - 300, 20)),
+            place(diff_text[0], TEXT_FONT, diff_text[1], topleft=(SCREEN_WIDTH - 300, 60)),
+            place(turn_text, TEXT_FONT, WHITE, topleft=(SCREEN_WIDTH // 2 - 150, SCREEN_HEIGHT - 50)),
+        ]
+        
+        if self.conversion:
+            # Memoized per state and the text is cached, so this is a lookup per frame
+            chance = match_win_probability(self, *self.conversion)
+            blits.append(place(f"{player} wins: {chance:.0%}", HEADER_FONT, LIGHT_BLUE, topleft=(20, 100)))
         
         if self.result_message:
             # Split multi-line messages
-            messages = self.result_message.split('\n')
             y_offset = SCREEN_HEIGHT // 2
-            for msg in messages:
-                result_text = font.render(msg, True, WHITE)
-                text_rect = result_text.get_rect(center=(SCREEN_WIDTH // 2, y_offset))
-                screen.blit(result_text, text_rect)
+            for msg in self.result_message.split('\n'):
+                blits.append(place(msg, TEXT_FONT, WHITE, center=(SCREEN_WIDTH // 2, y_offset)))
                 y_offset += 40
-    def draw_results_table(self):
-        # Draw table header
-        header_font = pygame.font.SysFont(None, 28)
-        
-        # Position the table in the bottom right corner
-        table_x = SCREEN_WIDTH - 200
-        table_y = SCREEN_HEIGHT - 150
+        return blits
+    def draw_scoreboard(self):
+        screen.blits(self.scoreboard_blits(), doreturn=False)
         
+        # Draw penalty kick results table in the bottom right
+        self.draw_results_table()
+    def results_table_contents(self):
         # Draw different tables based on game mode
         if self.sudden_death:
             # In sudden death mode, only show sudden death results
-            header_text = header_font.render("Sudden Death Results", True, RED)
-            screen.blit(header_text, (table_x, table_y - 30))
-            
-            cell_width = 30
-            cell_height = 30
-            
-            # Draw column headers (round numbers)
-            for i in range(len(self.sd_player_results)):
-                round_num = header_font.render(f"{i+1}", True, RED)
-                screen.blit(round_num, (table_x + i * cell_width + 10, table_y))
-            
-            # Draw row headers
-            player_label = header_font.render("P", True, RED)
-            cpu_label = header_font.render("C", True, RED)
-            screen.blit(player_label, (table_x - 20, table_y + cell_height))
-            screen.blit(cpu_label, (table_x - 20, table_y + 2 * cell_height))
-            
-            # Draw grid
-            sd_width = len(self.sd_player_results) * cell_width
-            
-            # Vertical lines
-            for i in range(len(self.sd_player_results) + 1):
-                pygame.draw.line(screen, RED, 
-                                (table_x + i * cell_width, table_y), 
-                                (table_x + i * cell_width, table_y + 3 * cell_height))
-            
-            # Horizontal lines
-            for i in range(4):
-                pygame.draw.line(screen, RED, 
-                                (table_x, table_y + i * cell_height), 
-                                (table_x + sd_width, table_y + i * cell_height))
-            
-            # Draw results using text - centered in cells
-            result_font = pygame.font.SysFont("Arial", 32, bold=True)
-            for i in range(len(self.sd_player_results)):
-                # Calculate cell center positions
-                cell_center_x = table_x + i * cell_width + cell_width // 2
-                player_center_y = table_y + cell_height + cell_height // 2
-                cpu_center_y = table_y + 2 * cell_height + cell_height // 2
-                
-                # Player results
-                if self.sd_player_results[i] == 1:  # Goal
-                    result = result_font.render("O", True, (255, 255, 0))
-                    text_rect = result.get_rect(center=(cell_center_x, player_center_y))
-                    screen.blit(result, text_rect)
-                elif self.sd_player_results[i] == 0:  # Miss
-                    result = result_font.render("X", True, RED)
-                    text_rect = result.get_rect(center=(cell_center_x, player_center_y))
-                    screen.blit(result, text_rect)
-                
-                # CPU results
-                if self.sd_cpu_results[i] == 1:  # Goal
-                    result = result_font.render("O", True, (255, 255, 0))
-                    text_rect = result.get_rect(center=(cell_center_x, cpu_center_y))
-                    screen.blit(result, text_rect)
-                elif self.sd_cpu_results[i] == 0:  # Miss
-                    result = result_font.render("X", True, RED)
-                    text_rect = result.get_rect(center=(cell_center_x, cpu_center_y))
-                    screen.blit(result, text_rect)
+            return "Sudden Death Results", RED, self.sd_player_results, self.sd_cpu_results
         else:
             # In regular mode, show normal rounds
-            header_text = header_font.render("Penalty Kick Results", True, WHITE)
-            screen.blit(header_text, (table_x, table_y - 30))
-            
-            cell_width = 30
-            cell_height = 30
-            
-            # Draw column headers (round numbers)
-            for i in range(MAX_ROUNDS):
-                round_num = header_font.render(f"{i+1}", True, WHITE)
-                screen.blit(round_num, (table_x + i * cell_width + 10, table_y))
-            
-            # Draw row headers
-            player_label = header_font.render("P", True, WHITE)
-            cpu_label = header_font.render("C", True, WHITE)
-            screen.blit(player_label, (table_x - 20, table_y + cell_height))
-            screen.blit(cpu_label, (table_x - 20, table_y + 2 * cell_height))
-            
-            # Draw grid
-            for i in range(MAX_ROUNDS + 1):
-                pygame.draw.line(screen, WHITE, 
-                                (table_x + i * cell_width, table_y), 
-                                (table_x + i * cell_width, table_y + 3 * cell_height))
-            
-            for i in range(4):
-                pygame.draw.line(screen, WHITE, 
-                                (table_x, table_y + i * cell_height), 
-                                (table_x + MAX_ROUNDS * cell_width, table_y + i * cell_height))
-            
-            # Draw results using text - centered in cells
-            result_font = pygame.font.SysFont("Arial", 32, bold=True)
-            for i in range(MAX_ROUNDS):
-                # Calculate cell center positions
-                cell_center_x = table_x + i * cell_width + cell_width // 2
-                player_center_y = table_y + cell_height + cell_height // 2
-                cpu_center_y = table_y + 2 * cell_height + cell_height // 2
-                
-                # Player results
-                if self.player_results[i] == 1:  # Goal
-                    # Draw bright yellow O for goal (more visible against any background)
-                    result = result_font.render("O", True, (255, 255, 0))  # Bright Yellow
-                    # Center the text in the cell
-                    text_rect = result.get_rect(center=(cell_center_x, player_center_y))
-                    screen.blit(result, text_rect)
-                elif self.player_results[i] == 0:  # Miss
-                    result = result_font.render("X", True, RED)
-                    # Center the text in the cell
-                    text_rect = result.get_rect(center=(cell_center_x, player_center_y))
-                    screen.blit(result, text_rect)
-                
-                # CPU results
-                if self.cpu_results[i] == 1:  # Goal
-                    # Draw bright yellow O for goal (more visible against any background)
-                    result = result_font.render("O", True, (255, 255, 0))  # Bright Yellow
-                    # Center the text in the cell
-                    text_rect = result.get_rect(center=(cell_center_x, cpu_center_y))
-                    screen.blit(result, text_rect)
-                elif self.cpu_results[i] == 0:  # Miss
-                    result = result_font.render("X", True, RED)
-                    # Center the text in the cell
-                    text_rect = result.get_rect(center=(cell_center_x, cpu_center_y))
-                    screen.blit(result, text_rect)
-    def move_ball(self):
-        if self.ball_moving and self.target_pos:
-            # Calculate direction vector
-            dx = self.target_pos[0] - self.ball_pos[0]
-            dy = self.target_pos[1] - self.ball_pos[1]
-            distance = math.sqrt(dx**2 + dy**2)
-            
-            if distance < 10:  # Ball reached target
-                self.ball_moving = False
-                self.check_goal()
-                return
-                
-            # Normalize and scale
-            speed = 15
-            dx = dx / distance * speed
-            dy = dy / distance * speed
-            
-            # Update position
-            self.ball_pos[0] += dx
-            self.ball_pos[1] += dy
-            
-    def move_goalkeeper(self):
-        if self.goalkeeper_target:
-            # Calculate direction vector for both x and y
-            dx = self.goalkeeper_target[0] - self.goalkeeper_pos[0]
-            dy = self.goalkeeper_target[1] - self.goalkeeper_pos[1]
-            distance = math.sqrt(dx**2 + dy**2)
-            
-            if distance < 10:  # Goalkeeper reached target
-                self.goalkeeper_target = None
-                return
-                
-            # Normalize and scale
-            speed = 10
-            dx = dx / distance * speed if distance > 0 else 0
-            dy = dy / distance * speed if distance > 0 else 0
-            
-            # Update both x and y positions
-            self.goalkeeper_pos[0] += dx
-            self.goalkeeper_pos[1] += dy
-    def check_goal(self):
-        goal_x = SCREEN_WIDTH // 2 - GOAL_WIDTH // 2
-        goal_y = SCREEN_HEIGHT // 4 - GOAL_HEIGHT // 2
-        
-        # Check if ball is in goal area
-        in_goal_x = goal_x < self.ball_pos[0] < goal_x + GOAL_WIDTH
-        in_goal_y = goal_y < self.ball_pos[1] < goal_y + GOAL_HEIGHT
-        
-        # Check if goalkeeper blocked
-        gk_left = self.goalkeeper_pos[0]
-        gk_right = self.goalkeeper_pos[0] + int(self.get_current_goalkeeper_width())
-        gk_top = self.goalkeeper_pos[1]
-        gk_bottom = self.goalkeeper_pos[1] + int(self.get_current_goalkeeper_height())
-        
-        blocked = (gk_left < self.ball_pos[0] < gk_right and 
-                  gk_top < self.ball_pos[1] < gk_bottom)
-        
-        if in_goal_x and in_goal_y and not blocked:
-            self.goal_scored = True
-            self.result_message = "GOAL!"
-            if self.player_turn:
-                self.player_score += 1
-                if self.sudden_death:
-                    self.sd_player_results[self.sd_round - 1] = 1  # 1 for goal
-                else:
-                    self.player_results[self.current_round - 1] = 1  # 1 for goal
-            else:
-                self.cpu_score += 1
-                if self.sudden_death:
-                    self.sd_cpu_results[self.sd_round - 1] = 1  # 1 for goal
-                else:
-                    self.cpu_results[self.current_round - 1] = 1  # 1 for goal
-        else:
-            self.goal_scored = False
-            self.result_message = "SAVED!"
-            if self.player_turn:
-                if self.sudden_death:
-                    self.sd_player_results[self.sd_round - 1] = 0  # 0 for miss
-                else:
-                    self.player_results[self.current_round - 1] = 0  # 0 for miss
-            else:
-                if self.sudden_death:
-                    self.sd_cpu_results[self.sd_round - 1] = 0  # 0 for miss
-                else:
-                    self.cpu_results[self.current_round - 1] = 0  # 0 for miss
-        
-        # Always set waiting time to show the result before checking for win
-        self.waiting_time = 60  # Wait 1 second (60 frames)
-        
-        # Flag to check for win after waiting time
-        self.check_win_after_waiting = True
-    def next_turn(self):
-        # If we're waiting after a goal/save, just count down
-        if self.waiting_time > 0:
-            self.waiting_time -= 1
-            return
-            
-        # Special case: End of round 5, check if we need to go to sudden death
-        if not self.sudden_death and self.current_round == 5 and not self.player_turn and not self.preparing_for_cpu_kick and self.goal_scored is not None:
-            if self.player_score == self.cpu_score:
-                # Scores are tied after 5 rounds, go to sudden death
-                self.start_sudden_death()
-                return
-            else:
-                # Game is over, determine winner
-                self.end_game()
-                return
-            
-        # Check if we need to check for win after showing the result
-        if self.check_win_after_waiting:
-            self.check_win_after_waiting = False
-            
-            # Handle sudden death mode differently
-            if self.sudden_death:
-                # In sudden death, we check for a winner after both players have kicked
-                if not self.player_turn:  # After CPU's turn
-                    # Check if one player scored and the other missed
-                    player_result = self.sd_player_results[self.sd_round - 1]
-                    cpu_result = self.sd_cpu_results[self.sd_round - 1]
-                    
-                    if player_result == 1 and cpu_result == 0:
-                        # Player scored, CPU missed - Player wins
-                        self.end_game()
-                        return
-                    elif player_result == 0 and cpu_result == 1:
-                        # Player missed, CPU scored - CPU wins
-                        self.end_game()
-                        return
-                    # If both scored or both missed, continue to next sudden death round
-            else:
-                # Regular rounds logic
-                # Now check for mathematical win conditions
-                remaining_kicks = MAX_ROUNDS - self.current_round
-                
-                # If player just kicked
-                if self.player_turn:
-                    # Calculate maximum possible score for CPU including current round
-                    max_possible_cpu_score = self.cpu_score + remaining_kicks + 1  # +1 for current round
-                    
-                    # Critical case: Round 5, player scores making it 5-3 or better
-                    if self.current_round == 5:
-                        # Only end if CPU can't catch up even with their last kick
-                        if self.player_score > self.cpu_score + 1:
-                            self.end_game()
-                            return
-                        # If CPU is already ahead after player's kick in round 5, CPU wins
-                        if self.cpu_score > self.player_score:
-                            self.end_game()
-                            return
-                    # Check if player just scored and now has an insurmountable lead
-                    elif self.player_score > max_possible_cpu_score:
-                        self.end_game()
-                        return
-                # If CPU just kicked
-                else:
-                    # Calculate maximum possible score for player including next round
-                    max_possible_player_score = self.player_score + remaining_kicks
-                    
-                    # Critical case: Round 5, CPU scores making it 3-5 or better
-                    if self.current_round == 5:
-                        # Only end if player can't catch up even with their last kick
-                        if self.cpu_score > self.player_score + 1:
-                            self.end_game()
-                            return
-                        # If player is already ahead after CPU's kick in round 5, player wins
-                        if self.player_score > self.cpu_score:
-                            self.end_game()
-                            return
-                    # Check if CPU just scored and now has an insurmountable lead
-                    elif self.cpu_score > max_possible_player_score:
-                        self.end_game()
-                        return
-                    
-                    # Check if player just missed and now cannot catch up to CPU
-                    if not self.player_turn and not self.goal_scored:
-                        max_possible_player_score = self.player_score + remaining_kicks
-                        if max_possible_player_score < self.cpu_score:
-                            self.end_game()
-                            return
-                    
-                    # Check if CPU just missed and now cannot catch up to player
-                    if self.player_turn and not self.goal_scored:
-                        max_possible_cpu_score = self.cpu_score + remaining_kicks
-                        if max_possible_cpu_score < self.player_score:
-                            self.end_game()
-                            return
-                            
-                    # Special case: After round 4, check if game is mathematically decided
-                    if self.current_round == 4 and not self.player_turn:
-                        # If player has 4 points and CPU has 2 or less, player wins
-                        if self.player_score >= 4 and self.cpu_score <= 2:
-                            self.end_game()
-                            return
-                        # If CPU has 4 points and player has 2 or less, CPU wins
-                        if self.cpu_score >= 4 and self.player_score <= 2:
-                            self.end_game()
-                            return
-                        # If player has 3 points and CPU has 1 or less, player wins
-                        if self.player_score >= 3 and self.cpu_score <= 1:
-                            self.end_game()
-                            return
-                        # If CPU has 3 points and player has 1 or less, CPU wins
-                        if self.cpu_score >= 3 and self.player_score <= 1:
-                            self.end_game()
-                            return
-                        # If player has 2 points and CPU has 0, player wins
-                        if self.player_score >= 2 and self.cpu_score == 0:
-                            self.end_game()
-                            return
-                        # If CPU has 2 points and player has 0, CPU wins
-                        if self.cpu_score >= 2 and self.player_score == 0:
-                            self.end_game()
-                            return
-        
-        # If game is already marked as over, end it now
-        if self.game_over:
-            self.end_game()
-            return
-        
-        self.result_message = ""
-        self.ball_pos = [SCREEN_WIDTH // 2, SCREEN_HEIGHT - 100]
-        
-        # Reset goalkeeper to center position
-        goal_x = SCREEN_WIDTH // 2 - GOAL_WIDTH // 2
-        goal_y = SCREEN_HEIGHT // 4 - GOAL_HEIGHT // 2
-        
-        # Use integer values for goalkeeper position calculation
-        current_gk_width = int(self.get_current_goalkeeper_width())
-        current_gk_height = int(self.get_current_goalkeeper_height())
-        
-        self.goalkeeper_pos = [
-            goal_x + (GOAL_WIDTH - current_gk_width) // 2,
-            goal_y + (GOAL_HEIGHT - current_gk_height) // 2
+            return "Penalty Kick Results", WHITE, self.player_results, self.cpu_results
+    def results_window(self):
+        # Only the columns on show are ever looked at: the latest rounds, or
+        # earlier ones while the table is scrolled back
+        header, color, player_results, cpu_results = self.results_table_contents()
+        start = max(0, len(player_results) - RESULTS_COLUMNS - self.results_scroll)
+        stop = start + RESULTS_COLUMNS
+        return header, color, start, tuple(player_results[start:stop]), tuple(cpu_results[start:stop])
+    def scroll_results(self, columns):
+        # Positive columns look further back in the history
+        total = len(self.results_table_contents()[2])
+        self.results_scroll = min(max(self.results_scroll + columns, 0), max(total - RESULTS_COLUMNS, 0))
+    def results_table_blits(self):
+        return [(render_results_table(*self.results_window()), TABLE_RECT)]
+    def draw_results_table(self):
+        screen.blits(self.results_table_blits(), doreturn=False)
+    def draw(self):
+        # Draw everything
+        self.draw_field()
+        self.draw_goalkeeper()
+        self.draw_ball()
+        self.draw_scoreboard()
+    def display_items(self):
+        # (key, rect) for everything drawn over the pitch; an item whose key or
+        # rect differs from the previous frame marks its old and new area dirty
+        items = [
+            (("goalkeeper", self.player_turn), tuple(self.goalkeeper_rect())),
+            ("ball", tuple(self.ball_rect())),
         ]
-        
-        self.target_pos = None
-        self.ball_moving = False
-        self.goalkeeper_target = None
-        self.goal_scored = None
-        
-        if self.sudden_death:
-            # In sudden death, we alternate kicks within the same round
-            if not self.player_turn:  # After CPU's turn
-                self.sd_round += 1  # Increment sudden death round
-                
-                # Check if we need to reset the table (every 5 rounds)
-                if self.sd_round % 5 == 1 and self.sd_round > 1:
-                    # Clear the results and start a new table
-                    self.sd_player_results = []
-                    self.sd_cpu_results = []
-                
-                self.sd_player_results.append(-1)  # Add placeholder for new round
-                self.sd_cpu_results.append(-1)
-                self.player_turn = True  # Switch to player's turn
-            else:
-                # After player's turn, prepare for CPU's turn with a delay
-                self.player_turn = False
-                self.preparing_for_cpu_kick = True
-                self.cpu_preparation_time = 180  # 3 seconds (60 frames per second)
-        else:
-            # Regular rounds
-            if not self.player_turn:  # After CPU's turn
-                self.current_round += 1
-                if self.current_round > MAX_ROUNDS:
-                    self.end_game()
-                    return
-                self.player_turn = True  # Switch to player's turn
-            else:
-                # After player's turn, prepare for CPU's turn with a delay
-                self.player_turn = False
-                self.preparing_for_cpu_kick = True
-                self.cpu_preparation_time = 180  # 3 seconds (60 frames per second)
-    def update_cpu_preparation(self):
-        if self.preparing_for_cpu_kick:
-            if self.cpu_preparation_time > 0:
-                self.cpu_preparation_time -= 1
-            else:
-                self.preparing_for_cpu_kick = False
-                
-                # If game is already marked as over, end it now
-                if self.game_over:
-                    self.end_game()
-                    return
-                
-                # Before CPU shoots, check if it's mathematically impossible for CPU to win
-                if not self.sudden_death:  # Only check in regular mode
-                    remaining_kicks = MAX_ROUNDS - self.current_round
-                    max_possible_cpu_score = self.cpu_score + remaining_kicks
-                    
-                    # Only check for early win in round 5, let all round 4 kicks complete
-                    if self.current_round == 5 and max_possible_cpu_score + 1 < self.player_score:
-                        # Player has already won mathematically by more than 1 point
-                        self.end_game()
-                        return
-                
-                # Proceed with CPU's kick if the game isn't over
-                self.cpu_shoot()
-                
-    def cpu_shoot(self):
-        # CPU randomly selects target
-        goal_x = SCREEN_WIDTH // 2 - GOAL_WIDTH // 2
-        goal_y = SCREEN_HEIGHT // 4 - GOAL_HEIGHT // 2
-        
-        target_x = random.randint(goal_x + 20, goal_x + GOAL_WIDTH - 20)
-        target_y = random.randint(goal_y + 20, goal_y + GOAL_HEIGHT - 20)
-        self.target_pos = [target_x, target_y]
-        
-        # Player controls goalkeeper
-        self.ball_moving = True
-    def player_shoot(self, pos):
-        if not self.ball_moving and self.player_turn:
-            goal_x = SCREEN_WIDTH // 2 - GOAL_WIDTH // 2
-            goal_y = SCREEN_HEIGHT // 4 - GOAL_HEIGHT // 2
-            
-            # Check if click is in goal area
-            if (goal_x < pos[0] < goal_x + GOAL_WIDTH and 
-                goal_y < pos[1] < goal_y + GOAL_HEIGHT):
-                self.target_pos = pos
-                self.ball_moving = True
-                
-                # CPU goalkeeper moves randomly within the goal area
-                # Convert float values to integers for random.randint
-                random_x = random.randint(goal_x, int(goal_x + GOAL_WIDTH - self.cpu_goalkeeper_width))
-                random_y = random.randint(goal_y, int(goal_y + GOAL_HEIGHT - self.cpu_goalkeeper_height))
-                self.goalkeeper_target = [random_x, random_y]
-                
-    def cpu_goalkeeper_move(self, pos):
-        # Allow goalkeeper movement during CPU preparation time or when it's CPU's turn
-        if self.player_turn or self.ball_moving:
+        overlay = self.field_overlay()
+        if overlay:
+            items.append(((overlay, overlay.version), tuple(HEATMAP_RECT)))
+        # Cached text and table surfaces are shared, so the same content yields the same key
+        for surface, rect in self.scoreboard_blits() + self.results_table_blits():
+            items.append((surface, tuple(rect)))
+        return set(items)
+    def is_still(self):
+        # Once the match is over nothing moves after the goalkeeper stops
+        return self.game_over and not self.ball_moving and not self.goalkeeper_target
+
+class ReplayGame(ReplayMatch, Game):
+    # A recorded match played back in the game window
+    pass
+
+class DirtyRectDisplay:
+    """Redraws and pushes only the parts of the game screen that changed"""
+    def __init__(self):
+        self.previous = None
+        
+    def invalidate(self):
+        # Force a full redraw on the next frame, e.g. after a screen change
+        self.previous = None
+        
+    def present(self, game):
+        items = game.display_items()
+        if self.previous is None:
+            game.draw()
+            pygame.display.flip()
+            self.previous = items
             return
-            
-        goal_x = SCREEN_WIDTH // 2 - GOAL_WIDTH // 2
-        goal_y = SCREEN_HEIGHT // 4 - GOAL_HEIGHT // 2
-        max_x = goal_x + GOAL_WIDTH - int(self.player_goalkeeper_width)
-        max_y = goal_y + GOAL_HEIGHT - int(self.player_goalkeeper_height)
         
-        # Limit goalkeeper movement to goal area
-        if pos[0] < goal_x:
-            pos = (goal_x, pos[1])
-        elif pos[0] > max_x:
-            pos = (max_x, pos[1])
-            
-        # Also allow vertical movement
-        if pos[1] < goal_y:
-            pos = (pos[0], goal_y)
-        elif pos[1] > max_y:
-            pos = (pos[0], max_y)
-            
-        # Update both x and y positions
-        self.goalkeeper_pos[0] = pos[0]
-        self.goalkeeper_pos[1] = pos[1]
-    def start_sudden_death(self):
-        """Start sudden death mode after a tie in regular rounds"""
-        self.sudden_death = True
-        self.sd_round = 1
-        self.sd_player_results.append(-1)  # Add placeholder for first sudden death round
-        self.sd_cpu_results.append(-1)
-        self.player_turn = True  # Player always kicks first in sudden death
-        self.result_message = "SUDDEN DEATH!"
-        self.waiting_time = 120  # Show message for 2 seconds
-        self.preparing_for_cpu_kick = False  # Make sure this is False so player kicks first
-        
-        # Reset ball position to the penalty spot
-        self.ball_pos = [SCREEN_WIDTH // 2, SCREEN_HEIGHT - 100]
-        
-        # Reset goalkeeper to center position
-        goal_x = SCREEN_WIDTH // 2 - GOAL_WIDTH // 2
-        goal_y = SCREEN_HEIGHT // 4 - GOAL_HEIGHT // 2
-        
-        # Use integer values for goalkeeper position calculation
-        current_gk_width = int(self.cpu_goalkeeper_width)  # Use CPU goalkeeper width since player kicks first
-        current_gk_height = int(self.cpu_goalkeeper_height)
-        
-        self.goalkeeper_pos = [
-            goal_x + (GOAL_WIDTH - current_gk_width) // 2,
-            goal_y + (GOAL_HEIGHT - current_gk_height) // 2
-        ]
-        
-        # Reset other game state variables
-        self.target_pos = None
-        self.ball_moving = False
-        self.goalkeeper_target = None
-        self.goal_scored = None
-        
-    def end_game(self):
-        # If game is already over, just update the message
-        if not self.game_over:
-            self.game_over = True
-            if self.player_score > self.cpu_score:
-                self.result_message = "PLAYER WINS!"
-            elif self.cpu_score > self.player_score:
-                self.result_message = "CPU WINS!"
-            else:
-                self.result_message = "IT'S A DRAW!"
-                
-            # Display additional message if game ended early
-            if not self.sudden_death and self.current_round <= MAX_ROUNDS:
-                remaining = MAX_ROUNDS - self.current_round
-                if self.current_round == MAX_ROUNDS:
-                    # Final round, show appropriate message
-                    if self.player_score > self.cpu_score:
-                        self.result_message += "\nPlayer wins in the final round!"
-                    elif self.cpu_score > self.player_score:
-                        self.result_message += "\nCPU wins in the final round!"
-                elif remaining > 0:
-                    # Earlier rounds, show remaining kicks
-                    if self.player_score > self.cpu_score:
-                        self.result_message += f"\nPlayer wins with {remaining} kicks remaining!"
-                    else:
-                        self.result_message += f"\nCPU wins with {remaining} kicks remaining!"
-            elif self.sudden_death:
-                # Sudden death message
-                if self.player_score > self.cpu_score:
-                    self.result_message += f"\nPlayer wins in sudden death round {self.sd_round}!"
-                else:
-                    self.result_message += f"\nCPU wins in sudden death round {self.sd_round}!"
-            
-    def restart_game(self, difficulty=None):
-        if difficulty is not None:
-            self.difficulty = difficulty
-        self.__init__(self.difficulty)
+        dirty = []
+        for _, rect in items.symmetric_difference(self.previous):
+            rect = pygame.Rect(rect).inflate(2, 2)
+            # Merge overlapping regions so nothing is redrawn twice
+            for other in [r for r in dirty if r.colliderect(rect)]:
+                dirty.remove(other)
+                rect.union_ip(other)
+            dirty.append(rect)
+        
+        for rect in dirty:
+            screen.set_clip(rect)
+            game.draw()
+        screen.set_clip(None)
+        pygame.display.update(dirty)
+        self.previous = items
+
+# Frame-time overlay (bottom left corner), toggled with F3 when profiling
+OVERLAY_RECT = pygame.Rect(10, SCREEN_HEIGHT - 146, 230, 136)
+OVERLAY_GRAPH_HEIGHT = 60
+OVERLAY_BAR_WIDTH = 2
+OVERLAY_LABELS = {"events": "events", "simulate": "sim", "draw": "draw",
+                  "present": "present", "tick": "tick"}
+
+def draw_profile_overlay(profiler, frame_budget):
+    """Draw recent frame times and the last frame's phases, return the area drawn"""
+    # Opaque, so it fully replaces the previous overlay even when the dirty
+    # rectangle display leaves the area below it alone
+    pygame.draw.rect(screen, BLACK, OVERLAY_RECT)
+    
+    # One bar per frame, newest on the right; the line marks the frame budget
+    times = profiler.recent_frame_times()[-(OVERLAY_RECT.width // OVERLAY_BAR_WIDTH):]
+    bottom = OVERLAY_RECT.top + 5 + OVERLAY_GRAPH_HEIGHT
+    scale = OVERLAY_GRAPH_HEIGHT / (2 * frame_budget)
+    for i, t in enumerate(times):
+        color = LIGHT_GREEN if t <= frame_budget else YELLOW if t <= 2 * frame_budget else RED
+        height = min(int(t * scale), OVERLAY_GRAPH_HEIGHT)
+        pygame.draw.rect(screen, color, (OVERLAY_RECT.left + i * OVERLAY_BAR_WIDTH,
+                                         bottom - height, OVERLAY_BAR_WIDTH, height))
+    budget_y = bottom - OVERLAY_GRAPH_HEIGHT // 2
+    pygame.draw.line(screen, WHITE, (OVERLAY_RECT.left, budget_y), (OVERLAY_RECT.right - 1, budget_y))
+    
+    # Frame times change every frame, so they bypass the text cache
+    phases = {phase: total / 1e6 for phase, total in profiler.last_phase_totals.items()}
+    if times:
+        ordered = sorted(times)
+        summary = (f"{times[-1] * 1000:.1f} ms  p99 {ordered[int(0.99 * (len(ordered) - 1))] * 1000:.1f}"
+                   f"  max {ordered[-1] * 1000:.1f}")
+    else:
+        summary = "no frames yet"
+    latencies = sorted(profiler.recent_input_latencies())
+    if latencies:
+        input_summary = (f"input p50 {latencies[len(latencies) // 2] * 1000:.1f}"
+                         f"  p99 {latencies[int(0.99 * (len(latencies) - 1))] * 1000:.1f}"
+                         f"  max {latencies[-1] * 1000:.1f}")
+    else:
+        input_summary = "input: move the goalkeeper"
+    lines = [
+        summary,
+        "  ".join(f"{OVERLAY_LABELS[phase]} {phases[phase]:.1f}" for phase in FRAME_PHASES[:3]),
+        "  ".join(f"{OVERLAY_LABELS[phase]} {phases[phase]:.1f}" for phase in FRAME_PHASES[3:]),
+        input_summary,
+    ]
+    font = text_cache.font(OVERLAY_FONT)
+    y = bottom + 4
+    for line in lines:
+        screen.blit(font.render(line, True, WHITE), (OVERLAY_RECT.left + 4, y))
+        y += 16
+    return OVERLAY_RECT
+
 class TitleScreen:
     def __init__(self):
         self.buttons = [
@@ -801,20 +558,20 @@ class TitleScreen:
         # Draw background
         screen.fill(GREEN)
         
-        # Draw title
-        title_text = title_font.render("Soccer Penalty Shootout", True, WHITE)
-        title_rect = title_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//4))
-        screen.blit(title_text, title_rect)
-        
-        # Draw subtitle
-        subtitle_text = menu_font.render("Select Difficulty", True, WHITE)
-        subtitle_rect = subtitle_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//4 + 60))
-        screen.blit(subtitle_text, subtitle_rect)
+        # Draw title and subtitle
+        screen.blits([
+            text_cache.place("Soccer Penalty Shootout", TITLE_FONT, WHITE, center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//4)),
+            text_cache.place("Select Difficulty", MENU_FONT, WHITE, center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//4 + 60)),
+        ], doreturn=False)
         
         # Draw buttons
         for button in self.buttons:
             button.draw()
             
+    def view(self):
+        # Everything that can change what the title screen shows
+        return tuple(button.is_hovered for button in self.buttons)
+        
     def handle_event(self, event):
         if event.type == MOUSEMOTION:
             for button in self.buttons:
@@ -825,61 +582,288 @@ class TitleScreen:
                     return i  # Return the difficulty level
         return None
 
-# Create game instance and title screen
-title_screen = TitleScreen()
-game = None
-current_state = STATE_TITLE
-
-# Main game loop
-running = True
-while running:
-    # Process events
-    for event in pygame.event.get():
-        if event.type == QUIT:
-            running = False
-            
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Soccer penalty shootout game")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="redraw only the parts of the game screen that changed")
+    parser.add_argument("--fps", type=int, default=DEFAULT_FPS,
+                        help="display frame rate cap, 0 for unthrottled")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="simulation speed multiplier, e.g. 4 to fast-forward")
+    parser.add_argument("--record", metavar="PATH",
+                        help="append every finished match to a replay file")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="watch the matches in a replay file instead of playing")
+    parser.add_argument("--cpu", choices=CPU_STRATEGIES, default="random",
+                        help="how the CPU aims and dives: equilibrium plays the solved "
+                             "mixed strategy, adaptive learns where you shoot")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="time every frame; F3 toggles a frame-time overlay and F4 "
+                             "(or quitting) writes a Chrome trace to PATH")
+    parser.add_argument("--analytics", metavar="DIR",
+                        help="log every kick of the session to a kick analytics store")
+    parser.add_argument("--heatmap", action="store_true",
+                        help="show your conversion rate per zone of the goal (H toggles it); "
+                             "starts from the kicks in --analytics if given (needs NumPy)")
+    parser.add_argument("--collision", choices=COLLISION_MODES, default="point",
+                        help="swept: a save is the ball touching the moving goalkeeper at any "
+                             "moment of its flight, the same at every frame rate and speed")
+    parser.add_argument("--hints", action="store_true",
+                        help="shade the goal by how likely the random CPU goalkeeper is to "
+                             "save a shot there (S toggles it; needs NumPy)")
+    parser.add_argument("--odds", action="store_true",
+                        help="show the exact chance that you win on the scoreboard, from the "
+                             "conversion rates in --analytics if given")
+    parser.add_argument("--autosave", metavar="PATH",
+                        help="save the match after every kick and resume it from PATH "
+                             "on the next start")
+    args = parser.parse_args(argv)
+    if args.hints and (args.cpu != "random" or args.collision != "point"):
+        parser.error("--hints describes the random CPU goalkeeper with point collision, "
+                     "it needs --cpu random --collision point")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    init_display()
+    
+    # One strategy for the whole session, so an adaptive CPU keeps learning
+    cpu_strategy = make_cpu_strategy(args.cpu)
+    
+    # With --profile every phase of every frame is timed
+    profiler = FrameProfiler() if args.profile else NullProfiler()
+    show_overlay = False
+    frame_budget = 1 / (args.fps or DEFAULT_FPS)
+    
+    # Create game instance and title screen
+    title_screen = TitleScreen()
+    game = None
+    current_state = STATE_TITLE
+    recorder = None
+    
+    # With --analytics every kick played in this session is logged
+    store = KickStore(args.analytics) if args.analytics and not args.replay else None
+    kick_logger = KickLogger(store, flush_every=1) if store else None
+    
+    # With --heatmap the conversion rate of the player's shots is shown per zone
+    heatmaps = Heatmaps(store, lambda text: text_cache.render(text, OVERLAY_FONT, WHITE)) \
+        if args.heatmap and not args.replay else None
+    show_heatmap = bool(heatmaps)
+    show_hints = args.hints
+    
+    # With --odds the scoreboard shows the player's chance to win
+    def conversion(difficulty):
+        if not args.odds:
+            return None
+        return observed_rates(store, difficulty) if store else DEFAULT_CONVERSION[difficulty]
+    
+    # With --replay the recorded matches are shown one after another
+    replays = load_matches(args.replay) if args.replay else []
+    if replays:
+        game = profiler.instrument(ReplayGame(replays.pop(0)))
+        game.conversion = conversion(game.difficulty)
+        current_state = STATE_GAME
+
+    # With --autosave an unfinished match is picked up where it was left
+    autosave = args.autosave if not args.replay else None
+    saved_kicks = None
+    if autosave and os.path.exists(autosave):
+        game = profiler.instrument(load_match(autosave, Game, cpu_strategy=cpu_strategy))
+        game.conversion = conversion(game.difficulty)
+        if kick_logger:
+            kick_logger.watch(game)
+        if heatmaps:
+            game.heatmap = heatmaps.watch(game)
+            game.show_heatmap = show_heatmap
+        saved_kicks = game.kicks_taken
+        current_state = STATE_GAME
+
+    # With --dirty-rects only the changed parts of the game screen are redrawn
+    dirty_display = DirtyRectDisplay() if args.dirty_rects else None
+    
+    # Real time not yet simulated, consumed in fixed TIME_STEP steps
+    accumulator = 0.0
+    frame_time = 0.0
+    last_time = time.perf_counter()
+    
+    # On the title screen and a finished match nothing moves: the loop sleeps
+    # until an event arrives and redraws only when the view changed
+    idle_view = None  # What the still screen showed when last presented
+    woken = []  # The event that ended the wait, handled first next frame
+    
+    # Mouse motion is coalesced: only the latest position of a frame moves the
+    # goalkeeper. For the latency measurement a sample is assumed to have
+    # arrived as early as possible, right after the queue was last drained
+    motion = None  # Latest position not yet given to the goalkeeper
+    motion_since = None  # Earliest arrival of the motion shown by this frame
+    drained = time.perf_counter_ns()  # When mouse motion was last taken off the queue
+
+    # Main game loop
+    running = True
+    while running:
+        # Process events
+        with profiler.span("events"):
+            events, woken = woken + pygame.event.get(), []
+            arrived_after, drained = drained, time.perf_counter_ns()
+            for event in events:
+                if event.type == QUIT:
+                    running = False
+                elif event.type == VIDEOEXPOSE:
+                    idle_view = None  # The window needs drawing again
+                elif event.type == KEYDOWN and args.profile:
+                    if event.key == K_F3:
+                        show_overlay = not show_overlay
+                        idle_view = None
+                        if dirty_display:
+                            dirty_display.invalidate()
+                    elif event.key == K_F4:
+                        profiler.export(args.profile)
+                if event.type == KEYDOWN and event.key == K_h and heatmaps:
+                    show_heatmap = not show_heatmap
+                    if game:
+                        game.show_heatmap = show_heatmap
+                elif event.type == KEYDOWN and event.key == K_s and args.hints:
+                    show_hints = not show_hints
+                    if game:
+                        game.show_hints = show_hints
+
+                if current_state == STATE_TITLE:
+                    difficulty = title_screen.handle_event(event)
+                    if difficulty is not None:
+                        game = profiler.instrument(Game(difficulty, cpu_strategy=cpu_strategy,
+                                                        collision=COLLISION_MODES.index(args.collision)))
+                        game.conversion = conversion(game.difficulty)
+                        saved_kicks = None
+                        if kick_logger:
+                            kick_logger.watch(game)
+                        if heatmaps:
+                            game.heatmap = heatmaps.watch(game)
+                            game.show_heatmap = show_heatmap
+                        if args.record:
+                            recorder = ReplayRecorder(game)
+                        current_state = STATE_GAME
+
+                elif current_state == STATE_GAME:
+                    if event.type == MOUSEBUTTONDOWN and event.button == 1:
+                        if game.game_over:
+                            if args.replay:
+                                # Next recorded match, or quit after the last one
+                                if replays:
+                                    game = profiler.instrument(ReplayGame(replays.pop(0)))
+                                    game.conversion = conversion(game.difficulty)
+                                    if dirty_display:
+                                        dirty_display.invalidate()
+                                else:
+                                    running = False
+                            else:
+                                current_state = STATE_TITLE
+                        elif args.replay:
+                            pass  # The recording plays the match
+                        elif game.awaiting_player_kick():
+                            game.player_shoot(event.pos)
+                    elif event.type == MOUSEWHEEL and game:
+                        game.scroll_results(event.y)
+                    elif event.type == MOUSEMOTION:
+                        # Only the latest position is passed to the goalkeeper
+                        # move function, which determines if movement is allowed
+                        if game and not args.replay:
+                            motion = event.pos
+                            if motion_since is None:
+                                motion_since = arrived_after
+
+        # Update game state
         if current_state == STATE_TITLE:
-            difficulty = title_screen.handle_event(event)
-            if difficulty is not None:
-                game = Game(difficulty)
-                current_state = STATE_GAME
-                
+            motion = motion_since = None  # Meant for the match just left
+            view = ("title", title_screen.view())
+            if view != idle_view:
+                with profiler.span("draw"):
+                    title_screen.draw()
+                with profiler.span("present"):
+                    pygame.display.flip()
+                idle_view = view
+            if dirty_display:
+                dirty_display.invalidate()
         elif current_state == STATE_GAME:
-            if event.type == MOUSEBUTTONDOWN and event.button == 1:
-                if game.game_over:
-                    current_state = STATE_TITLE
-                elif game.player_turn and not game.ball_moving:
-                    game.player_shoot(event.pos)
-            elif event.type == MOUSEMOTION:
-                # Always pass mouse motion to goalkeeper move function
-                # The function itself will determine if movement is allowed
-                if game:
-                    game.cpu_goalkeeper_move(event.pos)
-    
-    # Update game state
-    if current_state == STATE_TITLE:
-        title_screen.draw()
-    elif current_state == STATE_GAME:
-        game.move_ball()
-        game.move_goalkeeper()
-        game.update_cpu_preparation()  # Handle CPU preparation time
-        
-        # If ball stopped moving, prepare for next turn
-        if not game.ball_moving and game.goal_scored is not None:
-            game.next_turn()
-        
-        # Draw everything
-        game.draw_field()
-        game.draw_goalkeeper()
-        game.draw_ball()
-        game.draw_scoreboard()
+            # Run as many fixed steps as the elapsed time covers, then draw
+            # part way towards the next step
+            with profiler.span("simulate"):
+                # Sample the mouse once more just before stepping, as a CPU
+                # kick taken in these steps fixes where the goalkeeper stands
+                late = pygame.event.get(MOUSEMOTION)
+                arrived_after, drained = drained, time.perf_counter_ns()
+                if late and not args.replay:
+                    motion = late[-1].pos
+                    if motion_since is None:
+                        motion_since = arrived_after
+                if motion:
+                    before = tuple(game.goalkeeper_pos)
+                    game.cpu_goalkeeper_move(motion)
+                    if tuple(game.goalkeeper_pos) == before:
+                        motion_since = None  # Nothing new to see
+                    motion = None
+                
+                accumulator += min(frame_time, MAX_FRAME_TIME) * args.speed
+                while accumulator >= TIME_STEP:
+                    game.step()
+                    accumulator -= TIME_STEP
+                game.render_alpha = accumulator / TIME_STEP
+            
+            # Save a recorded match as soon as it is over
+            if recorder and game.game_over:
+                save_matches(args.record, [recorder.record])
+                recorder = None
+
+            # Save once per kick; a finished match leaves nothing to resume
+            if autosave and game.kicks_taken != saved_kicks:
+                if not game.game_over:
+                    save_match(autosave, game)
+                elif os.path.exists(autosave):
+                    os.remove(autosave)
+                saved_kicks = game.kicks_taken
+
+            # Draw everything and update display, unless a still screen is
+            # already showing what it would draw
+            view = (game, game.display_items()) if game.is_still() else None
+            if view is None or view != idle_view:
+                if dirty_display:
+                    # Drawing happens inside present, clipped to the changed areas
+                    with profiler.span("present"):
+                        dirty_display.present(game)
+                else:
+                    with profiler.span("draw"):
+                        game.draw()
+                    with profiler.span("present"):
+                        pygame.display.flip()
+            idle_view = view
+            if motion_since is not None:
+                profiler.record_input_latency(motion_since, time.perf_counter_ns())
+                motion_since = None
+        
+        # The overlay goes on top of the finished frame
+        if show_overlay:
+            pygame.display.update(draw_profile_overlay(profiler, frame_budget))
+
+        # Cap the frame rate; a still screen first waits for something to happen
+        with profiler.span("tick"):
+            if idle_view is not None:
+                event = pygame.event.wait(IDLE_WAIT)
+                woken = [event] if event.type != NOEVENT else []
+                drained = time.perf_counter_ns()  # The wait returns as soon as an event arrives
+            clock.tick(args.fps)
+        profiler.end_frame()
+        now = time.perf_counter()
+        # Time spent waiting is not simulated when the game starts again
+        frame_time = now - last_time if idle_view is None else 0.0
+        last_time = now
     
-    # Update display
-    pygame.display.flip()
+    if args.profile:
+        profiler.export(args.profile)
+    if store:
+        store.close()
     
-    # Cap the frame rate
-    clock.tick(60)
+    # Quit pygame
+    pygame.quit()
 
-# Quit pygame
-pygame.quit()
-sys.exit()
+if __name__ == "__main__":
+    main()
+    sys.exit()